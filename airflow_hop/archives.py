@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Export archives of pipelines and workflows with their child files"""
+
+import hashlib
+import json
+import os
+import posixpath
+import tempfile
+import zipfile
+from xml.etree import ElementTree
+
+from airflow.exceptions import AirflowException
+
+from airflow_hop.cache import files_signature, get_cache_dir
+
+HOP_EXTENSIONS = ('.hpl', '.hwf')
+CURRENT_FOLDER = '${Internal.Entry.Current.Folder}'
+# Fixed timestamp so that identical content always gives identical archives
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+def project_relative_path(filename, project_path, project_home) -> str:
+    for home in (project_home, project_path):
+        if home and filename.startswith(home.rstrip('/') + '/'):
+            return filename[len(home.rstrip('/')) + 1:]
+    if not os.path.isabs(filename) and '${' not in filename:
+        return filename
+    raise AirflowException(f'ERROR: {filename} is not in the project home')
+
+
+def resolve_reference(filename, referencing_name, project_path, project_home) -> str:
+    """
+    Returns the project relative path of a file referenced by the project file
+    referencing_name, either relative to the folder of that file, as Hop writes
+    them, or from the project home
+    """
+    if filename.startswith(CURRENT_FOLDER + '/'):
+        resolved = posixpath.normpath(posixpath.join(
+            posixpath.dirname(referencing_name), filename[len(CURRENT_FOLDER) + 1:]))
+        if resolved == '..' or resolved.startswith('../') or '${' in resolved:
+            raise AirflowException(f'ERROR: {filename} is not in the project home')
+        return resolved
+    return posixpath.normpath(project_relative_path(filename, project_path, project_home))
+
+
+def _references(root):
+    """Yields the filename elements of the actions and transforms running Hop files"""
+    for element in root.iterfind('actions/action/filename'):
+        if (element.text or '').endswith(HOP_EXTENSIONS):
+            yield element
+    for element in root.iterfind('transform/filename'):
+        if (element.text or '').endswith(HOP_EXTENSIONS):
+            yield element
+
+
+def _read_files(project_path, filename, project_home) -> dict:
+    """
+    Returns the content of the file and of every pipeline and workflow it runs,
+    recursively, by project relative path. References are rewritten relative to
+    the folder of the referencing file so that they resolve inside the archive.
+    References to files outside of the project, or using other variables, are
+    left for the server to resolve.
+    """
+    files = {}
+    pending = [filename]
+    while pending:
+        name = pending.pop()
+        if name in files:
+            continue
+        path = os.path.join(project_path, name)
+        try:
+            root = ElementTree.parse(path).getroot()
+        except FileNotFoundError as error:
+            raise AirflowException(f'ERROR: {path} not found') from error
+
+        rewritten = False
+        for element in _references(root):
+            try:
+                child = resolve_reference(element.text, name, project_path, project_home)
+            except AirflowException:
+                continue
+            pending.append(child)
+            relative = posixpath.relpath(child, posixpath.dirname(name) or '.')
+            if element.text != f'{CURRENT_FOLDER}/{relative}':
+                element.text = f'{CURRENT_FOLDER}/{relative}'
+                rewritten = True
+
+        if rewritten:
+            files[name] = ElementTree.tostring(root, encoding='utf-8')
+        else:
+            with open(path, mode='br') as file:
+                files[name] = file.read()
+    return files
+
+
+def _files_signature(project_path, names) -> list:
+    """Returns the signatures of the project files, comparable once loaded from JSON"""
+    paths = [os.path.join(project_path, name) for name in names]
+    return json.loads(json.dumps(files_signature(paths)))
+
+
+def _cached_archive(index) -> str:
+    """Returns the archive recorded in the index if none of its files changed since"""
+    try:
+        with open(index, encoding='utf-8') as file:
+            entry = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(entry['archive']) or \
+            _files_signature(entry['project_path'], entry['files']) != entry['signature']:
+        return None
+    return entry['archive']
+
+
+def _save_index(index, project_path, files, archive):
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(index))
+    with os.fdopen(fd, mode='w', encoding='utf-8') as file:
+        json.dump({'project_path': project_path, 'files': sorted(files), 'archive': archive,
+                   'signature': _files_signature(project_path, sorted(files))}, file)
+    os.replace(tmp_file, index)
+
+
+def build_archive(project_path, filename, project_home='${PROJECT_HOME}') -> str:
+    """
+    Returns the path of a zip archive with the project file and its children,
+    as expected by the Hop Server addExport servlet. Archives are stored in the
+    worker cache by content hash, so that they are only built once for a given
+    version of the files; pointing AIRFLOW_HOP_CACHE_DIR to a shared volume
+    reuses them across workers. An index keyed on the file signatures of the
+    last build skips reading the files while none of them changes.
+    """
+    filename = posixpath.normpath(filename)
+    key = json.dumps([os.path.abspath(project_path), filename, project_home])
+    index = os.path.join(get_cache_dir('archives'),
+                         hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+    archive = _cached_archive(index)
+    if archive:
+        return archive
+
+    files = _read_files(project_path, filename, project_home)
+
+    digest = hashlib.sha256()
+    for name in sorted(files):
+        digest.update(name.encode('utf-8') + b'\0')
+        digest.update(hashlib.sha256(files[name]).digest())
+    archive = os.path.join(get_cache_dir('archives'), digest.hexdigest() + '.zip')
+    if not os.path.exists(archive):
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(archive))
+        with os.fdopen(fd, mode='bw') as file:
+            with zipfile.ZipFile(file, mode='w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+                for name in sorted(files):
+                    info = zipfile.ZipInfo(name, date_time=ZIP_DATE_TIME)
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    zip_file.writestr(info, files[name])
+        os.replace(tmp_file, archive)
+    _save_index(index, project_path, files, archive)
+    return archive
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Worker local caches"""
+
+import glob
+import hashlib
+import os
+import tempfile
+
+CACHE_DIR_ENV = 'AIRFLOW_HOP_CACHE_DIR'
+
+
+def get_cache_dir(namespace) -> str:
+    """
+    Returns the worker local cache directory for the given namespace. Every task
+    process on a worker shares it, unlike in-memory caches which are lost when
+    Airflow forks a new process per task instance.
+    """
+    root = os.environ.get(CACHE_DIR_ENV) or os.path.join(tempfile.gettempdir(), 'airflow_hop')
+    path = os.path.join(root, namespace)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def file_signature(path) -> tuple:
+    """Returns a cheap signature that changes whenever the file is modified"""
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def file_digest(path) -> str:
+    """Returns the SHA-256 of the file content"""
+    digest = hashlib.sha256()
+    with open(path, mode='br') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def files_signature(paths, hash_content=False) -> list:
+    """
+    Returns the signatures of the files matched by the given paths or glob
+    patterns, walking directories. Files are identified by size and mtime, or
+    by size and content hash when hash_content is set. Missing paths are kept
+    so that creating them changes the result.
+    """
+    signatures = []
+    for pattern in paths:
+        for match in sorted(glob.glob(pattern, recursive=True)) or [pattern]:
+            if os.path.isdir(match):
+                files = sorted(os.path.join(root, name)
+                               for root, _, names in os.walk(match) for name in names)
+            else:
+                files = [match]
+            for path in files:
+                if not os.path.exists(path):
+                    signatures.append((os.path.abspath(path), None))
+                elif hash_content:
+                    signatures.append((os.path.abspath(path), os.path.getsize(path),
+                                       file_digest(path)))
+                else:
+                    signatures.append(file_signature(path))
+    return signatures
+
+
+def cached_file_content(namespace, path, build) -> bytes:
+    """
+    Returns build(path) for the current version of the file, reusing the result
+    stored on disk by any process of this worker when the file is unchanged.
+    """
+    key = hashlib.sha256(repr(file_signature(path)).encode('utf-8')).hexdigest()
+    cache_file = os.path.join(get_cache_dir(namespace), key)
+    try:
+        with open(cache_file, mode='br') as file:
+            return file.read()
+    except FileNotFoundError:
+        pass
+
+    content = build(path)
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(cache_file))
+    with os.fdopen(fd, mode='bw') as file:
+        file.write(content)
+    os.replace(tmp_file, cache_file)
+    return content
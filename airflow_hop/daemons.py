@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Worker local pool of warm Hop Servers"""
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import requests
+from airflow.exceptions import AirflowException
+
+from airflow_hop.cache import get_cache_dir
+
+log = logging.getLogger(__name__)
+
+HOP_SERVER_ENV = 'AIRFLOW_HOP_SERVER'
+POOL_SIZE_ENV = 'AIRFLOW_HOP_POOL_SIZE'
+POOL_IDLE_TIMEOUT_ENV = 'AIRFLOW_HOP_POOL_IDLE_TIMEOUT'
+DEFAULT_HOP_SERVER = 'hop-server.sh'
+LOCALHOST = '127.0.0.1'
+
+
+def _alive(pid) -> bool:
+    try:
+        # Reaps the daemon if it is a child of this process that already exited
+        if os.waitpid(pid, os.WNOHANG)[0] == pid:
+            return False
+    except ChildProcessError:
+        pass
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((LOCALHOST, 0))
+        return sock.getsockname()[1]
+
+
+class HopServerPool:
+    """
+    Pool of long lived Hop Servers bound to localhost, which saves the JVM
+    startup of a local execution per task. Servers are started on demand, up to
+    size of them, and stopped once idle for idle_timeout seconds.
+
+    The pool state lives in the worker cache, so every task process of the
+    worker shares the same servers. Leases are tied to the process holding
+    them, so that tasks which died without releasing them do not keep a server
+    busy forever. A detached reaper process runs while the pool has servers and
+    stops the idle ones, even if no task uses the pool any more.
+    """
+
+    def __init__(self,
+                 hop_server_path=None,
+                 size=None,
+                 idle_timeout=None,
+                 hop_config_path=None,
+                 username='cluster',
+                 password='cluster',
+                 startup_timeout=120):
+        self.hop_server_path = (hop_server_path or os.environ.get(HOP_SERVER_ENV)
+                                or DEFAULT_HOP_SERVER)
+        self.size = int(size or os.environ.get(POOL_SIZE_ENV, 2))
+        self.idle_timeout = float(idle_timeout if idle_timeout is not None
+                                  else os.environ.get(POOL_IDLE_TIMEOUT_ENV, 600))
+        self.hop_config_path = hop_config_path
+        self.username = username
+        self.password = password
+        self.startup_timeout = startup_timeout
+
+        # Servers are only shared by pools of the same binary and configuration
+        name = hashlib.sha256(json.dumps([self.hop_server_path, self.hop_config_path])
+                              .encode('utf-8')).hexdigest()[:16]
+        self.state_file = os.path.join(get_cache_dir('daemons'), f'{name}.json')
+        self.reaper_file = f'{self.state_file}.reaper'
+        self.__lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def __locked(self):
+        with self.__lock, open(f'{self.state_file}.lock', mode='a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def __load(self) -> list:
+        try:
+            with open(self.state_file, encoding='utf-8') as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return []
+
+    def __save(self, daemons):
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(self.state_file))
+        with os.fdopen(fd, mode='w', encoding='utf-8') as file:
+            json.dump(daemons, file)
+        os.replace(tmp_file, self.state_file)
+
+    def __prune(self, daemons, idle_timeout) -> list:
+        """Drops dead servers and leases, stopping the servers idle for too long"""
+        now = time.time()
+        alive = []
+        for daemon in daemons:
+            daemon['leases'] = [lease for lease in daemon['leases']
+                                if _alive(int(lease.split(':')[0]))]
+            if not _alive(daemon['pid']):
+                log.warning('Hop Server %s:%s is gone', LOCALHOST, daemon['port'])
+            elif not daemon['leases'] and now - daemon['last_used'] >= idle_timeout:
+                log.info('Stopping Hop Server %s:%s, idle for %.0f s', LOCALHOST,
+                         daemon['port'], now - daemon['last_used'])
+                self.__stop(daemon)
+            else:
+                alive.append(daemon)
+        return alive
+
+    def __log_path(self, port) -> str:
+        return os.path.join(os.path.dirname(self.state_file), f'hop-server-{port}.log')
+
+    def __start(self) -> dict:
+        """Starts a server without waiting for it to be ready"""
+        port = _free_port()
+        environment = dict(os.environ)
+        if self.hop_config_path:
+            environment['HOP_CONFIG_FOLDER'] = self.hop_config_path
+        with open(self.__log_path(port), mode='ab') as log_file:
+            try:
+                process = subprocess.Popen(  # pylint: disable=consider-using-with
+                    [self.hop_server_path, LOCALHOST, str(port)], env=environment,
+                    stdin=subprocess.DEVNULL, stdout=log_file, stderr=subprocess.STDOUT,
+                    start_new_session=True)
+            except FileNotFoundError as error:
+                raise AirflowException(f'ERROR: {self.hop_server_path} not found') from error
+        return {'pid': process.pid, 'port': port, 'started': time.time(),
+                'last_used': time.time(), 'leases': [], 'ready': False}
+
+    def __wait_ready(self, daemon):
+        """Waits for a server being started by this or another process to answer"""
+        log_path = self.__log_path(daemon['port'])
+        while time.time() < daemon['started'] + self.startup_timeout:
+            if not _alive(daemon['pid']):
+                raise AirflowException(f'ERROR: Hop Server exited, see {log_path}')
+            try:
+                response = requests.get(f'http://{LOCALHOST}:{daemon["port"]}/hop/status/',
+                                        params={'xml': 'Y'}, timeout=5,
+                                        auth=(self.username, self.password))
+                if response.status_code == 200:
+                    log.info('Hop Server %s:%s ready in %.1f s', LOCALHOST, daemon['port'],
+                             time.time() - daemon['started'])
+                    return
+            except requests.ConnectionError:
+                pass
+            time.sleep(0.1)
+        self.__stop(daemon)
+        raise AirflowException(f'ERROR: Hop Server did not start in {self.startup_timeout} s'
+                               f', see {log_path}')
+
+    def __set_ready(self, pid):
+        with self.__locked():
+            daemons = self.__load()
+            for daemon in daemons:
+                if daemon['pid'] == pid:
+                    daemon['ready'] = True
+            self.__save(daemons)
+
+    def __reaper_alive(self) -> bool:
+        try:
+            with open(self.reaper_file, encoding='utf-8') as file:
+                return _alive(int(file.read()))
+        except (FileNotFoundError, ValueError):
+            return False
+
+    def __spawn_reaper(self):
+        """Starts the reaper process of the pool, unless it runs already"""
+        if self.__reaper_alive():
+            return
+        with open(f'{self.reaper_file}.log', mode='ab') as log_file:
+            process = subprocess.Popen(  # pylint: disable=consider-using-with
+                [sys.executable, '-m', 'airflow_hop.daemons', self.hop_server_path,
+                 self.hop_config_path or '', str(self.idle_timeout)],
+                stdin=subprocess.DEVNULL, stdout=log_file, stderr=subprocess.STDOUT,
+                start_new_session=True)
+        with open(self.reaper_file, mode='w', encoding='utf-8') as file:
+            file.write(str(process.pid))
+
+    @staticmethod
+    def __stop(daemon):
+        try:
+            os.killpg(daemon['pid'], signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def acquire(self) -> dict:
+        """
+        Leases the least busy server, starting a new one while the pool is not
+        full and every server is busy. Returns its host, port and lease. The
+        server is reserved under the pool lock, but its startup is waited for
+        outside of it, so that other tasks are not held meanwhile.
+        """
+        with self.__locked():
+            daemons = self.__prune(self.__load(), self.idle_timeout)
+            daemons.sort(key=lambda daemon: len(daemon['leases']))
+            if daemons and (not daemons[0]['leases'] or len(daemons) >= self.size):
+                daemon = daemons[0]
+            else:
+                daemon = self.__start()
+                daemons.append(daemon)
+                self.__spawn_reaper()
+            lease = f'{os.getpid()}:{uuid.uuid4()}'
+            daemon['leases'].append(lease)
+            self.__save(daemons)
+        leased = {'host': LOCALHOST, 'port': daemon['port'], 'pid': daemon['pid'], 'lease': lease}
+
+        if not daemon.get('ready', True):
+            try:
+                self.__wait_ready(daemon)
+            except AirflowException:
+                self.release(leased)
+                raise
+            self.__set_ready(daemon['pid'])
+        return leased
+
+    def release(self, leased):
+        with self.__locked():
+            daemons = self.__load()
+            for daemon in daemons:
+                if leased['lease'] in daemon['leases']:
+                    daemon['leases'].remove(leased['lease'])
+                    daemon['last_used'] = time.time()
+            self.__save(self.__prune(daemons, self.idle_timeout))
+
+    @contextlib.contextmanager
+    def lease(self):
+        leased = self.acquire()
+        try:
+            yield leased
+        finally:
+            self.release(leased)
+
+    def reap(self, idle_timeout=None) -> int:
+        """Stops the servers idle for idle_timeout seconds, returns how many are left"""
+        with self.__locked():
+            daemons = self.__prune(self.__load(), self.idle_timeout
+                                   if idle_timeout is None else idle_timeout)
+            self.__save(daemons)
+        return len(daemons)
+
+    def run_reaper(self, interval=None):
+        """
+        Stops the servers idle for idle_timeout seconds, every interval seconds,
+        until the pool has no server left. Run by the reaper process.
+        """
+        interval = interval or min(60.0, max(0.1, self.idle_timeout / 2))
+        while True:
+            time.sleep(interval)
+            with self.__locked():
+                daemons = self.__prune(self.__load(), self.idle_timeout)
+                self.__save(daemons)
+                if not daemons:
+                    # Under the lock, so that a server started meanwhile spawns a new reaper
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(self.reaper_file)
+                    return
+
+    def daemons(self) -> list:
+        with self.__locked():
+            return self.__prune(self.__load(), float('inf'))
+
+    def shutdown(self):
+        """Stops every server of the pool, even if leased, and its reaper"""
+        with self.__locked():
+            for daemon in self.__load():
+                self.__stop(daemon)
+            self.__save([])
+            if self.__reaper_alive():
+                with open(self.reaper_file, encoding='utf-8') as file:
+                    self.__stop({'pid': int(file.read())})
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.reaper_file)
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(hop_server_path=None, hop_config_path=None) -> HopServerPool:
+    """Returns the pool of this process for the given Hop Server binary"""
+    key = (hop_server_path, hop_config_path)
+    with _POOLS_LOCK:
+        if key not in _POOLS:
+            _POOLS[key] = HopServerPool(hop_server_path, hop_config_path=hop_config_path)
+        return _POOLS[key]
+
+
+def main():
+    """Entry point of the reaper process of a pool"""
+    hop_server_path, hop_config_path, idle_timeout = sys.argv[1:4]
+    logging.basicConfig(level=logging.INFO)
+    HopServerPool(hop_server_path, idle_timeout=float(idle_timeout),
+                  hop_config_path=hop_config_path or None).run_reaper()
+
+
+if __name__ == '__main__':
+    main()
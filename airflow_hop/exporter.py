@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Prometheus exporter for Hop Server capacity.
+
+Periodically samples /hop/status/ of every configured Hop server and exposes
+the running and finished executions, JVM memory, CPU and thread counts:
+
+    python -m airflow_hop.exporter --conn-id hop_default --port 9464
+
+Requires the prometheus-client package.
+"""
+
+import argparse
+import logging
+import threading
+import time
+
+from airflow_hop.hooks import HopHook
+from airflow_hop.metrics import parse_server_status
+
+try:
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # pragma: no cover
+    GaugeMetricFamily = None
+
+log = logging.getLogger(__name__)
+
+SERVER_GAUGES = (
+    ('memory_free', 'hop_server_memory_free_bytes', 'Free JVM memory', 1),
+    ('memory_total', 'hop_server_memory_total_bytes', 'Total JVM memory', 1),
+    ('cpu_cores', 'hop_server_cpu_cores', 'Available CPU cores', 1),
+    ('cpu_process_time', 'hop_server_cpu_process_time_seconds', 'JVM CPU time', 1e-9),
+    ('load_avg', 'hop_server_load_average', 'System load average', 1),
+    ('thread_count', 'hop_server_threads', 'JVM thread count', 1),
+    ('uptime', 'hop_server_uptime_seconds', 'Hop Server uptime', 1e-3),
+)
+
+
+class HopStatusCollector:
+    """
+    Prometheus collector that exposes the last status sampled from each Hop
+    server. Sampling happens in run() rather than on scrape so that scrapes
+    are cheap and Hop Server load does not depend on the number of scrapers.
+    """
+
+    def __init__(self, conn_ids=('hop_default',), interval=15):
+        if GaugeMetricFamily is None:
+            raise ImportError('prometheus-client is required by the Hop status exporter')
+        self.conn_ids = list(conn_ids)
+        self.interval = interval
+        self.samples = {}
+        self.__lock = threading.Lock()
+
+    def sample(self):
+        for conn_id in self.conn_ids:
+            started = time.perf_counter()
+            try:
+                hook = HopHook.get_hook(None, None, None, None, None, conn_id)
+                server = f'{hook.connection.host}:{hook.connection.port}'
+                status = parse_server_status(hook.get_conn().server_status())
+            except Exception as error:  # pylint: disable=broad-except
+                log.warning('Could not sample Hop server %s: %s', conn_id, error)
+                server, status = None, None
+            with self.__lock:
+                if server is None and conn_id in self.samples:
+                    server = self.samples[conn_id]['server']
+                self.samples[conn_id] = {
+                    'server': server or '',
+                    'status': status,
+                    'duration': time.perf_counter() - started,
+                }
+
+    def run(self, stop_event=None):
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            self.sample()
+            stop_event.wait(self.interval)
+
+    def collect(self):
+        labels = ['conn_id', 'server']
+        up = GaugeMetricFamily('hop_server_up', 'Whether the last sample succeeded', labels=labels)
+        duration = GaugeMetricFamily('hop_server_sample_duration_seconds',
+                                     'Duration of the last /hop/status/ call', labels=labels)
+        gauges = {key: GaugeMetricFamily(name, documentation, labels=labels)
+                  for key, name, documentation, _ in SERVER_GAUGES}
+        executions = {
+            key: GaugeMetricFamily(f'hop_server_{key}', f'Number of {key} per status',
+                                   labels=labels + ['status'])
+            for key in ('pipelines', 'workflows')}
+
+        with self.__lock:
+            samples = dict(self.samples)
+        for conn_id, sample in samples.items():
+            values = [conn_id, sample['server']]
+            status = sample['status']
+            up.add_metric(values, 0 if status is None else 1)
+            duration.add_metric(values, sample['duration'])
+            if status is None:
+                continue
+            for key, _, _, scale in SERVER_GAUGES:
+                if status[key] is not None:
+                    gauges[key].add_metric(values, status[key] * scale)
+            for key, family in executions.items():
+                for status_desc, count in status[key].items():
+                    family.add_metric(values + [status_desc], count)
+
+        yield up
+        yield duration
+        yield from gauges.values()
+        yield from executions.values()
+
+
+def main():
+    # pylint: disable=import-outside-toplevel
+    from prometheus_client import REGISTRY, start_http_server
+
+    parser = argparse.ArgumentParser(description='Prometheus exporter for Hop Server capacity')
+    parser.add_argument('--conn-id', action='append', dest='conn_ids',
+                        help='Airflow connection of a Hop server, can be repeated')
+    parser.add_argument('--port', type=int, default=9464)
+    parser.add_argument('--interval', type=float, default=15)
+    args = parser.parse_args()
+
+    collector = HopStatusCollector(args.conn_ids or ['hop_default'], args.interval)
+    REGISTRY.register(collector)
+    start_http_server(args.port)
+    collector.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -16,17 +16,41 @@ from airflow.exceptions import AirflowException
 from airflow.hooks.base import BaseHook
 from bs4 import BeautifulSoup
 
+import contextlib
+import fcntl
+import os
+import random
+import threading
+import time
+
 import requests
 import xmltodict
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from airflow_hop.archives import build_archive
+from airflow_hop.cache import get_cache_dir
+from airflow_hop.metrics import parse_server_status, timed
+from airflow_hop.tracing import set_attributes, start_span
 from airflow_hop.xml import XMLBuilder
 
 
 class HopHook(BaseHook):
     """
     Implementation hook to interact with Hop REST API
+
+    Hooks obtained through get_hook, the Airflow connections they resolve and
+    the HTTP sessions they use are shared by every task running in the same
+    worker process, e.g. mapped instances. Hooks and connections expire after
+    CACHE_TTL seconds and can be invalidated explicitly.
     """
 
+    CACHE_TTL = 300
+
+    LOCK = threading.RLock()
+    HOOKS = {}
+    CONNECTIONS = {}
+    SESSIONS = {}
+
     class HopServerConnection:
         """
         Implements a Hop Server connection
@@ -34,15 +58,28 @@ class HopHook(BaseHook):
 
         PREPARE_PIPELINE_EXEC = '/hop/prepareExec/'
         START_PIPELINE_EXEC = '/hop/startExec/'
+        START_PIPELINE = '/hop/startPipeline/'
         STOP_PIPELINE_EXEC = '/hop/stopPipeline/'
+        REMOVE_PIPELINE = '/hop/removePipeline/'
         REGISTER_PIPELINE = '/hop/registerPipeline/'
         PIPELINE_STATUS = '/hop/pipelineStatus/'
+        SNIFF_TRANSFORM = '/hop/sniffTransform/'
 
         REGISTER_WORKFLOW = '/hop/registerWorkflow/'
         WORKFLOW_STATUS = '/hop/workflowStatus/'
         START_WORKFLOW = '/hop/startWorkflow/'
         STOP_WORKFLOW = '/hop/stopWorkflow/'
 
+        SERVER_STATUS = '/hop/status/'
+        WEB_SERVICE = '/hop/webService/'
+        ADD_EXPORT = '/hop/addExport/'
+
+        END_STATUSES = ['Finished', 'Stopped', 'Finished (with errors)', 'Stopped (with errors)']
+        IDLE_STATUSES = ['Waiting']
+        MAX_BACKOFF = 60
+
+        POOL_MAXSIZE = 32
+
         def __init__(
                 self,
                 host,
@@ -54,7 +91,9 @@ class HopHook(BaseHook):
                 environment_name,
                 environment_path,
                 hop_config_path,
-                log_level):
+                log_level,
+                max_concurrent_executions=None,
+                admission_timeout=3600):
             self.host = host
             self.port = port
             self.username = username
@@ -65,6 +104,9 @@ class HopHook(BaseHook):
             self.environment_name = environment_name
             self.hop_config_path = hop_config_path
             self.log_level = log_level
+            self.max_concurrent_executions = max_concurrent_executions
+            self.admission_timeout = admission_timeout
+            self.__xml_builder = None
 
         def __get_url(self, endpoint):
             return f'http://{self.host}:{self.port}{endpoint}'
@@ -72,171 +114,298 @@ class HopHook(BaseHook):
         def __get_auth(self):
             return HTTPBasicAuth(self.username, self.password)
 
-        def register_pipeline(self, pipe_name, pipe_config, task_params=None):
-            xml_builder = XMLBuilder(
-                self.project_path,
-                self.project_name,
-                self.environment_path,
-                self.environment_name,
-                self.hop_config_path,
-                task_params)
-            data = xml_builder.get_pipeline_xml(pipe_name, pipe_config)
-            parameters = {'xml': 'Y'}
-            response = requests.post(url=self.__get_url(self.REGISTER_PIPELINE),
-                                     params=parameters, auth=self.__get_auth(),
-                                     data=data)
+        def __get_session(self) -> requests.Session:
+            key = (self.host, self.port, self.username)
+            with HopHook.LOCK:
+                if key not in HopHook.SESSIONS:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.POOL_MAXSIZE)
+                    session.mount('http://', adapter)
+                    HopHook.SESSIONS[key] = session
+                return HopHook.SESSIONS[key]
+
+        def __request(self, method, endpoint, parameters, data=None):
+            session = self.__get_session()
+            with start_span(f'hop.http {endpoint}', {
+                    'http.method': method,
+                    'http.url': self.__get_url(endpoint),
+                    'hop.endpoint': endpoint,
+                    'hop.execution_id': parameters.get('id'),
+                    'http.request_content_length': len(data) if data else 0}):
+                if method == 'POST':
+                    response = session.post(url=self.__get_url(endpoint), params=parameters,
+                                            auth=self.__get_auth(), data=data)
+                else:
+                    response = session.get(url=self.__get_url(endpoint), params=parameters,
+                                           auth=self.__get_auth())
+                set_attributes({
+                    'http.status_code': response.status_code,
+                    'http.response_content_length': int(
+                        response.headers.get('Content-Length') or len(response.content))})
+                self.__raise_for_status(response)
+                started = time.perf_counter()
+                result = xmltodict.parse(response.text)
+                set_attributes({'hop.parse_seconds': time.perf_counter() - started})
+                return result
+
+        @staticmethod
+        def __raise_for_status(response):
             if response.status_code >= 400:
                 data = BeautifulSoup(response.text, 'html.parser')
-                error = data.find('title').text
+                title = data.find('title')
+                error = title.text if title else response.text.strip()[:200]
                 raise AirflowException('{}: {}'.format('HTTP', error))
 
-            result = xmltodict.parse(response.text)
+        def __webresult(self, method, endpoint, parameters, data=None):
+            result = self.__request(method, endpoint, parameters, data)
             if 'ERROR' in result['webresult']['result']:
                 raise AirflowException('{}: {}'.format(
                     result['webresult']['result'],
                     result['webresult']['message']))
-            return xmltodict.parse(response.text)
-
-        def pipeline_status(self, pipe_name, pipe_id):
-            parameters = {'name': pipe_name, 'id': pipe_id, 'xml': 'Y'}
-            response = requests.get(url=self.__get_url(self.PIPELINE_STATUS),
-                                    params=parameters, auth=self.__get_auth())
-            if response.status_code >= 400:
-                data = BeautifulSoup(response.text, 'html.parser')
-                error = data.find('title').text
-                raise AirflowException('{}: {}'.format('HTTP', error))
+            return result
 
-            result = xmltodict.parse(response.text)
+        def __status(self, endpoint, parameters):
+            result = self.__request('GET', endpoint, parameters)
             if 'webresult' in result:
                 raise AirflowException('{}: {}'.format(
                     result['webresult']['result'],
                     result['webresult']['message']))
             return result
 
-        def prepare_pipeline_exec(self, pipe_name, pipe_id):
+        def get_xml_builder(self, task_params=None) -> XMLBuilder:
+            if self.__xml_builder is None or self.__xml_builder.is_stale():
+                with timed('config_load'):
+                    self.__xml_builder = XMLBuilder(
+                        self.project_path,
+                        self.project_name,
+                        self.environment_path,
+                        self.environment_name,
+                        self.hop_config_path,
+                        None)
+            return self.__xml_builder.with_task_params(task_params)
+
+        def get_pipeline_payload(self, pipe_name, pipe_config, task_params=None,
+                                 xml_builder=None) -> bytes:
+            if xml_builder is None:
+                xml_builder = self.get_xml_builder(task_params)
+            with timed('xml_build'):
+                return xml_builder.get_pipeline_xml(pipe_name, pipe_config)
+
+        def register_pipeline(self, pipe_name, pipe_config, task_params=None, xml_builder=None,
+                              payload=None):
+            if payload is None:
+                payload = self.get_pipeline_payload(pipe_name, pipe_config, task_params,
+                                                    xml_builder)
+            parameters = {'xml': 'Y'}
+            with timed('register'):
+                return self.__webresult('POST', self.REGISTER_PIPELINE, parameters, payload)
+
+        def pipeline_status(self, pipe_name, pipe_id):
             parameters = {'name': pipe_name, 'id': pipe_id, 'xml': 'Y'}
-            response = requests.get(url=self.__get_url(self.PREPARE_PIPELINE_EXEC),
-                                    params=parameters, auth=self.__get_auth())
-            if response.status_code >= 400:
-                data = BeautifulSoup(response.text, 'html.parser')
-                error = data.find('title').text
-                raise AirflowException('{}: {}'.format('HTTP', error))
+            with timed('status'):
+                return self.__status(self.PIPELINE_STATUS, parameters)
 
-            result = xmltodict.parse(response.text)
-            if 'ERROR' in result['webresult']['result']:
-                raise AirflowException('{}: {}'.format(
-                    result['webresult']['result'],
-                    result['webresult']['message']))
-            return xmltodict.parse(response.text)
+        def prepare_pipeline_exec(self, pipe_name, pipe_id):
+            parameters = {'name': pipe_name, 'id': pipe_id, 'xml': 'Y'}
+            with timed('prepare'):
+                return self.__webresult('GET', self.PREPARE_PIPELINE_EXEC, parameters)
 
         def start_pipeline_execution(self, pipe_name, pipe_id):
             parameters = {'name': pipe_name, 'id': pipe_id, 'xml': 'Y'}
-            response = requests.get(url=self.__get_url(self.START_PIPELINE_EXEC),
-                                    params=parameters, auth=self.__get_auth())
-            if response.status_code >= 400:
-                data = BeautifulSoup(response.text, 'html.parser')
-                error = data.find('title').text
-                raise AirflowException('{}: {}'.format('HTTP', error))
+            with timed('start'):
+                return self.__webresult('GET', self.START_PIPELINE_EXEC, parameters)
 
-            result = xmltodict.parse(response.text)
-            if 'ERROR' in result['webresult']['result']:
-                raise AirflowException('{}: {}'.format(
-                    result['webresult']['result'],
-                    result['webresult']['message']))
-            return xmltodict.parse(response.text)
+        def start_pipeline(self, pipe_name, pipe_id):
+            """Prepares and starts a registered pipeline in a single call"""
+            parameters = {'name': pipe_name, 'id': pipe_id, 'xml': 'Y'}
+            with timed('start'):
+                return self.__webresult('GET', self.START_PIPELINE, parameters)
 
         def stop_pipeline_execution(self, pipe_name, pipe_id):
             parameters = {'name': pipe_name, 'id': pipe_id, 'xml': 'Y'}
-            response = requests.get(url=self.__get_url(self.STOP_PIPELINE_EXEC),
-                                    params=parameters, auth=self.__get_auth())
-            if response.status_code >= 400:
-                data = BeautifulSoup(response.text, 'html.parser')
-                error = data.find('title').text
-                raise AirflowException('{}: {}'.format('HTTP', error))
+            with timed('stop'):
+                return self.__webresult('GET', self.STOP_PIPELINE_EXEC, parameters)
 
-            result = xmltodict.parse(response.text)
-            if 'ERROR' in result['webresult']['result']:
-                raise AirflowException('{}: {}'.format(
-                    result['webresult']['result'],
-                    result['webresult']['message']))
-            return xmltodict.parse(response.text)
-
-        def register_workflow(self, workflow_name, task_params=None):
-            xml_builder = XMLBuilder(
-                self.project_path,
-                self.project_name,
-                self.environment_path,
-                self.environment_name,
-                self.hop_config_path,
-                task_params)
-            data = xml_builder.get_workflow_xml(workflow_name)
+        def remove_pipeline(self, pipe_name, pipe_id):
+            """Removes a pipeline execution which is not running from the server"""
+            parameters = {'name': pipe_name, 'id': pipe_id, 'xml': 'Y'}
+            with timed('remove'):
+                return self.__webresult('GET', self.REMOVE_PIPELINE, parameters)
+
+        def sniff_transform(self, pipe_name, pipe_id, transform_name, copy_nr=0, lines=1000,
+                            direction='output'):
+            """
+            Returns the next rows, up to lines, going through the input or
+            output of a transform copy of a running pipeline. The server waits
+            for the rows or the end of the transform.
+            """
+            parameters = {'pipeline': pipe_name, 'id': pipe_id, 'transform': transform_name,
+                          'copynr': copy_nr, 'lines': lines, 'type': direction, 'xml': 'Y'}
+            with timed('sniff'):
+                return self.__status(self.SNIFF_TRANSFORM, parameters)
+
+        def call_web_service(self, service, parameters=None, body=None, run_config=None,
+                             output=None, chunk_size=65536) -> dict:
+            """
+            Runs a pipeline the server exposes as a web service and returns its
+            response in one round trip. Parameters are passed as request
+            parameters and the body, if any, is posted. The response is copied
+            chunk by chunk to the output file object when given and returned as
+            bytes otherwise.
+            """
+            parameters = dict(parameters or {}, service=service)
+            if run_config:
+                parameters['runConfig'] = run_config
+            method = 'GET' if body is None else 'POST'
+            session = self.__get_session()
+            started = time.perf_counter()
+            with timed('web_service', **{'hop.service': service}):
+                with start_span(f'hop.http {self.WEB_SERVICE}', {
+                        'http.method': method,
+                        'http.url': self.__get_url(self.WEB_SERVICE),
+                        'hop.endpoint': self.WEB_SERVICE,
+                        'http.request_content_length': len(body) if body else 0}):
+                    if method == 'POST':
+                        response = session.post(url=self.__get_url(self.WEB_SERVICE),
+                                                params=parameters, auth=self.__get_auth(),
+                                                data=body, stream=True)
+                    else:
+                        response = session.get(url=self.__get_url(self.WEB_SERVICE),
+                                               params=parameters, auth=self.__get_auth(),
+                                               stream=True)
+                    with contextlib.closing(response):
+                        set_attributes({'http.status_code': response.status_code})
+                        self.__raise_for_status(response)
+                        size = 0
+                        chunks = []
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            size += len(chunk)
+                            if output is None:
+                                chunks.append(chunk)
+                            else:
+                                output.write(chunk)
+                        set_attributes({'http.response_content_length': size})
+            return {
+                'content_type': response.headers.get('Content-Type'),
+                'bytes': size,
+                'seconds': time.perf_counter() - started,
+                'body': None if output is not None else b''.join(chunks),
+            }
+
+        def get_export_payload(self, name, project_home='${PROJECT_HOME}') -> bytes:
+            """Returns the export archive of a project file and its child files"""
+            with timed('archive_build'):
+                archive = build_archive(self.project_path, name, project_home)
+            with open(archive, mode='br') as file:
+                return file.read()
+
+        def register_export(self, name, archive_type='pipeline', payload=None):
+            """
+            Registers the pipeline or workflow from its export archive, so that
+            child pipelines and workflows do not need to be on the server.
+            """
+            if payload is None:
+                payload = self.get_export_payload(name)
+            parameters = {'type': archive_type, 'load': '/' + name.lstrip('/')}
+            with timed('register'):
+                return self.__webresult('POST', self.ADD_EXPORT, parameters, payload)
+
+        def server_status(self):
             parameters = {'xml': 'Y'}
-            response = requests.post(url=self.__get_url(self.REGISTER_WORKFLOW),
-                                     params=parameters, auth=self.__get_auth(),
-                                     data=data,
-                                     )
-            if response.status_code >= 400:
-                data = BeautifulSoup(response.text, 'html.parser')
-                error = data.find('title').text
-                raise AirflowException('{}: {}'.format('HTTP', error))
+            with timed('server_status'):
+                return self.__request('GET', self.SERVER_STATUS, parameters)
 
-            result = xmltodict.parse(response.text)
-            if 'ERROR' in result['webresult']['result']:
-                raise AirflowException('{}: {}'.format(
-                    result['webresult']['result'],
-                    result['webresult']['message']))
-            return xmltodict.parse(response.text)
+        def active_executions(self) -> int:
+            server = parse_server_status(self.server_status())
+            return sum(count for executions in (server['pipelines'], server['workflows'])
+                       for status, count in executions.items()
+                       if status not in self.END_STATUSES + self.IDLE_STATUSES)
+
+        def __acquire_slot(self):
+            """
+            Returns an open slot file locked for the server, one of
+            max_concurrent_executions shared by every task process of the
+            worker, or None when they are all taken
+            """
+            folder = get_cache_dir('admission')
+            for slot in range(self.max_concurrent_executions):
+                # pylint: disable=consider-using-with
+                file = open(os.path.join(folder, f'{self.host}_{self.port}.{slot}.lock'), 'a')
+                try:
+                    fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return file
+                except OSError:
+                    file.close()
+            return None
+
+        @staticmethod
+        def __release_slot(file):
+            fcntl.flock(file, fcntl.LOCK_UN)
+            file.close()
+
+        @contextlib.contextmanager
+        def admission(self):
+            """
+            Waits until the server runs fewer than max_concurrent_executions
+            pipelines and workflows, backing off exponentially, and holds one of
+            the worker's slots for the server during the block. The slots cap
+            the executions of every task process of the worker; workers reading
+            the server status at the same time may still all start, so this
+            only smooths bursts and Airflow pools are the strict limit.
+            """
+            if not self.max_concurrent_executions:
+                yield
+                return
+
+            deadline = time.monotonic() + self.admission_timeout
+            delay = 1
+            with timed('admission'):
+                while True:
+                    slot = self.__acquire_slot()
+                    if slot is not None:
+                        if self.active_executions() < self.max_concurrent_executions:
+                            break
+                        self.__release_slot(slot)
+                    if time.monotonic() + delay > deadline:
+                        raise AirflowException(
+                            f'Hop server {self.host}:{self.port} did not admit the execution '
+                            f'within {self.admission_timeout} seconds')
+                    time.sleep(delay * random.uniform(0.5, 1.5))
+                    delay = min(delay * 2, self.MAX_BACKOFF)
+            try:
+                yield
+            finally:
+                self.__release_slot(slot)
+
+        def get_workflow_payload(self, workflow_name, task_params=None,
+                                 xml_builder=None) -> bytes:
+            if xml_builder is None:
+                xml_builder = self.get_xml_builder(task_params)
+            with timed('xml_build'):
+                return xml_builder.get_workflow_xml(workflow_name)
+
+        def register_workflow(self, workflow_name, task_params=None, xml_builder=None,
+                              payload=None):
+            if payload is None:
+                payload = self.get_workflow_payload(workflow_name, task_params, xml_builder)
+            parameters = {'xml': 'Y'}
+            with timed('register'):
+                return self.__webresult('POST', self.REGISTER_WORKFLOW, parameters, payload)
 
         def workflow_status(self, workflow_name, workflow_id):
             parameters = {'name': workflow_name, 'id': workflow_id, 'xml': 'Y'}
-            response = requests.get(url=self.__get_url(self.WORKFLOW_STATUS),
-                                    params=parameters, auth=self.__get_auth(),
-                                    )
-            if response.status_code >= 400:
-                data = BeautifulSoup(response.text, 'html.parser')
-                error = data.find('title').text
-                raise AirflowException('{}: {}'.format('HTTP', error))
-
-            result = xmltodict.parse(response.text)
-            if 'webresult' in result:
-                raise AirflowException('{}: {}'.format(
-                    result['webresult']['result'],
-                    result['webresult']['message']))
-            return result
+            with timed('status'):
+                return self.__status(self.WORKFLOW_STATUS, parameters)
 
         def start_workflow(self, workflow_name, workflow_id):
             parameters = {'name': workflow_name, 'id': workflow_id, 'xml': 'Y'}
-            response = requests.get(url=self.__get_url(self.START_WORKFLOW),
-                                    params=parameters, auth=self.__get_auth(),
-                                    )
-            if response.status_code >= 400:
-                data = BeautifulSoup(response.text, 'html.parser')
-                error = data.find('title').text
-                raise AirflowException('{}: {}'.format('HTTP', error))
-
-            result = xmltodict.parse(response.text)
-            if 'ERROR' in result['webresult']['result']:
-                raise AirflowException('{}: {}'.format(
-                    result['webresult']['result'],
-                    result['webresult']['message']))
-            return xmltodict.parse(response.text)
+            with timed('start'):
+                return self.__webresult('GET', self.START_WORKFLOW, parameters)
 
         def stop_workflow(self, workflow_name, workflow_id):
             parameters = {'name': workflow_name, 'id': workflow_id, 'xml': 'Y'}
-            response = requests.get(url=self.__get_url(self.STOP_WORKFLOW),
-                                    params=parameters, auth=self.__get_auth(),
-                                    )
-            if response.status_code >= 400:
-                data = BeautifulSoup(response.text, 'html.parser')
-                error = data.find('title').text
-                raise AirflowException('{}: {}'.format('HTTP', error))
-
-            result = xmltodict.parse(response.text)
-            if 'ERROR' in result['webresult']['result']:
-                raise AirflowException('{}: {}'.format(
-                    result['webresult']['result'],
-                    result['webresult']['message']))
-            return xmltodict.parse(response.text)
+            with timed('stop'):
+                return self.__webresult('GET', self.STOP_WORKFLOW, parameters)
 
     def __init__(
             self,
@@ -250,8 +419,7 @@ class HopHook(BaseHook):
         """Hop Hook constructor to initialize the object."""
 
         self.conn_id = conn_id
-        self.connection = self.get_connection(conn_id)
-        self.extras = self.connection.extra_dejson
+        self.connection = self.get_cached_connection(conn_id)
         self.extras = self.connection.extra_dejson
         self.project_path = project_path
         self.project_name = project_name
@@ -275,5 +443,74 @@ class HopHook(BaseHook):
             environment_name=self.environment_name,
             environment_path=self.environment_path,
             hop_config_path=self.hop_config_path,
-            log_level=self.log_level)
+            log_level=self.log_level,
+            max_concurrent_executions=self.extras.get('max_concurrent_executions'),
+            admission_timeout=self.extras.get('admission_timeout', 3600))
         return self.hop_client
+
+    @classmethod
+    def get_cached_connection(cls, conn_id, ttl=None):
+        """
+        Returns the Airflow connection, looking it up in the metadata database or
+        secrets backend at most once every ttl seconds per process.
+        """
+        ttl = cls.CACHE_TTL if ttl is None else ttl
+        with cls.LOCK:
+            cached = cls.CONNECTIONS.get(conn_id)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+        connection = cls.get_connection(conn_id)
+        with cls.LOCK:
+            cls.CONNECTIONS[conn_id] = (time.monotonic() + ttl, connection)
+        return connection
+
+    @classmethod
+    def get_hook(
+            cls,
+            project_path,
+            project_name,
+            environment_path,
+            environment_name,
+            hop_config_path,
+            conn_id='hop_default',
+            log_level='Basic',
+            ttl=None) -> 'HopHook':
+        """
+        Returns a hook shared by every caller of this process with the same
+        settings, together with its Hop Server connection, for ttl seconds.
+        """
+        ttl = cls.CACHE_TTL if ttl is None else ttl
+        key = (conn_id, project_path, project_name, environment_path, environment_name,
+               hop_config_path, log_level)
+        with cls.LOCK:
+            cached = cls.HOOKS.get(key)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+        hook = cls(project_path, project_name, environment_path, environment_name,
+                   hop_config_path, conn_id, log_level)
+        with cls.LOCK:
+            cls.HOOKS[key] = (time.monotonic() + ttl, hook)
+        return hook
+
+    @classmethod
+    def invalidate(cls, conn_id=None):
+        """
+        Drops the cached connection and hooks of conn_id, or of every connection
+        when it is not given, so that the next lookup reaches Airflow again.
+        """
+        with cls.LOCK:
+            for key in list(cls.HOOKS):
+                if conn_id is None or key[0] == conn_id:
+                    del cls.HOOKS[key]
+            for key in list(cls.CONNECTIONS):
+                if conn_id is None or key == conn_id:
+                    del cls.CONNECTIONS[key]
+
+    @classmethod
+    def clear_cache(cls):
+        """Drops every hook, connection and HTTP session shared by this process."""
+        with cls.LOCK:
+            cls.invalidate()
+            for session in cls.SESSIONS.values():
+                session.close()
+            cls.SESSIONS.clear()
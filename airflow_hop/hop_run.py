@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Local execution of pipelines and workflows with hop-run"""
+
+import os
+import subprocess
+import tempfile
+import threading
+
+from airflow.exceptions import AirflowException
+
+from airflow_hop.xml import XMLBuilder
+
+HOP_RUN_ENV = 'AIRFLOW_HOP_RUN'
+DEFAULT_HOP_RUN = 'hop-run.sh'
+# Read by the java launcher of hop-run, without showing on its command line
+JAVA_OPTIONS_ENV = 'JDK_JAVA_OPTIONS'
+
+
+def _quote(argument) -> str:
+    """Quotes an argument of a Java argument file"""
+    for char, escaped in (('\\', '\\\\'), ('"', '\\"'), ('\n', '\\n'), ('\r', '\\r')):
+        argument = argument.replace(char, escaped)
+    return f'"{argument}"'
+
+
+class HopRun:
+    """
+    Runs pipelines and workflows in a local hop-run process instead of Hop
+    Server. Variables are resolved by XMLBuilder from the same configuration
+    files as the payloads sent to Hop Server, and passed as system properties
+    through a Java argument file, so that secrets do not show on the command
+    line. Pipelines run with their pipe_config, run_config otherwise.
+    """
+
+    def __init__(self,
+                 project_path,
+                 project_name,
+                 environment_path,
+                 environment_name,
+                 hop_config_path,
+                 task_params=None,
+                 log_level='Basic',
+                 hop_run_path=None,
+                 run_config='local'):
+        self.project_path = project_path
+        self.hop_config_path = hop_config_path
+        self.log_level = log_level
+        self.hop_run_path = hop_run_path or os.environ.get(HOP_RUN_ENV) or DEFAULT_HOP_RUN
+        self.run_config = run_config
+        self.xml_builder = XMLBuilder(project_path, project_name, environment_path,
+                                      environment_name, hop_config_path, task_params)
+        self.process = None
+        self.__lock = threading.Lock()
+        self.__killed = False
+
+    def get_command(self, filename, pipe_config=None) -> list:
+        command = [
+            self.hop_run_path,
+            f'--file={self.project_path}/{filename}',
+            f'--runconfig={pipe_config or self.run_config}',
+            f'--level={self.log_level}',
+        ]
+        for name in self.xml_builder.task_params:
+            value = self.xml_builder.task_params[name]
+            if ',' in str(value):
+                raise AirflowException(f'ERROR: parameter {name} contains a comma, which '
+                                       'hop-run takes as a separator')
+            command.append(f'--parameters={name}={value}')
+        return command
+
+    def write_arguments(self, pipe_config=None) -> str:
+        """
+        Writes the variables as system properties to a Java argument file only
+        readable by the user, returns its path
+        """
+        fd, path = tempfile.mkstemp(prefix='hop-run-', suffix='.args')
+        with os.fdopen(fd, mode='w', encoding='utf-8') as file:
+            for name, value in self.xml_builder.get_variables(pipe_config):
+                file.write(_quote(f'-D{name}={value}') + '\n')
+        return path
+
+    def get_environment(self, arguments_file=None) -> dict:
+        environment = dict(os.environ,
+                           HOP_CONFIG_FOLDER=self.hop_config_path,
+                           HOP_METADATA_FOLDER=f'{self.project_path}/metadata')
+        if arguments_file:
+            options = os.environ.get(JAVA_OPTIONS_ENV)
+            environment[JAVA_OPTIONS_ENV] = f'{options} @{arguments_file}' if options \
+                else f'@{arguments_file}'
+        return environment
+
+    def run(self, filename, log, pipe_config=None) -> int:
+        """
+        Runs the file and writes every line hop-run prints to stdout or stderr
+        to the log as soon as it is printed. Returns the exit code.
+        """
+        command = self.get_command(filename, pipe_config)
+        arguments_file = self.write_arguments(pipe_config)
+        try:
+            with self.__lock:
+                if self.__killed:
+                    raise AirflowException(f'ERROR: {filename} was killed before starting')
+                try:
+                    self.process = subprocess.Popen(  # pylint: disable=consider-using-with
+                        command, env=self.get_environment(arguments_file),
+                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                        text=True, errors='replace', bufsize=1)
+                except FileNotFoundError as error:
+                    raise AirflowException(f'ERROR: {self.hop_run_path} not found') from error
+
+            with self.process.stdout:
+                for line in self.process.stdout:
+                    log.info(line.rstrip('\n'))
+            return self.process.wait()
+        finally:
+            os.remove(arguments_file)
+
+    def kill(self):
+        """Terminates the hop-run process, if any"""
+        with self.__lock:
+            self.__killed = True
+            if self.process is not None and self.process.poll() is None:
+                self.process.terminate()
@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Pipeline and workflow execution metrics"""
+
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+from airflow.stats import Stats
+from airflow_hop.tracing import start_span
+
+log = logging.getLogger(__name__)
+
+HOP_DATE_FORMAT = '%Y/%m/%d %H:%M:%S.%f'
+
+TRANSFORM_COUNTERS = {
+    'linesRead': 'lines_read',
+    'linesWritten': 'lines_written',
+    'linesInput': 'lines_input',
+    'linesOutput': 'lines_output',
+    'linesUpdated': 'lines_updated',
+    'linesRejected': 'lines_rejected',
+    'errors': 'errors',
+}
+TRANSFORM_GAUGES = ('input_buffer_size', 'output_buffer_size', 'seconds', 'rows_per_second')
+
+HOP_LOG_DATE_FORMAT = '%Y/%m/%d %H:%M:%S'
+ACTION_STARTED = re.compile(
+    r'^(\d{4}/\d\d/\d\d \d\d:\d\d:\d\d) - .* - Starting action \[(.+)\]\s*$')
+ACTION_FINISHED = re.compile(
+    r'^(\d{4}/\d\d/\d\d \d\d:\d\d:\d\d) - .* - Finished action \[(.+)\] '
+    r'\(result=\[(\w+)\]\)')
+TRANSFORM_FINISHED = re.compile(
+    r' - Finished processing \(I=(\d+), O=(\d+), R=(\d+), W=(\d+), U=(\d+), E=(\d+)\)')
+ACTION_COUNTERS = ('lines_input', 'lines_output', 'lines_read', 'lines_written',
+                   'lines_updated', 'errors')
+
+
+def _to_number(value, number_type=int):
+    if value is None:
+        return None
+    try:
+        return number_type(str(value).strip().replace(',', ''))
+    except ValueError:
+        return None
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def stat_name(name) -> str:
+    """Replaces the characters StatsD metric names do not allow"""
+    return re.sub(r'[^a-zA-Z0-9_\-]', '_', str(name))
+
+
+def parse_transform_status(status) -> list:
+    """
+    Parses the transform_status rows of a pipeline-status response into a list
+    of flat dictionaries, one per transform copy.
+    """
+    transform_list = status.get('transform_status_list') or {}
+    transforms = []
+    for row in _as_list(transform_list.get('transform_status')):
+        transform = {
+            'name': row.get('transformName'),
+            'copy': _to_number(row.get('copy')) or 0,
+            'status': row.get('statusDescription'),
+        }
+        for field, key in TRANSFORM_COUNTERS.items():
+            transform[key] = _to_number(row.get(field)) or 0
+        transform['input_buffer_size'] = _to_number(row.get('input_buffer_size')) or 0
+        transform['output_buffer_size'] = _to_number(row.get('output_buffer_size')) or 0
+        transform['seconds'] = _to_number(row.get('seconds'), float) or 0.0
+        transform['rows_per_second'] = _to_number(row.get('speed'), float)
+        transforms.append(transform)
+    return transforms
+
+
+def parse_server_status(result) -> dict:
+    """
+    Parses a /hop/status/ response into the server resource usage and the
+    number of pipelines and workflows per status.
+    """
+    status = result.get('serverstatus') or {}
+    server = {
+        'status': status.get('statusdesc'),
+        'memory_free': _to_number(status.get('memory_free')),
+        'memory_total': _to_number(status.get('memory_total')),
+        'cpu_cores': _to_number(status.get('cpu_cores')),
+        'cpu_process_time': _to_number(status.get('cpu_process_time')),
+        'uptime': _to_number(status.get('uptime')),
+        'thread_count': _to_number(status.get('thread_count')),
+        'load_avg': _to_number(status.get('load_avg'), float),
+        'pipelines': {},
+        'workflows': {},
+    }
+    for key, list_tag, item_tag in (('pipelines', 'pipeline_status_list', 'pipeline-status'),
+                                    ('workflows', 'workflow_status_list', 'workflow-status')):
+        executions = status.get(list_tag) or {}
+        for execution in _as_list(executions.get(item_tag)):
+            status_desc = execution.get('status_desc') or 'Unknown'
+            server[key][status_desc] = server[key].get(status_desc, 0) + 1
+    return server
+
+
+def emit_transform_metrics(pipeline_name, transforms):
+    """
+    Sends the row counters of every transform to StatsD as counters and their
+    buffer sizes, duration and speed as gauges, named
+    hop.pipeline.<pipeline>.transform.<transform>[_<copy>].<metric>
+    """
+    prefix = f'hop.pipeline.{stat_name(pipeline_name)}.transform'
+    for transform in transforms:
+        name = stat_name(transform['name'])
+        if transform['copy']:
+            name = f'{name}_{transform["copy"]}'
+        tags = {
+            'pipeline': str(pipeline_name),
+            'transform': str(transform['name']),
+            'copy': str(transform['copy']),
+        }
+        for key in TRANSFORM_COUNTERS.values():
+            Stats.incr(f'{prefix}.{name}.{key}', count=transform[key], tags=tags)
+        for key in TRANSFORM_GAUGES:
+            if transform[key] is not None:
+                Stats.gauge(f'{prefix}.{name}.{key}', transform[key], tags=tags)
+
+
+def parse_action_results(log_text) -> list:
+    """
+    Parses the actions run by a workflow from its log into a list of
+    dictionaries with their result, start, end, duration in seconds and the
+    rows processed by the transforms that finished while the action was the
+    only one running. Actions run several times appear once per run.
+    """
+    actions = []
+    running = []
+    for line in re.split(r'\r\n|\n|\r', log_text or ''):
+        started = ACTION_STARTED.match(line)
+        if started:
+            action = {'name': started.group(2), 'result': None, 'started': started.group(1),
+                      'finished': None, 'seconds': None}
+            action.update({key: 0 for key in ACTION_COUNTERS})
+            actions.append(action)
+            running.append(action)
+            continue
+        finished = ACTION_FINISHED.match(line)
+        if finished:
+            action = next((action for action in reversed(running)
+                           if action['name'] == finished.group(2)), None)
+            if action is None:
+                continue
+            running.remove(action)
+            action['result'] = finished.group(3).lower() in ('true', 'y')
+            action['finished'] = finished.group(1)
+            action['seconds'] = (datetime.strptime(action['finished'], HOP_LOG_DATE_FORMAT)
+                                 - datetime.strptime(action['started'], HOP_LOG_DATE_FORMAT)
+                                 ).total_seconds()
+            continue
+        rows = TRANSFORM_FINISHED.search(line)
+        if rows and len(running) == 1:
+            for key, value in zip(ACTION_COUNTERS, rows.groups()):
+                running[0][key] += int(value)
+    return actions
+
+
+def emit_action_metrics(workflow_name, actions):
+    """
+    Sends the row counters of every workflow action to StatsD as counters and
+    their duration as a gauge, named hop.workflow.<workflow>.action.<action>.<metric>
+    """
+    prefix = f'hop.workflow.{stat_name(workflow_name)}.action'
+    for action in actions:
+        name = stat_name(action['name'])
+        tags = {'workflow': str(workflow_name), 'action': str(action['name']),
+                'result': str(action['result'])}
+        for key in ACTION_COUNTERS:
+            Stats.incr(f'{prefix}.{name}.{key}', count=action[key], tags=tags)
+        if action['seconds'] is not None:
+            Stats.gauge(f'{prefix}.{name}.seconds', action['seconds'], tags=tags)
+
+
+class TransformSampler:
+    """
+    Records a time series of rows processed and buffer sizes per transform from
+    consecutive pipeline-status responses and derives a bottleneck report.
+
+    A transform is reported as input starved when its input buffer was empty in
+    most of the samples taken while it was running, and as output blocked when
+    its output buffer was close to the rowset size, i.e. the transforms after it
+    cannot keep up. The bottleneck is the transform with the most rows waiting
+    in its input buffer on average.
+    """
+
+    RUNNING_STATUSES = ('Running', 'Init', 'Paused')
+
+    def __init__(self, rowset_size=10000, threshold=0.8):
+        self.rowset_size = rowset_size
+        self.threshold = threshold
+        self.series = {}
+        self.__start = None
+
+    def sample(self, status, timestamp=None):
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        if self.__start is None:
+            self.__start = timestamp
+        for transform in parse_transform_status(status):
+            rows = max(transform['lines_read'], transform['lines_written'],
+                       transform['lines_input'], transform['lines_output'])
+            key = transform['name'] if not transform['copy'] \
+                else f'{transform["name"]}.{transform["copy"]}'
+            self.series.setdefault(key, []).append({
+                'time': round(timestamp - self.__start, 3),
+                'status': transform['status'],
+                'rows': rows,
+                'lines_read': transform['lines_read'],
+                'seconds': transform['seconds'],
+                'input_buffer_size': transform['input_buffer_size'],
+                'output_buffer_size': transform['output_buffer_size'],
+            })
+
+    def report(self) -> dict:
+        transforms = {}
+        for name, samples in self.series.items():
+            running = [sample for sample in samples
+                       if sample['status'] in self.RUNNING_STATUSES] or samples
+            last = samples[-1]
+            started = next((sample['time'] for sample in samples if sample['rows']),
+                           samples[0]['time'])
+            elapsed = last['seconds'] or last['time'] - started
+            transforms[name] = {
+                'rows': last['rows'],
+                'seconds': elapsed,
+                'rows_per_second': round(last['rows'] / elapsed, 3) if elapsed > 0 else None,
+                'input_starved': last['lines_read'] > 0 and self.__ratio(
+                    running, lambda sample: sample['input_buffer_size'] == 0) >= self.threshold,
+                'output_blocked': self.__ratio(
+                    running, lambda sample: sample['output_buffer_size']
+                    >= self.threshold * self.rowset_size) >= 0.5,
+                'avg_input_buffer': round(sum(sample['input_buffer_size'] for sample in running)
+                                          / len(running), 3),
+            }
+
+        measured = {name: transform for name, transform in transforms.items()
+                    if transform['rows_per_second'] is not None}
+        queued = {name: transform for name, transform in transforms.items()
+                  if transform['avg_input_buffer'] > 0}
+        times = [sample['time'] for samples in self.series.values() for sample in samples]
+        elapsed = max([max(times) - min(times) if times else 0]
+                      + [transform['seconds'] for transform in transforms.values()])
+        rows = max((transform['rows'] for transform in transforms.values()), default=0)
+        return {
+            'samples': max((len(samples) for samples in self.series.values()), default=0),
+            'elapsed_seconds': round(elapsed, 3),
+            'effective_rows_per_second': round(rows / elapsed, 3) if elapsed > 0 else None,
+            'slowest_transform': min(measured, key=lambda name: measured[name]['rows_per_second'],
+                                     default=None),
+            'bottleneck': max(queued, key=lambda name: queued[name]['avg_input_buffer'],
+                              default=None),
+            'input_starved': sorted(name for name, transform in transforms.items()
+                                    if transform['input_starved']),
+            'output_blocked': sorted(name for name, transform in transforms.items()
+                                     if transform['output_blocked']),
+            'transforms': transforms,
+        }
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, mode='w', encoding='utf-8') as file:
+            json.dump({'report': self.report(), 'series': self.series}, file, indent=2)
+
+    @staticmethod
+    def __ratio(samples, predicate) -> float:
+        return sum(1 for sample in samples if predicate(sample)) / len(samples)
+
+
+def execution_seconds(status):
+    """Returns the execution time reported by a status response, if any"""
+    try:
+        start = datetime.strptime(status['execution_start_date'], HOP_DATE_FORMAT)
+        end = datetime.strptime(status['execution_end_date'], HOP_DATE_FORMAT)
+    except (KeyError, TypeError, ValueError):
+        return None
+    return (end - start).total_seconds()
+
+
+class PhaseTimer:
+    """
+    Accumulates the time a task spends in each phase of its lifecycle, as
+    recorded by timed() blocks run while the timer is active, and compares it
+    with the runtime of the pipeline or workflow itself. Runtimes of concurrent
+    executions add up, in which case no overhead can be derived.
+    """
+
+    __current = contextvars.ContextVar('airflow_hop_phase_timer', default=None)
+
+    def __init__(self):
+        self.phases = {}
+        self.runtime_seconds = None
+        self.__lock = threading.Lock()
+        self.__start = None
+        self.__token = None
+
+    def __enter__(self) -> 'PhaseTimer':
+        self.__start = time.perf_counter()
+        self.__token = self.__current.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.__current.reset(self.__token)
+
+    @classmethod
+    def current(cls):
+        return cls.__current.get()
+
+    def record(self, phase, seconds):
+        with self.__lock:
+            totals = self.phases.setdefault(phase, {'seconds': 0.0, 'count': 0})
+            totals['seconds'] += seconds
+            totals['count'] += 1
+
+    def add_runtime(self, seconds):
+        with self.__lock:
+            self.runtime_seconds = (self.runtime_seconds or 0.0) + seconds
+
+    def summary(self) -> dict:
+        total = time.perf_counter() - self.__start
+        runtime = self.runtime_seconds
+        overhead = None if runtime is None or runtime > total else total - runtime
+        return {
+            'total_seconds': round(total, 3),
+            'runtime_seconds': None if runtime is None else round(runtime, 3),
+            'overhead_seconds': None if overhead is None else round(overhead, 3),
+            'phases': {phase: {'seconds': round(totals['seconds'], 3), 'count': totals['count']}
+                       for phase, totals in self.phases.items()},
+        }
+
+
+@contextlib.contextmanager
+def timed(phase, **attributes):
+    """
+    Times a block as a lifecycle phase: the duration is sent to StatsD as the
+    hop.phase.<phase> timer, logged with structured fields, recorded in the
+    active PhaseTimer and wrapped in an OpenTelemetry span when available.
+    """
+    start = time.perf_counter()
+    with start_span(f'hop.{phase}', attributes):
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            Stats.timing(f'hop.phase.{phase}', timedelta(seconds=elapsed))
+            log.debug('Hop phase %s took %.3f s', phase, elapsed,
+                      extra={'hop_phase': phase, 'hop_phase_seconds': elapsed})
+            timer = PhaseTimer.current()
+            if timer is not None:
+                timer.record(phase, elapsed)
@@ -13,15 +13,37 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import base64
+import contextlib
+import copy
+import contextvars
+import datetime
+import functools
+import json
+import os
 import re
+import threading
 import zlib
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
+
+import requests
 from airflow.exceptions import AirflowException
 
 from airflow.models import BaseOperator
+from airflow.utils import timezone
 from airflow.utils.context import Context
+from airflow_hop.cache import files_signature
+from airflow_hop.daemons import get_pool
 from airflow_hop.hooks import HopHook
+from airflow_hop.hop_run import HopRun
+from airflow_hop.metrics import emit_action_metrics, parse_action_results
+from airflow_hop.metrics import emit_transform_metrics, parse_transform_status
+from airflow_hop.metrics import PhaseTimer, TransformSampler, execution_seconds, timed
+from airflow_hop.partitions import split_range
+from airflow_hop.sinks import RowSink, parse_sniff_result
+from airflow_hop.state import VariableStore, fingerprint, is_expired, task_instance_key
+from airflow_hop.tracing import add_event, configure_tracing_from_env, start_span
 
 class HopBaseOperator(BaseOperator):
     """Hop Base Operator"""
@@ -34,22 +56,310 @@ class HopBaseOperator(BaseOperator):
         'Stopped (with errors)'
     ]
     END_STATUSES = FINISHED_STATUSES + ERROR_STATUSES
+    RUNNING_STATUSES = ['Running', 'Paused', 'Halting']
+    EXECUTIONS = VariableStore('execution')
+    ACTIVE = VariableStore('active')
+    RESULTS = VariableStore('result')
+    ENGINES = ('server', 'local', 'pool')
+    STATE_MAX_AGE = 7 * 24 * 3600
+    CACHE_MAX_AGE = 24 * 3600
+    # The phase timings and bottleneck report are logged, and only pushed to
+    # XCom on demand to spare the metadata database a write per task
+    push_reports = False
+    poll_interval = 5
+
+    @classmethod
+    def purge_state(cls, max_age=STATE_MAX_AGE) -> int:
+        """
+        Deletes the re-attach and dedupe state saved more than max_age seconds
+        ago, which tasks whose worker died left behind, and the expired cached
+        results. Meant to run in a maintenance task.
+        """
+        return cls.EXECUTIONS.purge(max_age) + cls.ACTIVE.purge(max_age) + cls.RESULTS.purge()
+
+    @classmethod
+    def clear_results(cls) -> int:
+        """Deletes every cached result, so that identical inputs run again"""
+        return cls.RESULTS.purge(0)
+
+    def _get_hop_client(self):
+        return HopHook.get_hook(
+                self.project_path,
+                self.project_name,
+                self.environment_path,
+                self.environment_name,
+                self.hop_config_path,
+                self.hop_conn_id,
+                self.log_level).get_conn()
+
+    @contextlib.contextmanager
+    def _hop_client(self):
+        """
+        Yields the connection to the Hop server of the task, or to a leased
+        server of the local pool with the pool engine
+        """
+        if self.engine != 'pool':
+            yield self._get_hop_client()
+            return
+        pool = get_pool(self.hop_server_path, self.hop_config_path)
+        with pool.lease() as daemon:
+            self.log.info('Running on pooled Hop Server %s:%s', daemon['host'], daemon['port'])
+            yield HopHook.HopServerConnection(
+                host=daemon['host'],
+                port=daemon['port'],
+                username=pool.username,
+                password=pool.password,
+                project_path=self.project_path,
+                project_name=self.project_name,
+                environment_name=self.environment_name,
+                environment_path=self.environment_path,
+                hop_config_path=self.hop_config_path,
+                log_level=self.log_level)
+
+    def _get_builder_client(self):
+        """
+        Returns a connection to build payloads with, before any server is
+        contacted: the one of the hook, or an unbound one with the pool engine
+        as no server is leased yet
+        """
+        if self.engine != 'pool':
+            return self._get_hop_client()
+        return HopHook.HopServerConnection(
+            host=None,
+            port=None,
+            username=None,
+            password=None,
+            project_path=self.project_path,
+            project_name=self.project_name,
+            environment_name=self.environment_name,
+            environment_path=self.environment_path,
+            hop_config_path=self.hop_config_path,
+            log_level=self.log_level)
+
+    def _check_engine(self, **server_options):
+        if self.engine not in self.ENGINES:
+            raise AirflowException(f'ERROR: unknown engine {self.engine}')
+        if self.engine == 'local':
+            for name, value in server_options.items():
+                if value:
+                    raise AirflowException(f'ERROR: {name} can only be used on a Hop Server')
+
+    def _run_local(self, filename, pipe_config=None):
+        """Runs the file with a local hop-run instead of Hop Server"""
+        hop_run = HopRun(
+            self.project_path,
+            self.project_name,
+            self.environment_path,
+            self.environment_name,
+            self.hop_config_path,
+            self.task_params,
+            self.log_level,
+            self.hop_run_path)
+        self._hop_run = hop_run  # pylint: disable=attribute-defined-outside-init
+        self.log.info('%s: running with %s', filename, hop_run.hop_run_path)
+        started = time.perf_counter()
+        returncode = hop_run.run(filename, self.log, pipe_config)
+        self._record_runtime({}, started)
+        if returncode != 0:
+            raise AirflowException(f'ERROR: {filename} exited with code {returncode}')
+        self.log.info('%s: Finished', filename)
+
+    def on_kill(self):
+        hop_run = getattr(self, '_hop_run', None)
+        if hop_run is not None:
+            hop_run.kill()
+
+    @contextlib.contextmanager
+    def _instrumented(self, context):
+        configure_tracing_from_env()
+        attributes = {
+            'airflow.dag_id': self.dag_id if self.has_dag() else None,
+            'airflow.task_id': self.task_id,
+            'airflow.run_id': context.get('run_id') if context else None,
+        }
+        with start_span(f'hop.task {self.task_id}', attributes), PhaseTimer() as timer:
+            try:
+                yield timer
+            finally:
+                summary = timer.summary()
+                self.log.info('Task time %s s, runtime %s s, overhead %s s, phases %s',
+                              summary['total_seconds'], summary['runtime_seconds'],
+                              summary['overhead_seconds'],
+                              {phase: totals['seconds']
+                               for phase, totals in summary['phases'].items()},
+                              extra={'hop_phase_summary': summary})
+                if self.push_reports and context is not None and 'ti' in context:
+                    context['ti'].xcom_push(key='phase_timings', value=summary)
+
+    @staticmethod
+    def _record_runtime(status, started):
+        timer = PhaseTimer.current()
+        if timer is not None:
+            runtime = execution_seconds(status)
+            timer.add_runtime(time.perf_counter() - started if runtime is None else runtime)
+
+    @staticmethod
+    def _server(conn) -> str:
+        return f'{conn.host}:{conn.port}'
+
+    def _result_key(self, name, get_payload):
+        """
+        Returns the fingerprint of the payload and the declared input files when
+        results are cached, None otherwise.
+        """
+        if not self.cache_results:
+            return None
+        with timed('fingerprint'):
+            inputs = files_signature(self.input_paths or [], self.hash_inputs)
+            return fingerprint(name, get_payload(), json.dumps(inputs))
+
+    def _cached_result(self, name, result_key):
+        result = self.RESULTS.get(result_key) if result_key else None
+        if result and is_expired(result):
+            self.log.info('%s: cached result of execution %s expired at %s, running again',
+                          name, result['id'], result['expires_at'])
+            return None
+        if result:
+            self.log.info('%s: skipping, identical inputs already succeeded in execution %s '
+                          'on %s at %s', name, result['id'], result['server'],
+                          result['finished_at'])
+            add_event('cached', {'hop.execution_id': result['id']})
+        return result
+
+    def _save_result(self, result_key, execution):
+        if result_key:
+            finished_at = timezone.utcnow()
+            expires_at = finished_at + datetime.timedelta(seconds=self.cache_max_age) \
+                if self.cache_max_age is not None else None
+            self.RESULTS.set({'name': execution['name'], 'server': execution['server'],
+                              'id': execution['id'], 'finished_at': finished_at.isoformat(),
+                              'expires_at': expires_at.isoformat() if expires_at else None},
+                             result_key)
+
+    def _execution_status(self, execution, status_key, get_status):
+        """Returns the status of a known execution, or None if the server lost it"""
+        try:
+            return get_status(execution['name'], execution['id'])[status_key]['status_desc']
+        except AirflowException as error:
+            self.log.info('%s: execution %s is no longer available, %s',
+                          execution['name'], execution['id'], error)
+            return None
+
+    def _execution_key(self, context):
+        """
+        Returns the key the execution of the task instance is recorded under,
+        so that a retry finds it, or None unless re-attaching is enabled
+        """
+        if not self.reattach:
+            return None
+        return task_instance_key(context)
+
+    def _find_execution(self, context, conn, name, status_key, get_status, get_payload):
+        """
+        Returns the execution a previous try of this task instance left running
+        or finished on the server, so that a retry after a worker crash does not
+        start the same work twice, else an identical execution already running
+        when dedupe is enabled, else None.
+        """
+        server = self._server(conn)
+        key = self._execution_key(context)
+        execution = self.EXECUTIONS.get(*key) if key else None
+        if execution and execution.get('server') == server and execution.get('name') == name:
+            status_desc = self._execution_status(execution, status_key, get_status)
+            if status_desc is not None and status_desc not in self.ERROR_STATUSES:
+                self.log.info('%s: re-attaching to execution %s, %s',
+                              name, execution['id'], status_desc)
+                add_event('attach', {'hop.status': status_desc,
+                                     'hop.execution_id': execution['id']})
+                return execution
+            if status_desc is not None:
+                self.log.info('%s: previous execution %s ended as %s, starting a new one',
+                              name, execution['id'], status_desc)
+
+        if not self.dedupe:
+            return None
+        execution = self.ACTIVE.get(server, fingerprint(name, get_payload()))
+        status_desc = self._execution_status(execution, status_key, get_status) \
+            if execution else None
+        if status_desc is None or status_desc in self.END_STATUSES:
+            return None
+        self.log.info('%s: attaching to identical execution %s, %s',
+                      name, execution['id'], status_desc)
+        add_event('dedupe', {'hop.status': status_desc, 'hop.execution_id': execution['id']})
+        if key:
+            self.EXECUTIONS.set(execution, *key)
+        return execution
+
+    def _start_execution(self, context, conn, name, get_payload, start):
+        """Starts a new execution and records it for retries and dedupe"""
+        server = self._server(conn)
+        key = self._execution_key(context)
+        payload = get_payload()
+        execution_fingerprint = fingerprint(name, payload) if self.dedupe else None
+
+        execution = {'server': server, 'name': name, 'id': start(payload),
+                     'fingerprint': execution_fingerprint}
+        if key:
+            self.EXECUTIONS.set(execution, *key)
+        if execution_fingerprint:
+            self.ACTIVE.set(execution, server, execution_fingerprint)
+        return execution
+
+    @contextlib.contextmanager
+    def _execution(self, context, conn, name, status_key, get_status, get_payload, start,
+                   resume=None):
+        """
+        Yields the execution to poll. An execution left by a previous try or an
+        identical one is polled right away, as it already runs on the server;
+        otherwise a new execution is started once the server admits it, the
+        admission slot being held during the block. When a resume dict is
+        given, the execution is kept in it until the block completes, so that
+        an attempt failing on a lost connection polls it again.
+        """
+        execution = (resume or {}).get('execution') or self._find_execution(
+            context, conn, name, status_key, get_status, get_payload)
+        if execution is not None:
+            yield execution
+        else:
+            with conn.admission():
+                execution = self._start_execution(context, conn, name, get_payload, start)
+                if resume is not None:
+                    resume['execution'] = execution
+                yield execution
+        if resume is not None:
+            resume.pop('execution', None)
+
+    def _forget_execution(self, context, execution):
+        key = self._execution_key(context)
+        if key:
+            self.EXECUTIONS.delete(*key)
+        if execution.get('fingerprint'):
+            active = self.ACTIVE.get(execution['server'], execution['fingerprint'])
+            if active and active['id'] == execution['id']:
+                self.ACTIVE.delete(execution['server'], execution['fingerprint'])
+
+    def _wait(self):
+        self.log.info('Sleeping %s seconds before ask again', self.poll_interval)
+        with timed('poll_wait'):
+            time.sleep(self.poll_interval)
 
     def _log_logging_string(self, raw_logging_string):
-        logs = raw_logging_string
-        cdata = re.match(r'\<\!\[CDATA\[([^\]]+)\]\]\>', logs)
-        cdata = cdata.group(1) if cdata else raw_logging_string
-        decoded_lines = zlib.decompress(base64.b64decode(cdata),
-                                        16 + zlib.MAX_WBITS)
-        if decoded_lines:
-            for line in re.compile(r'\r\n|\n|\r').split(
-                    decoded_lines.decode('utf-8')):
+        with timed('log_decode'):
+            logs = raw_logging_string
+            cdata = re.match(r'\<\!\[CDATA\[([^\]]+)\]\]\>', logs)
+            cdata = cdata.group(1) if cdata else raw_logging_string
+            decoded_lines = zlib.decompress(base64.b64decode(cdata),
+                                            16 + zlib.MAX_WBITS)
+        log_text = decoded_lines.decode('utf-8')
+        if log_text:
+            for line in re.compile(r'\r\n|\n|\r').split(log_text):
                 self.log.info(line)
+        return log_text
 
 class HopWorkflowOperator(HopBaseOperator):
     """Hop Workflow Operator"""
 
-    template_fields = ('task_params',)
+    template_fields = ('task_params', 'input_paths')
 
     def __init__(self,
                  workflow,
@@ -62,6 +372,18 @@ class HopWorkflowOperator(HopBaseOperator):
                  *args,
                  params=None,
                  hop_conn_id='hop_default',
+                 dedupe=False,
+                 cache_results=False,
+                 cache_max_age=HopBaseOperator.CACHE_MAX_AGE,
+                 input_paths=None,
+                 hash_inputs=False,
+                 use_archive=False,
+                 engine='server',
+                 hop_run_path=None,
+                 hop_server_path=None,
+                 reattach=False,
+                 push_reports=False,
+                 poll_interval=HopBaseOperator.poll_interval,
                  **kwargs):
         super().__init__(*args, **kwargs)
         self.workflow = workflow
@@ -73,20 +395,48 @@ class HopWorkflowOperator(HopBaseOperator):
         self.log_level = log_level
         self.task_params = params
         self.hop_conn_id = hop_conn_id
+        self.dedupe = dedupe
+        self.cache_results = cache_results
+        self.cache_max_age = cache_max_age
+        self.input_paths = input_paths
+        self.hash_inputs = hash_inputs
+        self.use_archive = use_archive
+        self.engine = engine
+        self.hop_run_path = hop_run_path
+        self.hop_server_path = hop_server_path
+        self.reattach = reattach
+        self.push_reports = push_reports
+        self.poll_interval = poll_interval
+        if use_archive and params:
+            raise AirflowException('ERROR: parameters cannot be sent with export archives')
+        self._check_engine(dedupe=dedupe, cache_results=cache_results, use_archive=use_archive,
+                           reattach=reattach)
 
-    def __get_hop_client(self):
-        return HopHook(
-                self.project_path,
-                self.project_name,
-                self.environment_path,
-                self.environment_name,
-                self.hop_config_path,
-                self.hop_conn_id,
-                self.log_level).get_conn()
+    def execute(self, context: Context) -> Any:
+        with self._instrumented(context):
+            if self.engine == 'local':
+                self._run_local(self.workflow)
+                return
+            # Cached results are looked up before contacting any Hop server
+            builder = self._get_builder_client()
+            get_payload = functools.lru_cache(maxsize=None)(lambda: self._get_payload(builder))
+            result_key = self._result_key(self.workflow, get_payload)
+            if self._cached_result(self.workflow, result_key):
+                return
+            with self._hop_client() as conn:
+                self._run_workflow(conn, context, get_payload, result_key)
+
+    def _get_payload(self, conn):
+        if self.use_archive:
+            return conn.get_export_payload(self.workflow)
+        return conn.get_workflow_payload(self.workflow, self.task_params)
 
-    def execute(self, context: Context) -> Any: # pylint: disable=unused-argument
-        conn = self.__get_hop_client()
-        register_rs = conn.register_workflow(self.workflow, self.task_params)
+    def _start_workflow(self, conn, payload=None):
+        if self.use_archive:
+            register_rs = conn.register_export(self.workflow, 'workflow', payload=payload)
+        else:
+            register_rs = conn.register_workflow(self.workflow, self.task_params,
+                                                 payload=payload)
         message = register_rs['webresult']['message']
         work_id = register_rs['webresult']['id']
         self.log.info(f'{self.workflow}: {message}')
@@ -94,20 +444,42 @@ class HopWorkflowOperator(HopBaseOperator):
         start_rs = conn.start_workflow(self.workflow, work_id)
         result = start_rs['webresult']['result']
         self.log.info(f'{self.workflow}: Started {result}')
+        return work_id
 
-        work_status_rs = None
-        status_desc = None
-        while not work_status_rs or status_desc not in self.END_STATUSES:
-            work_status_rs = conn.workflow_status(self.workflow, work_id)
+    def _run_workflow(self, conn, context=None, get_payload=None, result_key=None):
+        if get_payload is None:
+            get_payload = functools.lru_cache(maxsize=None)(lambda: self._get_payload(conn))
+        with self._execution(
+                context, conn, self.workflow, 'workflow-status', conn.workflow_status,
+                get_payload, lambda payload: self._start_workflow(conn, payload)) as execution:
+            work_id = execution['id']
+            started = time.perf_counter()
 
-            status = work_status_rs['workflow-status']
-            status_desc = status['status_desc']
-            self.log.info(self.LOG_TEMPLATE, status_desc, self.workflow, work_id)
-            self._log_logging_string(status['logging_string'])
+            work_status_rs = None
+            status_desc = None
+            while not work_status_rs or status_desc not in self.END_STATUSES:
+                work_status_rs = conn.workflow_status(self.workflow, work_id)
 
-            if status_desc not in self.END_STATUSES:
-                self.log.info('Sleeping 5 seconds before ask again')
-                time.sleep(5)
+                status = work_status_rs['workflow-status']
+                status_desc = status['status_desc']
+                add_event('poll', {'hop.status': status_desc, 'hop.execution_id': work_id})
+                self.log.info(self.LOG_TEMPLATE, status_desc, self.workflow, work_id)
+                log_text = self._log_logging_string(status['logging_string'])
+
+                if status_desc not in self.END_STATUSES:
+                    self._wait()
+        self._forget_execution(context, execution)
+        self._record_runtime(status, started)
+
+        actions = parse_action_results(log_text)
+        emit_action_metrics(status.get('workflowname') or self.workflow, actions)
+        timed_actions = [action for action in actions if action['seconds'] is not None]
+        if timed_actions:
+            slowest = max(timed_actions, key=lambda action: action['seconds'])
+            self.log.info('%s: %s actions run, slowest %s with %s s', self.workflow,
+                          len(actions), slowest['name'], slowest['seconds'])
+        if context is not None and 'ti' in context:
+            context['ti'].xcom_push(key='action_results', value=actions)
 
         if 'error_desc' in status and status['error_desc']:
             self.log.error(self.LOG_TEMPLATE, status['error_desc'], self.workflow, work_id)
@@ -115,12 +487,14 @@ class HopWorkflowOperator(HopBaseOperator):
         if status_desc in self.ERROR_STATUSES:
             self.log.error(self.LOG_TEMPLATE, status_desc, self.workflow, work_id)
             raise AirflowException(status_desc)
+        self._save_result(result_key, execution)
+        return status
 
 
 class HopPipelineOperator(HopBaseOperator):
     """Hop Pipeline Operator"""
 
-    template_fields = ('task_params',)
+    template_fields = ('task_params', 'bottleneck_report_path', 'input_paths', 'sniff_path')
 
     def __init__(self,
                  pipeline,
@@ -134,8 +508,30 @@ class HopPipelineOperator(HopBaseOperator):
                  pipe_config,
                  params=None,
                  hop_conn_id='hop_default',
+                 bottleneck_report_path=None,
+                 prepared_by=None,
+                 dedupe=False,
+                 cache_results=False,
+                 cache_max_age=HopBaseOperator.CACHE_MAX_AGE,
+                 input_paths=None,
+                 hash_inputs=False,
+                 sniff_transform=None,
+                 sniff_path=None,
+                 sniff_format=None,
+                 sniff_lines=1000,
+                 sniff_copy=0,
+                 sniff_direction='output',
+                 fast_start=False,
+                 engine='server',
+                 hop_run_path=None,
+                 hop_server_path=None,
+                 reattach=False,
+                 push_reports=False,
+                 poll_interval=HopBaseOperator.poll_interval,
                  **kwargs):
         super().__init__(*args, **kwargs)
+        if sniff_transform and not sniff_path:
+            raise AirflowException('ERROR: sniff_path is required to sniff a transform')
         self.pipeline = pipeline
         self.project_path = project_path
         self.project_name = project_name
@@ -146,21 +542,53 @@ class HopPipelineOperator(HopBaseOperator):
         self.environment_name = environment_name
         self.hop_config_path = hop_config_path
         self.pipe_config = pipe_config
+        self.bottleneck_report_path = bottleneck_report_path
+        self.prepared_by = prepared_by
+        self.dedupe = dedupe
+        self.cache_results = cache_results
+        self.cache_max_age = cache_max_age
+        self.input_paths = input_paths
+        self.hash_inputs = hash_inputs
+        self.sniff_transform = sniff_transform
+        self.sniff_path = sniff_path
+        self.sniff_format = sniff_format
+        self.sniff_lines = sniff_lines
+        self.sniff_copy = sniff_copy
+        self.sniff_direction = sniff_direction
+        self.fast_start = fast_start
+        self.engine = engine
+        self.hop_run_path = hop_run_path
+        self.hop_server_path = hop_server_path
+        self.reattach = reattach
+        self.push_reports = push_reports
+        self.poll_interval = poll_interval
+        self._check_engine(dedupe=dedupe, cache_results=cache_results,
+                           sniff_transform=sniff_transform, reattach=reattach)
 
-    def __get_hop_client(self):
-        return HopHook(
-                self.project_path,
-                self.project_name,
-                self.environment_path,
-                self.environment_name,
-                self.hop_config_path,
-                self.hop_conn_id,
-                self.log_level).get_conn()
+    def execute(self, context: Context) -> Any:
+        with self._instrumented(context):
+            if self.engine == 'local':
+                self._run_local(self.pipeline, self.pipe_config)
+                return
+            # Cached results are looked up before contacting any Hop server
+            builder = self._get_builder_client()
+            xml_builder = builder.get_xml_builder(self.task_params)
+            get_payload = self._payload_getter(builder, xml_builder)
+            result_key = self._result_key(self.pipeline, get_payload)
+            if self._cached_result(self.pipeline, result_key):
+                return
+            with self._hop_client() as conn:
+                self._run_pipeline(conn, xml_builder, context, get_payload, result_key)
 
-    def execute(self, context: Context) -> Any: # pylint: disable=unused-argument
-        conn = self.__get_hop_client()
+    def _payload_getter(self, conn, xml_builder):
+        """Returns a function building the payload once, on its first call"""
+        return functools.lru_cache(maxsize=None)(
+            lambda: conn.get_pipeline_payload(self.pipeline, self.pipe_config,
+                                              xml_builder=xml_builder))
 
-        register_rs = conn.register_pipeline(self.pipeline, self.pipe_config, self.task_params)
+    def _prepare_pipeline(self, conn, xml_builder, payload=None):
+        register_rs = conn.register_pipeline(self.pipeline, self.pipe_config,
+                                             xml_builder=xml_builder, payload=payload)
         message = register_rs['webresult']['message']
         pipe_id = register_rs['webresult']['id']
         self.log.info(f'{self.pipeline}: {message}')
@@ -168,24 +596,148 @@ class HopPipelineOperator(HopBaseOperator):
         prepare_exec_rs = conn.prepare_pipeline_exec(self.pipeline, pipe_id)
         result = prepare_exec_rs['webresult']['result']
         self.log.info(f'{self.pipeline}: Prepared {result}')
+        return pipe_id
+
+    def _get_prepared(self, conn, context, payload):
+        """
+        Returns the id of the execution registered and prepared for this task
+        by the HopPrepareOperator of the DAG run, if it has not been started.
+        A prepared execution whose payload differs from the one of the task,
+        for instance as parameters rendered differently, is removed.
+        """
+        if not self.prepared_by or not context or 'ti' not in context:
+            return None
+        prepared = (context['ti'].xcom_pull(task_ids=self.prepared_by) or {}).get(self.task_id)
+        if not prepared or prepared['server'] != self._server(conn) \
+                or prepared['name'] != self.pipeline:
+            return None
+        status_desc = self._execution_status(prepared, 'pipeline-status', conn.pipeline_status)
+        if status_desc is None or status_desc in self.END_STATUSES + self.RUNNING_STATUSES:
+            return None
+        if prepared.get('fingerprint') != fingerprint(self.pipeline, payload):
+            self.log.info('%s: prepared execution %s has another payload, removing it',
+                          self.pipeline, prepared['id'])
+            try:
+                conn.remove_pipeline(self.pipeline, prepared['id'])
+            except AirflowException as error:
+                self.log.warning('%s: could not remove execution %s, %s',
+                                 self.pipeline, prepared['id'], error)
+            return None
+        self.log.info('%s: using prepared execution %s', self.pipeline, prepared['id'])
+        return prepared['id']
+
+    def _start_pipeline(self, conn, xml_builder, payload=None, context=None):
+        if payload is None:
+            payload = conn.get_pipeline_payload(self.pipeline, self.pipe_config,
+                                                xml_builder=xml_builder)
+        pipe_id = self._get_prepared(conn, context, payload)
+        if pipe_id is None and self.fast_start:
+            register_rs = conn.register_pipeline(self.pipeline, self.pipe_config,
+                                                 xml_builder=xml_builder, payload=payload)
+            pipe_id = register_rs['webresult']['id']
+            self.log.info(f'{self.pipeline}: {register_rs["webresult"]["message"]}')
+            start_rs = conn.start_pipeline(self.pipeline, pipe_id)
+            self.log.info(f'{self.pipeline}: Prepared and started '
+                          f'{start_rs["webresult"]["result"]}')
+            return pipe_id
+        if pipe_id is None:
+            pipe_id = self._prepare_pipeline(conn, xml_builder, payload)
 
         start_exec_rs = conn.start_pipeline_execution(self.pipeline, pipe_id)
         result = start_exec_rs['webresult']['result']
         self.log.info(f'{self.pipeline}: Started {result}')
+        return pipe_id
+
+    @contextlib.contextmanager
+    def _sniffing(self, conn, pipe_id, context):
+        """
+        Appends the rows going through sniff_transform to sniff_path, batch by
+        batch, while the block runs and pushes a summary of the file to XCom.
+        """
+        if not self.sniff_transform or context is None:
+            yield
+            return
+
+        sink = RowSink(self.sniff_path, self.sniff_format)
+        stop = threading.Event()
+        errors = []
+
+        def sniff():
+            try:
+                while not stop.is_set():
+                    fields, rows = parse_sniff_result(conn.sniff_transform(
+                        self.pipeline, pipe_id, self.sniff_transform, self.sniff_copy,
+                        self.sniff_lines, self.sniff_direction))
+                    sink.write(fields, rows)
+                    if not rows:
+                        stop.wait(1)
+            except Exception as error:  # pylint: disable=broad-except
+                errors.append(error)
 
-        pipe_status_rs = None
-        status_desc = None
-        while not pipe_status_rs or status_desc not in self.END_STATUSES:
-            pipe_status_rs = conn.pipeline_status(self.pipeline, pipe_id)
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(sniff,),
+                                  name=f'sniff-{self.task_id}', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+            summary = dict(sink.close(), transform=self.sniff_transform)
+            self.log.info('%s: %s rows of %s written to %s', self.pipeline, summary['rows'],
+                          self.sniff_transform, self.sniff_path)
+            if 'ti' in context:
+                context['ti'].xcom_push(key='sniff_summary', value=summary)
+        if errors:
+            raise AirflowException(
+                f'{self.pipeline}: could not sniff {self.sniff_transform}, {errors[0]}')
 
-            status = pipe_status_rs['pipeline-status']
-            status_desc = status['status_desc']
-            self.log.info(self.LOG_TEMPLATE, status_desc, self.pipeline, pipe_id)
-            self._log_logging_string(status['logging_string'])
+    def _run_pipeline(self, conn, xml_builder, context=None, get_payload=None, result_key=None,
+                      resume=None):
+        if get_payload is None:
+            get_payload = self._payload_getter(conn, xml_builder)
+        with self._execution(
+                context, conn, self.pipeline, 'pipeline-status', conn.pipeline_status, get_payload,
+                lambda payload: self._start_pipeline(conn, xml_builder, payload, context),
+                resume) as execution:
+            pipe_id = execution['id']
+            started = time.perf_counter()
 
-            if status_desc not in self.END_STATUSES:
-                self.log.info('Sleeping 5 seconds before ask again')
-                time.sleep(5)
+            sampler = TransformSampler()
+            pipe_status_rs = None
+            status_desc = None
+            with self._sniffing(conn, pipe_id, context):
+                while not pipe_status_rs or status_desc not in self.END_STATUSES:
+                    pipe_status_rs = conn.pipeline_status(self.pipeline, pipe_id)
+
+                    status = pipe_status_rs['pipeline-status']
+                    status_desc = status['status_desc']
+                    add_event('poll', {'hop.status': status_desc, 'hop.execution_id': pipe_id})
+                    sampler.sample(status)
+                    self.log.info(self.LOG_TEMPLATE, status_desc, self.pipeline, pipe_id)
+                    self._log_logging_string(status['logging_string'])
+
+                    if status_desc not in self.END_STATUSES:
+                        self._wait()
+        self._forget_execution(context, execution)
+        self._record_runtime(status, started)
+
+        transforms = parse_transform_status(status)
+        emit_transform_metrics(status.get('pipeline_name') or self.pipeline, transforms)
+        report = sampler.report()
+        self.log.info('%s: bottleneck %s, slowest transform %s, input starved %s, '
+                      'output blocked %s, effective throughput %s rows/s', self.pipeline,
+                      report['bottleneck'], report['slowest_transform'],
+                      report['input_starved'], report['output_blocked'],
+                      report['effective_rows_per_second'])
+        if context is not None:
+            if 'ti' in context:
+                context['ti'].xcom_push(key='transform_metrics', value=transforms)
+                if self.push_reports:
+                    context['ti'].xcom_push(key='bottleneck_report', value=report)
+            if self.bottleneck_report_path:
+                sampler.save(self.bottleneck_report_path)
+                self.log.info('%s: bottleneck report saved to %s', self.pipeline,
+                              self.bottleneck_report_path)
 
         if 'error_desc' in status and status['error_desc']:
             self.log.error(self.LOG_TEMPLATE, status['error_desc'], self.pipeline, pipe_id)
@@ -193,3 +745,207 @@ class HopPipelineOperator(HopBaseOperator):
         if status_desc in self.ERROR_STATUSES:
             self.log.error(self.LOG_TEMPLATE, status_desc, self.pipeline, pipe_id)
             raise AirflowException(status_desc)
+        self._save_result(result_key, execution)
+        return status
+
+
+class HopPipelinePartitionOperator(HopPipelineOperator):
+    """
+    Hop Pipeline Operator that splits a date or key range into partitions and
+    runs one pipeline execution per partition on the Hop server.
+
+    Each execution receives the partition bounds as the start_param and
+    end_param parameters, the end being exclusive. The payload template is built
+    once and only the partition parameters vary between executions.
+    """
+
+    template_fields = HopPipelineOperator.template_fields + ('partition_start', 'partition_end')
+
+    def __init__(self,
+                 *args,
+                 partition_start,
+                 partition_end,
+                 num_partitions,
+                 start_param='PARTITION_START',
+                 end_param='PARTITION_END',
+                 concurrency=4,
+                 partition_retries=0,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.engine == 'local':
+            raise AirflowException('ERROR: partitions can only run on a Hop Server')
+        self.partition_start = partition_start
+        self.partition_end = partition_end
+        self.num_partitions = num_partitions
+        self.start_param = start_param
+        self.end_param = end_param
+        self.concurrency = concurrency
+        self.partition_retries = partition_retries
+
+    def execute(self, context: Context) -> Any:
+        partitions = split_range(self.partition_start, self.partition_end, self.num_partitions)
+        with self._instrumented(context), self._hop_client() as conn:
+            template = conn.get_xml_builder(self.task_params)
+            self.log.info('%s: running %s partitions with concurrency %s',
+                          self.pipeline, len(partitions), self.concurrency)
+
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                futures = [executor.submit(contextvars.copy_context().run, self.__run_partition,
+                                           conn, template, lower, upper)
+                           for lower, upper in partitions]
+                results = [future.result() for future in futures]
+
+        failed = [result for result in results if result['status'] != 'Finished']
+        for result in failed:
+            self.log.error('%s: partition [%s, %s) failed after %s attempts: %s', self.pipeline,
+                           result['start'], result['end'], result['attempts'], result['status'])
+        if failed:
+            raise AirflowException(f'{len(failed)} of {len(results)} partitions failed')
+        return results
+
+    def __run_partition(self, conn, template, lower, upper):
+        params = dict(self.task_params or {})
+        params[self.start_param] = lower
+        params[self.end_param] = upper
+        xml_builder = template.with_task_params(params)
+        get_payload = self._payload_getter(conn, xml_builder)
+        result_key = self._result_key(self.pipeline, get_payload)
+        if self._cached_result(self.pipeline, result_key):
+            return {'start': lower, 'end': upper, 'status': 'Finished', 'attempts': 0}
+
+        # A lost connection leaves the execution running, so it is polled again
+        # rather than started twice; only an execution that ended is replaced
+        status = None
+        resume = {}
+        for attempt in range(1, self.partition_retries + 2):
+            try:
+                self._run_pipeline(conn, xml_builder, get_payload=get_payload,
+                                   result_key=result_key, resume=resume)
+                status = 'Finished'
+                break
+            except (AirflowException, requests.RequestException) as error:
+                status = str(error)
+                self.log.warning('%s: partition [%s, %s) attempt %s failed: %s',
+                                 self.pipeline, lower, upper, attempt, error)
+        return {'start': lower, 'end': upper, 'status': status, 'attempts': attempt}
+
+
+class HopWebServiceOperator(HopBaseOperator):
+    """
+    Runs a pipeline configured as a web service in the metadata of the Hop
+    server in a single round trip, without registering or polling it. Meant for
+    short, lookup style pipelines.
+
+    The response is written to output_path when given, and a summary of it is
+    returned. Otherwise the response body is returned as text, so that it is
+    pushed to XCom.
+    """
+
+    template_fields = ('task_params', 'body', 'output_path')
+
+    def __init__(self,
+                 service,
+                 *args,
+                 params=None,
+                 body=None,
+                 run_config=None,
+                 output_path=None,
+                 hop_conn_id='hop_default',
+                 log_level='Basic',
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.service = service
+        self.task_params = params
+        self.body = body
+        self.run_config = run_config
+        self.output_path = output_path
+        self.hop_conn_id = hop_conn_id
+        self.log_level = log_level
+        self.project_path = None
+        self.project_name = None
+        self.environment_path = None
+        self.environment_name = None
+        self.hop_config_path = None
+
+    def execute(self, context: Context) -> Any:
+        with self._instrumented(context):
+            conn = self._get_hop_client()
+            body = self.body.encode('utf-8') if isinstance(self.body, str) else self.body
+            with conn.admission():
+                if self.output_path:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+                    with open(self.output_path, mode='bw') as output:
+                        response = conn.call_web_service(
+                            self.service, dict(self.task_params or {}), body, self.run_config,
+                            output)
+                else:
+                    response = conn.call_web_service(
+                        self.service, dict(self.task_params or {}), body, self.run_config)
+        self.log.info('%s: %s bytes of %s in %.3f s', self.service, response['bytes'],
+                      response['content_type'], response['seconds'])
+        if response['body'] is not None:
+            return response['body'].decode('utf-8')
+        return {'service': self.service, 'path': self.output_path,
+                'content_type': response['content_type'], 'bytes': response['bytes'],
+                'seconds': round(response['seconds'], 3)}
+
+
+class HopPrepareOperator(HopBaseOperator):
+    """
+    Registers and prepares the executions of several pipeline tasks of a DAG
+    run in parallel, ahead of them, so that these tasks only have to start
+    their execution. It is set upstream of the tasks.
+
+    The execution ids are returned, thus pushed to XCom, per task id, with the
+    fingerprint of the payload they were prepared with. Tasks whose execution
+    cannot be prepared, or whose payload differs when they run, register their
+    own. Tasks with result caching or dedupe are not prepared, as they may not
+    start any execution.
+    """
+
+    def __init__(self, *args, tasks, concurrency=8, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_task_ids = []
+        for task in tasks:
+            task.prepared_by = self.task_id
+            self.prepared_task_ids.append(task.task_id)
+        self.set_downstream(tasks)
+        self.concurrency = concurrency
+
+    def execute(self, context: Context) -> Any:
+        with self._instrumented(context):
+            tasks = []
+            for task_id in self.prepared_task_ids:
+                task = copy.copy(self.dag.get_task(task_id))
+                task.render_template_fields(context)
+                tasks.append(task)
+
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                futures = [executor.submit(contextvars.copy_context().run, self.__prepare, task)
+                           for task in tasks]
+                results = [future.result() for future in futures]
+        prepared = {task.task_id: execution for task, execution in zip(tasks, results)
+                    if execution is not None}
+        self.log.info('Prepared %s of %s pipeline executions', len(prepared), len(tasks))
+        return prepared
+
+    def __prepare(self, task):
+        if task.engine != 'server':
+            self.log.info('%s: not prepared, it runs with the %s engine', task.task_id, task.engine)
+            return None
+        if task.cache_results or task.dedupe:
+            self.log.info('%s: not prepared, its execution may be skipped by result caching '
+                          'or dedupe', task.task_id)
+            return None
+        # Any failure falls back to a normal start by the task
+        try:
+            conn = task._get_hop_client()  # pylint: disable=protected-access
+            payload = conn.get_pipeline_payload(task.pipeline, task.pipe_config,
+                                                xml_builder=conn.get_xml_builder(task.task_params))
+            pipe_id = task._prepare_pipeline(  # pylint: disable=protected-access
+                conn, None, payload)
+        except Exception as error:  # pylint: disable=broad-except
+            self.log.warning('%s: could not prepare the execution, %s', task.task_id, error)
+            return None
+        return {'server': self._server(conn), 'name': task.pipeline, 'id': pipe_id,
+                'fingerprint': fingerprint(task.pipeline, payload)}
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Range partitioning helpers"""
+
+from datetime import date, datetime, timedelta
+
+from airflow.exceptions import AirflowException
+
+
+def _parse_bound(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, (date, int)):
+        return value
+    value = str(value).strip()
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError as error:
+        raise AirflowException(f'ERROR: invalid partition bound {value}') from error
+
+
+def split_range(start, end, num_partitions) -> list:
+    """
+    Splits the half-open range [start, end) into at most num_partitions
+    contiguous partitions of (almost) equal size.
+
+    Bounds can be dates (or ISO formatted strings) or integer keys. Returns a
+    list of (lower, upper) string tuples, upper being exclusive.
+    """
+    lower = _parse_bound(start)
+    upper = _parse_bound(end)
+    if type(lower) is not type(upper):  # pylint: disable=unidiomatic-typecheck
+        raise AirflowException(f'ERROR: partition bounds {start} and {end} are not comparable')
+    if num_partitions < 1:
+        raise AirflowException('ERROR: num_partitions must be greater than 0')
+
+    if isinstance(lower, date):
+        size = (upper - lower).days
+        unit = timedelta(days=1)
+        to_str = date.isoformat
+    else:
+        size = upper - lower
+        unit = 1
+        to_str = str
+    if size <= 0:
+        raise AirflowException(f'ERROR: empty partition range [{start}, {end})')
+
+    num_partitions = min(num_partitions, size)
+    step, remainder = divmod(size, num_partitions)
+    partitions = []
+    current = lower
+    for index in range(num_partitions):
+        length = step + 1 if index < remainder else step
+        following = current + unit * length
+        partitions.append((to_str(current), to_str(following)))
+        current = following
+    return partitions
@@ -19,9 +19,13 @@ from airflow.plugins_manager import AirflowPlugin
 from airflow_hop.hooks import HopHook
 from airflow_hop.operators import HopPipelineOperator
 from airflow_hop.operators import HopWorkflowOperator
+from airflow_hop.operators import HopPipelinePartitionOperator
+from airflow_hop.operators import HopPrepareOperator
+from airflow_hop.operators import HopWebServiceOperator
 
 
 class HopPlugin(AirflowPlugin):
     name = 'airflow_hop'
-    operators = [HopPipelineOperator, HopWorkflowOperator]
+    operators = [HopPipelineOperator, HopWorkflowOperator, HopPipelinePartitionOperator,
+                 HopPrepareOperator, HopWebServiceOperator]
     hooks = [HopHook]
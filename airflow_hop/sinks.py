@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Local files rows are streamed to"""
+
+import csv
+import json
+import os
+
+try:
+    import pyarrow
+    from pyarrow import parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+FORMATS = ('jsonl', 'csv', 'parquet')
+
+
+def parse_sniff_result(result) -> tuple:
+    """Returns the field names and the rows of a sniffTransform response"""
+    sniff = result.get('transform-sniff') or {}
+    metas = (sniff.get('row-meta') or {}).get('value-meta') or []
+    if not isinstance(metas, list):
+        metas = [metas]
+    fields = [meta.get('name') for meta in metas]
+
+    rows = sniff.get('row-data') or []
+    if not isinstance(rows, list):
+        rows = [rows]
+    values = []
+    for row in rows:
+        row_values = (row or {}).get('value-data')
+        if not isinstance(row_values, list):
+            row_values = [row_values]
+        values.append(row_values)
+    return fields, values
+
+
+class RowSink:
+    """
+    Appends batches of rows to a JSON lines, CSV or Parquet file, the format
+    being inferred from the extension by default, so that memory use does not
+    depend on the number of rows. Values are written as strings. Parquet
+    requires the pyarrow package.
+    """
+
+    def __init__(self, path, file_format=None):
+        file_format = file_format or os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in FORMATS:
+            raise ValueError(f'Unknown row file format {file_format}')
+        if file_format == 'parquet' and pyarrow is None:
+            raise ImportError('pyarrow is required to write Parquet files')
+        self.path = path
+        self.file_format = file_format
+        self.fields = None
+        self.rows = 0
+        self.batches = 0
+        self.__file = None
+        self.__writer = None
+
+    def write(self, fields, rows):
+        if not rows:
+            return
+        if self.fields is None:
+            self.fields = list(fields)
+            self.__open()
+        if self.file_format == 'jsonl':
+            for row in rows:
+                self.__file.write(json.dumps(dict(zip(self.fields, row))) + '\n')
+        elif self.file_format == 'csv':
+            self.__writer.writerows(rows)
+        else:
+            columns = list(zip(*rows))
+            self.__writer.write_table(pyarrow.table(
+                {field: pyarrow.array(column, pyarrow.string())
+                 for field, column in zip(self.fields, columns)}))
+        self.rows += len(rows)
+        self.batches += 1
+
+    def __open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if self.file_format == 'parquet':
+            schema = pyarrow.schema([(field, pyarrow.string()) for field in self.fields])
+            self.__writer = parquet.ParquetWriter(self.path, schema)
+            return
+        # pylint: disable=consider-using-with
+        self.__file = open(self.path, mode='w', encoding='utf-8',
+                           newline='' if self.file_format == 'csv' else None)
+        if self.file_format == 'csv':
+            self.__writer = csv.writer(self.__file)
+            self.__writer.writerow(self.fields)
+
+    def close(self) -> dict:
+        if self.file_format == 'parquet' and self.__writer is not None:
+            self.__writer.close()
+        if self.__file is not None:
+            self.__file.close()
+        return {
+            'path': self.path,
+            'format': self.file_format,
+            'fields': self.fields or [],
+            'rows': self.rows,
+            'batches': self.batches,
+            'bytes': os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""State that outlives a task try"""
+
+import datetime
+import hashlib
+import json
+import logging
+
+from airflow.models import Variable
+from airflow.utils import timezone
+from airflow.utils.session import create_session
+
+log = logging.getLogger(__name__)
+
+KEY_PREFIX = 'airflow_hop'
+
+
+def task_instance_key(context):
+    """
+    Returns the (dag_id, task_id, run_id, map_index) of the task instance being
+    run, or None when the context does not provide one.
+    """
+    task_instance = (context or {}).get('ti')
+    if task_instance is None:
+        return None
+    return (task_instance.dag_id, task_instance.task_id, task_instance.run_id,
+            getattr(task_instance, 'map_index', -1))
+
+
+def fingerprint(*parts) -> str:
+    """Returns the SHA-256 of the given strings or bytes"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        digest.update(hashlib.sha256(part).digest())
+    return digest.hexdigest()
+
+
+def is_expired(document, now=None) -> bool:
+    """Returns whether the expires_at time of the document, if any, has passed"""
+    if not document.get('expires_at'):
+        return False
+    return timezone.parse(document['expires_at']) <= (now or timezone.utcnow())
+
+
+class VariableStore:
+    """
+    Stores small JSON documents in Airflow Variables. Unlike XCom, which
+    Airflow clears before every try of a task instance, they survive retries
+    and worker crashes. Keys are hashed as identifiers may exceed the length
+    of a Variable key. Documents are stamped with the time they are saved at,
+    so that the ones nobody deleted can be purged, and may hold the time they
+    expire at as expires_at.
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+
+    def key(self, *parts) -> str:
+        digest = hashlib.sha256(json.dumps(parts, default=str).encode('utf-8')).hexdigest()
+        return f'{KEY_PREFIX}.{self.namespace}.{digest[:40]}'
+
+    def get(self, *parts):
+        try:
+            return Variable.get(self.key(*parts), default_var=None, deserialize_json=True)
+        except ValueError:
+            log.warning('Ignoring unreadable %s state %s', self.namespace, self.key(*parts))
+            return None
+
+    def set(self, value, *parts):
+        Variable.set(self.key(*parts), dict(value, saved_at=timezone.utcnow().isoformat()),
+                     serialize_json=True)
+
+    def delete(self, *parts):
+        Variable.delete(self.key(*parts))
+
+    def purge(self, max_age=None) -> int:
+        """
+        Deletes the documents that expired, were saved more than max_age seconds
+        ago or are unreadable, for instance left by a task whose worker died.
+        Returns how many were.
+        """
+        now = timezone.utcnow()
+        oldest = now - datetime.timedelta(seconds=max_age) if max_age is not None else None
+        purged = 0
+        with create_session() as session:
+            for variable in session.query(Variable).filter(
+                    Variable.key.like(f'{KEY_PREFIX}.{self.namespace}.%')):
+                try:
+                    document = json.loads(variable.val)
+                    saved_at = timezone.parse(document['saved_at'])
+                    expired = is_expired(document, now)
+                except (TypeError, ValueError, KeyError):
+                    saved_at, expired = None, True
+                if expired or saved_at is None or (oldest is not None and saved_at < oldest):
+                    session.delete(variable)
+                    purged += 1
+        if purged:
+            log.info('Purged %s stale %s state documents', purged, self.namespace)
+        return purged
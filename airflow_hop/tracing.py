@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Optional OpenTelemetry integration"""
+
+import contextlib
+import os
+import threading
+
+try:
+    from opentelemetry import trace
+except ImportError:  # pragma: no cover
+    trace = None
+
+TRACER_NAME = 'airflow_hop'
+EXPORTER_ENV = 'AIRFLOW_HOP_TRACES_EXPORTER'
+
+_LOCK = threading.Lock()
+_provider = None
+
+
+def configure_tracing(exporter=None):
+    """
+    Sends the spans of this package to a console or file exporter, which does
+    not require any collector. The exporter is either 'console' or
+    'file:<path>', the spans being appended to the file as JSON lines; by
+    default it is read from the AIRFLOW_HOP_TRACES_EXPORTER variable.
+
+    Without calling it spans go to the globally configured tracer provider.
+    Requires the opentelemetry-sdk package.
+    """
+    global _provider
+    exporter = exporter or os.environ.get(EXPORTER_ENV)
+    if not exporter:
+        return None
+
+    from opentelemetry.sdk.trace import TracerProvider  # pylint: disable=import-outside-toplevel
+    from opentelemetry.sdk.trace.export import (  # pylint: disable=import-outside-toplevel
+        ConsoleSpanExporter, SimpleSpanProcessor)
+
+    if exporter == 'console':
+        span_exporter = ConsoleSpanExporter(service_name=TRACER_NAME)
+    elif exporter.startswith('file:'):
+        path = exporter[len('file:'):]
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        span_exporter = ConsoleSpanExporter(
+            service_name=TRACER_NAME,
+            out=open(path, mode='a', encoding='utf-8'),  # pylint: disable=consider-using-with
+            formatter=lambda span: span.to_json(indent=None) + os.linesep)
+    else:
+        raise ValueError(f'Unknown traces exporter {exporter}')
+
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(span_exporter))
+    with _LOCK:
+        if _provider is not None:
+            _provider.shutdown()
+        _provider = provider
+    return provider
+
+
+def configure_tracing_from_env():
+    """Configures the exporter from the environment once per process"""
+    with _LOCK:
+        configured = _provider is not None
+    if not configured and trace is not None:
+        configure_tracing()
+
+
+def get_tracer():
+    if _provider is not None:
+        return _provider.get_tracer(TRACER_NAME)
+    return trace.get_tracer(TRACER_NAME)
+
+
+def start_span(name, attributes=None):
+    """
+    Starts an OpenTelemetry span as the current span. It is a no-op when
+    opentelemetry is not installed or no tracer provider has been configured.
+    """
+    if trace is None:
+        return contextlib.nullcontext()
+    attributes = {key: value for key, value in (attributes or {}).items() if value is not None}
+    return get_tracer().start_as_current_span(name, attributes=attributes)
+
+
+def set_attributes(attributes):
+    """Sets attributes on the current span, if any"""
+    if trace is not None:
+        trace.get_current_span().set_attributes(
+            {key: value for key, value in attributes.items() if value is not None})
+
+
+def add_event(name, attributes=None):
+    """Records an event on the current span, if any"""
+    if trace is not None:
+        trace.get_current_span().add_event(
+            name, {key: value for key, value in (attributes or {}).items() if value is not None})
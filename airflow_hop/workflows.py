@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Decomposition of Hop workflows into Airflow tasks"""
+
+import json
+import re
+from xml.etree import ElementTree
+
+from airflow.exceptions import AirflowException
+from airflow.utils.trigger_rule import TriggerRule
+
+from airflow_hop.archives import resolve_reference
+from airflow_hop.cache import cached_file_content
+from airflow_hop.operators import HopPipelineOperator, HopWorkflowOperator
+
+PIPELINE_ACTION = 'PIPELINE'
+WORKFLOW_ACTION = 'WORKFLOW'
+# Start, Dummy and Success actions, which do nothing and always succeed
+NOOP_ACTIONS = ('SPECIAL', 'DUMMY', 'SUCCESS')
+
+SUCCESS = 'success'
+FAILURE = 'failure'
+UNCONDITIONAL = 'unconditional'
+
+
+def _parse_file(path) -> bytes:
+    try:
+        root = ElementTree.parse(path).getroot()
+    except FileNotFoundError as error:
+        raise AirflowException(f'ERROR: workflow {path} not found') from error
+
+    actions = []
+    for action in root.iterfind('actions/action'):
+        actions.append({
+            'name': action.findtext('name'),
+            'type': action.findtext('type'),
+            'filename': action.findtext('filename'),
+            'run_configuration': action.findtext('run_configuration'),
+            'pass_all_parameters': action.findtext('parameters/pass_all_parameters', 'Y'),
+            'parameters': [{'name': parameter.findtext('name'),
+                            'stream_name': parameter.findtext('stream_name'),
+                            'value': parameter.findtext('value') or ''}
+                           for parameter in action.iterfind('parameters/parameter')],
+        })
+    hops = []
+    for hop in root.iterfind('hops/hop'):
+        if hop.findtext('enabled', 'Y') != 'Y':
+            continue
+        if hop.findtext('unconditional') == 'Y':
+            condition = UNCONDITIONAL
+        elif hop.findtext('evaluation', 'Y') == 'Y':
+            condition = SUCCESS
+        else:
+            condition = FAILURE
+        hops.append({'from': hop.findtext('from'), 'to': hop.findtext('to'),
+                     'condition': condition})
+    return json.dumps({'name': root.findtext('name'), 'actions': actions,
+                       'hops': hops}).encode('utf-8')
+
+
+def parse_workflow(path) -> dict:
+    """
+    Returns the actions and enabled hops of a workflow file. The result is
+    cached on the worker until the file is modified, so that parsing DAG files
+    stays fast.
+    """
+    return json.loads(cached_file_content('workflows', path, _parse_file))
+
+
+def get_task_graph(workflow, bypass_actions=()) -> dict:
+    """
+    Reduces a parsed workflow to its pipeline and workflow actions. Returns the
+    hop conditions from the upstream actions of each of them, Start, Dummy and
+    Success actions being bypassed, as well as the action types listed in
+    bypass_actions. A path through a bypassed action only depends on the result
+    of the action it starts from, since bypassed actions always succeed. Other
+    actions, e.g. SQL, Shell or conditions, cannot run as tasks and raise an
+    error rather than being dropped.
+    """
+    types = {action['name']: action['type'] for action in workflow['actions']}
+    bypassed = NOOP_ACTIONS + tuple(bypass_actions)
+    for name, action_type in types.items():
+        if action_type not in (PIPELINE_ACTION, WORKFLOW_ACTION) + bypassed:
+            raise AirflowException(f'ERROR: action {name} of type {action_type} cannot run '
+                                   'as a task, run the workflow with HopWorkflowOperator or '
+                                   'list its type in bypass_actions')
+    incoming = {}
+    for hop in workflow['hops']:
+        incoming.setdefault(hop['to'], []).append(hop)
+
+    graph = {}
+    for name, action_type in types.items():
+        if action_type not in (PIPELINE_ACTION, WORKFLOW_ACTION):
+            continue
+        upstream = {}
+        pending = list(incoming.get(name, []))
+        visited = set()
+        while pending:
+            hop = pending.pop()
+            source = hop['from']
+            if types.get(source) in (PIPELINE_ACTION, WORKFLOW_ACTION):
+                upstream.setdefault(source, set()).add(hop['condition'])
+            elif hop['condition'] != FAILURE and source not in visited:
+                visited.add(source)
+                pending.extend(incoming.get(source, []))
+        graph[name] = upstream
+    return graph
+
+
+def get_trigger_rule(conditions) -> str:
+    """Returns the trigger rule matching the conditions of the hops into an action"""
+    if not conditions or conditions == {SUCCESS}:
+        return TriggerRule.ALL_SUCCESS
+    if conditions == {FAILURE}:
+        return TriggerRule.ALL_FAILED
+    if FAILURE not in conditions:
+        return TriggerRule.ALL_DONE
+    raise AirflowException('ERROR: actions reached by both failure and other hops '
+                           'are not supported')
+
+
+def _task_id(prefix, name) -> str:
+    return prefix + re.sub(r'[^a-zA-Z0-9_.\-]', '_', name)
+
+
+def get_action_params(action, params=None) -> dict:
+    """
+    Returns the parameters the action passes to its pipeline or workflow: the
+    given params unless the action does not pass all parameters, updated with
+    the values of the action. Values taken from fields of the result rows of
+    previous actions raise an error, as tasks do not share result rows.
+    """
+    action_params = dict(params or {}) if action.get('pass_all_parameters', 'Y') == 'Y' else {}
+    for parameter in action.get('parameters', []):
+        if parameter['stream_name']:
+            raise AirflowException(f'ERROR: action {action["name"]} takes parameter '
+                                   f'{parameter["name"]} from result rows, which tasks '
+                                   'do not share')
+        action_params[parameter['name']] = parameter['value']
+    return action_params
+
+
+def build_workflow_tasks(workflow,
+                         project_path,
+                         project_name,
+                         environment_path,
+                         environment_name,
+                         hop_config_path,
+                         log_level='Basic',
+                         project_home='${PROJECT_HOME}',
+                         pipe_config=None,
+                         task_id_prefix='',
+                         bypass_actions=(),
+                         **kwargs) -> dict:
+    """
+    Creates one HopPipelineOperator or HopWorkflowOperator per pipeline and
+    workflow action of the workflow file, relative to the project path, and
+    sets their dependencies from the hops between the actions. Failure and
+    unconditional hops are mapped to the all_failed and all_done trigger rules.
+
+    File names of the actions are made relative to the project from
+    project_home, the project home used when designing the workflow. Pipelines
+    run with the run configuration of their action unless pipe_config is set.
+    Actions other than pipelines, workflows, Start, Dummy and Success raise an
+    error unless their type is in bypass_actions. Extra keyword arguments, e.g.
+    dag or params, are passed to every operator, params being combined with the
+    parameters of each action. Returns the tasks per action name.
+    """
+    parsed = parse_workflow(f'{project_path}/{workflow}')
+    actions = {action['name']: action for action in parsed['actions']}
+    graph = get_task_graph(parsed, bypass_actions)
+
+    common = {
+        'project_path': project_path,
+        'project_name': project_name,
+        'environment_path': environment_path,
+        'environment_name': environment_name,
+        'hop_config_path': hop_config_path,
+        'log_level': log_level,
+    }
+    tasks = {}
+    for name, upstream in graph.items():
+        action = actions[name]
+        filename = resolve_reference(action['filename'] or '', workflow, project_path,
+                                     project_home)
+        task_kwargs = dict(kwargs, task_id=_task_id(task_id_prefix, name),
+                           params=get_action_params(action, kwargs.get('params')) or None,
+                           trigger_rule=get_trigger_rule(
+                               set().union(*upstream.values()) if upstream else set()))
+        if action['type'] == PIPELINE_ACTION:
+            tasks[name] = HopPipelineOperator(
+                pipeline=filename,
+                pipe_config=pipe_config or action['run_configuration'],
+                **common, **task_kwargs)
+        else:
+            tasks[name] = HopWorkflowOperator(workflow=filename, **common, **task_kwargs)
+
+    for name, upstream in graph.items():
+        for source in upstream:
+            tasks[name].set_upstream(tasks[source])
+    return tasks
@@ -14,6 +14,7 @@
 # limitations under the License.
 
 import base64
+import copy
 import gzip
 import json
 import os
@@ -22,6 +23,8 @@ from xml.etree import ElementTree
 from xml.etree.ElementTree import Element
 
 from airflow.exceptions import AirflowException
+from airflow_hop.cache import cached_file_content, file_signature
+from airflow_hop.metrics import timed
 
 class XMLBuilder:
     """
@@ -42,8 +45,10 @@ class XMLBuilder:
                 task_params):
 
         self.project_path = project_path
+        self.__cache = {}
+        self.config_files = [f'{hop_config_path}/hop-config.json']
 
-        with open(f'{hop_config_path}/hop-config.json', encoding='utf-8') as file:
+        with open(self.config_files[0], encoding='utf-8') as file:
             config_data = json.load(file)
 
         self.global_variables = config_data['variables']
@@ -53,7 +58,8 @@ class XMLBuilder:
         
         self.metastore_file = f'{project_path}/metadata.json'
 
-        with open(f'{project_path}/{project["configFilename"]}') as file:
+        self.config_files.append(f'{project_path}/{project["configFilename"]}')
+        with open(self.config_files[-1]) as file:
             project_data = json.load(file)
         self.project_variables = project_data['config']['variables']
 
@@ -63,22 +69,42 @@ class XMLBuilder:
             self.task_params = task_params
 
         self.environment_vars = []
-        if environment_name is None: return
-
-        env = next(item for item in config_data['projectsConfig']['lifecycleEnvironments']
-            if item['name'] == environment_name)
-        for env_file in env['configurationFiles']:
-            env_file = env_file.split('/')[-1]
-            with open(f'{environment_path}/{env_file}', encoding='utf-8') as file:
-                env_data = json.load(file)
-            self.environment_vars = self.environment_vars + env_data['variables']
+        if environment_name is not None:
+            env = next(item for item in config_data['projectsConfig']['lifecycleEnvironments']
+                if item['name'] == environment_name)
+            for env_file in env['configurationFiles']:
+                env_file = env_file.split('/')[-1]
+                self.config_files.append(f'{environment_path}/{env_file}')
+                with open(self.config_files[-1], encoding='utf-8') as file:
+                    env_data = json.load(file)
+                self.environment_vars = self.environment_vars + env_data['variables']
+
+        self.__signatures = self.__get_signatures()
+
+    def is_stale(self) -> bool:
+        """Tells whether any configuration file changed since the builder was created"""
+        try:
+            return self.__get_signatures() != self.__signatures
+        except FileNotFoundError:
+            return True
+
+    def __get_signatures(self) -> list:
+        return [file_signature(path) for path in self.config_files]
+
+    def with_task_params(self, task_params) -> 'XMLBuilder':
+        """
+        Returns a builder that shares this one's loaded configuration and parsed
+        files but resolves a different set of task parameters
+        """
+        builder = copy.copy(self)
+        builder.task_params = [] if task_params is None else task_params
+        return builder
 
     def get_workflow_xml(self, workflow_name) -> bytes:
         workflow_path = f'{self.project_path}/{workflow_name}'
         root = Element('workflow_configuration')
         try:
-            workflow = ElementTree.parse(workflow_path)
-            root.append(workflow.getroot())
+            root.append(self.__parse(workflow_path))
             root.append(self.__get_workflow_execution_config(workflow_path))
             root.append(self.__generate_element('metastore_json', self.__generate_metastore()))
             return ElementTree.tostring(root, encoding='utf-8')
@@ -94,8 +120,7 @@ class XMLBuilder:
         return root
 
     def __get_workflow_parameters(self, workflow_path):
-        tree = ElementTree.parse(workflow_path)
-        tree_root = tree.getroot()
+        tree_root = self.__parse(workflow_path)
         parameters = tree_root.findall('parameters')
         root = Element('parameters')
         for parameter in parameters[0]:
@@ -110,8 +135,7 @@ class XMLBuilder:
         pipeline_path = f'{self.project_path}/{pipeline_name}'
         root = Element('pipeline_configuration')
         try:
-            pipeline = ElementTree.parse(pipeline_path)
-            root.append(pipeline.getroot())
+            root.append(self.__parse(pipeline_path))
             root.append(self.__get_pipeline_execution_config(pipeline_config, pipeline_path))
             root.append(self.__generate_element('metastore_json', self.__generate_metastore()))
             return ElementTree.tostring(root, encoding='utf-8')
@@ -129,8 +153,7 @@ class XMLBuilder:
         return root
 
     def __get_pipe_parameters(self, pipeline_file) -> Element:
-        tree = ElementTree.parse(pipeline_file)
-        tree_root = tree.getroot()
+        tree_root = self.__parse(pipeline_file)
         parameters = tree_root[0].findall('parameters')
         root = Element('parameters')
         for parameter in parameters[0]:
@@ -140,64 +163,65 @@ class XMLBuilder:
             root.append(new_param)
         return root
 
-    def __get_variables(self, pipeline_config = None) -> Element:
-        root = Element('variables')
-
-        for parameter in self.task_params:
-            new_variable = Element('variable')
-            new_variable.append(self.__generate_element('name', parameter))
-            new_variable.append(self.__generate_element('value',
-                self.task_params[parameter]))
-            root.append(new_variable)
-
-        for variable in self.global_variables:
-            new_variable = Element('variable')
-            new_variable.append(self.__generate_element('name', variable['name']))
-            new_variable.append(self.__generate_element('value', variable['value']))
-            root.append(new_variable)
+    def get_variables(self, pipeline_config=None) -> list:
+        """
+        Returns the (name, value) pairs of the variables of an execution, from
+        the task parameters, the global configuration, the pipeline run
+        configuration, the project and the environment, in this order.
+        """
+        variables = [(name, self.task_params[name]) for name in self.task_params]
+        variables += [(item['name'], item['value']) for item in self.global_variables]
 
         if pipeline_config is not None:
-            with open(self.metastore_file, encoding='utf-8') as f:
-                data = json.load(f)
-
+            data = self.__load_metastore()
             run_config = next(item for item in data['pipeline-run-configuration']
                 if item['name'] == pipeline_config)
+            variables += [(item['name'], item['value'])
+                          for item in run_config['configurationVariables']]
 
-            pipeline_vars = run_config['configurationVariables']
-            for variable in pipeline_vars:
-                new_variable = Element('variable')
-                new_variable.append(self.__generate_element('name',variable['name']))
-                new_variable.append(self.__generate_element('value',variable['value']))
-                root.append(new_variable)
-
-        for variable in self.project_variables:
-            new_variable = Element('variable')
-            new_variable.append(self.__generate_element('name',variable['name']))
-            new_variable.append(self.__generate_element('value',variable['value']))
-            root.append(new_variable)
+        variables += [(item['name'], item['value']) for item in self.project_variables]
+        variables += [(item['name'], item['value']) for item in self.environment_vars]
+        variables.append(('PROJECT_HOME', self.project_path))
+        variables.append(('jdk.debug', 'release'))
+        return variables
 
-        for variable in self.environment_vars:
+    def __get_variables(self, pipeline_config = None) -> Element:
+        root = Element('variables')
+        for name, value in self.get_variables(pipeline_config):
             new_variable = Element('variable')
-            new_variable.append(self.__generate_element('name', variable['name']))
-            new_variable.append(self.__generate_element('value', variable['value']))
+            new_variable.append(self.__generate_element('name', name))
+            new_variable.append(self.__generate_element('value', value))
             root.append(new_variable)
+        return root
 
-        project_home = Element('variable')
-        project_home.append(self.__generate_element('name','PROJECT_HOME'))
-        project_home.append(self.__generate_element('value',self.project_path))
-        root.append(project_home)
+    def __parse(self, path) -> Element:
+        key = ('document', file_signature(path))
+        if key not in self.__cache:
+            self.__cache[key] = ElementTree.parse(path).getroot()
+        return self.__cache[key]
 
-        jdk_debug = Element('variable')
-        jdk_debug.append(self.__generate_element('name','jdk.debug'))
-        jdk_debug.append(self.__generate_element('value','release'))
-        root.append(jdk_debug)
-        return root
+    def __load_metastore(self) -> dict:
+        key = ('metastore', file_signature(self.metastore_file))
+        if key not in self.__cache:
+            with open(self.metastore_file, encoding='utf-8') as file:
+                self.__cache[key] = json.load(file)
+        return self.__cache[key]
 
     def __generate_metastore(self) -> str:
-        with open(self.metastore_file, mode='br') as file:
+        key = ('metastore_json', file_signature(self.metastore_file))
+        if key not in self.__cache:
+            with timed('metastore_compress'):
+                content = cached_file_content('metastore', self.metastore_file,
+                                              self.__compress_metastore)
+            self.__cache[key] = content.decode('utf-8')
+        return self.__cache[key]
+
+    @staticmethod
+    def __compress_metastore(path) -> bytes:
+        with open(path, mode='br') as file:
             content = file.read()
-        metastore = gzip.compress(content)
-        return base64.b64encode(metastore).decode('utf-8')
+        metastore = gzip.compress(content, mtime=0)
+        return base64.b64encode(metastore)
 
     def __generate_element(self, name:str, text = None) -> Element:
         element = Element(name)
@@ -54,6 +54,10 @@ setup(
     install_requires=[
       'xmltodict >= 0.12.0',
     ],
+    extras_require={
+      'prometheus': ['prometheus-client'],
+      'parquet': ['pyarrow'],
+    },
     entry_points={
         'airflow.plugins': [
             'airflow_hop = airflow_hop.plugin:HopPlugin'
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Log decoding and status parsing cost of the operators on synthetic executions.
+
+Logs are gzipped and base64 encoded in a CDATA section, as Hop Server sends
+them in the logging_string of a status, from 1 KB to 500 MB of text. Every
+scenario runs in a new process and reports the median wall time, the
+throughput in MB/s of decoded text and in lines/s, and the peak RSS added on
+top of the input:
+
+- decode: HopBaseOperator._log_logging_string with the task logger disabled.
+- logged: the same, every line being written to a log handler.
+- polls: the log growing over --polls status calls until it reaches its size,
+  as read by an operator polling a running execution. Decoding the whole log
+  on every poll makes the last polls the slowest and the total cost grow with
+  the square of the size: amplification is the total time over the time of a
+  single decode of the final log, 1 for a decoder that only reads new data.
+- pipeline_status, workflow_status: HopServerConnection status calls, from the
+  HTTP response text to the parsed status, for pipelines of 10 to 10,000
+  transforms and workflows with logs of 1 KB to 10 MB.
+
+Results are compared with the baselines stored in baselines/bench_logs.json,
+see bench_xml for the threshold and --save-baseline.
+
+Usage: python -m tests.benchmarks.bench_logs [--sizes 0.001 1 10 100 500]
+           [--transforms 10 1000 10000] [--polls 10] [--repeat 3]
+           [--threshold 1.5] [--save-baseline]
+"""
+
+import argparse
+import base64
+import gzip
+import logging
+import os
+import random
+import statistics
+import time
+
+from airflow_hop.hooks import HopHook
+from airflow_hop.operators import HopPipelineOperator
+from tests.benchmarks.harness import (check_baselines, peak_rss_mb, reset_peak_rss, rss_mb,
+                                      run_in_process)
+
+HOST = 'hop.bench'
+PORT = 8080
+USERNAME = 'cluster'
+LOG_BLOCK_LINES = 10000
+# Differences below these are noise whatever the ratio
+MIN_DELTA = {'ms': 1.0, 'last_poll_ms': 1.0, 'total_ms': 5.0, 'amplification': 0.5,
+             'peak_mb': 10.0}
+
+
+def _log_text(size_mb) -> str:
+    """
+    Returns about size_mb of Hop log lines. A block of lines with random values
+    is repeated, larger than the gzip window so that it compresses as real logs.
+    """
+    rnd = random.Random(0)
+    block = ''.join(
+        f'2022/01/01 00:{line // 600 % 60:02d}:{line // 10 % 60:02d} - Transform '
+        f'{rnd.randrange(200)}.0 - linenr {rnd.randrange(10 ** 7)} '
+        f'(I={rnd.randrange(10 ** 6)}, O=0, R={rnd.randrange(10 ** 6)}, W=0, U=0, E=0)\n'
+        for line in range(LOG_BLOCK_LINES))
+    size = int(size_mb * 1024 * 1024)
+    return (block * (size // len(block) + 1))[:size].rpartition('\n')[0] + '\n'
+
+
+def _logging_string(text) -> str:
+    """Encodes the log as the logging_string of a parsed status"""
+    encoded = base64.b64encode(gzip.compress(text.encode('utf-8'), compresslevel=6, mtime=0))
+    return f'<![CDATA[{encoded.decode("ascii")}]]>'
+
+
+def _operator(logged) -> HopPipelineOperator:
+    operator = HopPipelineOperator(
+        task_id='bench', pipeline='bench.hpl', pipe_config='local',
+        project_path='/bench', project_name='bench', environment_path='/bench',
+        environment_name='bench', hop_config_path='/bench', log_level='Basic')
+    logger = operator.log
+    logger.propagate = False
+    logger.handlers = []
+    if logged:
+        logger.addHandler(logging.FileHandler(os.devnull))
+        logger.setLevel(logging.INFO)
+    else:
+        logger.setLevel(logging.WARNING)
+    return operator
+
+
+def _median(function, repeat) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def _throughput(seconds, size_mb, lines) -> dict:
+    return {'ms': round(seconds * 1000, 3),
+            'mb_s': round(size_mb / seconds, 1),
+            'lines_s': round(lines / seconds)}
+
+
+def _run_decode(size_mb, logged, repeat) -> dict:
+    text = _log_text(size_mb)
+    lines = text.count('\n')
+    raw = _logging_string(text)
+    del text
+    operator = _operator(logged)
+    reset_peak_rss()
+    start_rss = rss_mb()
+    seconds = _median(lambda: operator._log_logging_string(raw), repeat)
+    results = _throughput(seconds, size_mb, lines)
+    results['peak_mb'] = round(peak_rss_mb() - start_rss, 1)
+    return results
+
+
+def _run_polls(size_mb, polls) -> dict:
+    text = _log_text(size_mb)
+    cut = [text.rfind('\n', 0, len(text) * poll // polls) + 1 for poll in range(1, polls + 1)]
+    raws = [_logging_string(text[:end]) for end in cut]
+    del text
+    operator = _operator(False)
+    operator._log_logging_string(raws[0])
+    reset_peak_rss()
+    start_rss = rss_mb()
+    timings = []
+    for raw in raws:
+        start = time.perf_counter()
+        operator._log_logging_string(raw)
+        timings.append(time.perf_counter() - start)
+    single = _median(lambda: operator._log_logging_string(raws[-1]), 3)
+    return {'first_poll_ms': round(timings[0] * 1000, 3),
+            'last_poll_ms': round(timings[-1] * 1000, 3),
+            'total_ms': round(sum(timings) * 1000, 3),
+            'amplification': round(sum(timings) / single, 2),
+            'peak_mb': round(peak_rss_mb() - start_rss, 1)}
+
+
+class _Response:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, text):
+        self.text = text
+        self.content = text.encode('utf-8')
+
+
+class _Session:
+    """Stands for the HTTP session of the hook, always answering the same text"""
+
+    def __init__(self, text):
+        self.response = _Response(text)
+
+    def get(self, **kwargs):  # pylint: disable=unused-argument
+        return self.response
+
+
+def _status_document(kind, transforms, log_mb) -> str:
+    name_tag = 'pipeline_name' if kind == 'pipeline' else 'workflowname'
+    body = [f'<?xml version="1.0" encoding="UTF-8"?>\n<{kind}-status>',
+            f'<{name_tag}>bench</{name_tag}><id>bench-id</id>',
+            '<status_desc>Running</status_desc><error_desc/>',
+            '<execution_start_date>2022/01/01 00:00:00.000</execution_start_date>',
+            '<execution_end_date/>']
+    if kind == 'pipeline':
+        body.append('<transform_status_list>')
+        for transform in range(transforms):
+            body.append(
+                f'<transform_status><transformName>Transform {transform}</transformName>'
+                f'<copy>0</copy><linesRead>{transform * 1000}</linesRead>'
+                f'<linesWritten>{transform * 1000}</linesWritten><linesInput>0</linesInput>'
+                '<linesOutput>0</linesOutput><linesUpdated>0</linesUpdated>'
+                '<linesRejected>0</linesRejected><errors>0</errors>'
+                '<input_buffer_size>0</input_buffer_size><output_buffer_size>0</output_buffer_size>'
+                '<statusDescription>Running</statusDescription><seconds>10.0</seconds>'
+                '<speed>100</speed><priority>-</priority><stopped>N</stopped>'
+                '<paused>N</paused></transform_status>')
+        body.append('</transform_status_list>')
+    logging_string = _logging_string(_log_text(log_mb))
+    body.append(f'<logging_string>{logging_string.replace("<", "&lt;").replace(">", "&gt;")}'
+                f'</logging_string></{kind}-status>')
+    return ''.join(body)
+
+
+def _run_status(kind, transforms, log_mb, repeat) -> dict:
+    document = _status_document(kind, transforms, log_mb)
+    HopHook.SESSIONS[(HOST, PORT, USERNAME)] = _Session(document)
+    conn = HopHook.HopServerConnection(HOST, PORT, USERNAME, 'cluster', '/bench', 'bench',
+                                       'bench', '/bench', '/bench', 'Basic')
+    status = getattr(conn, f'{kind}_status')
+    reset_peak_rss()
+    start_rss = rss_mb()
+    seconds = _median(lambda: status('bench', 'bench-id'), repeat)
+    size_mb = len(document) / 1024 / 1024
+    results = {'ms': round(seconds * 1000, 3),
+               'mb_s': round(size_mb / seconds, 1),
+               'peak_mb': round(peak_rss_mb() - start_rss, 1)}
+    if kind == 'pipeline':
+        results['transforms_s'] = round(transforms / seconds)
+    return results
+
+
+def _size_name(size_mb) -> str:
+    return f'{size_mb * 1000:g}kb' if size_mb < 1 else f'{size_mb:g}mb'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 2)[1])
+    parser.add_argument('--sizes', type=float, nargs='+', default=[0.001, 1, 10, 100],
+                        help='log sizes in MB, 500 needs about 4 GB of memory')
+    parser.add_argument('--transforms', type=int, nargs='+', default=[10, 1000, 10000])
+    parser.add_argument('--polls', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help='ratio to the baseline above which a measure regressed')
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    results = {}
+    print(f'{"scenario":<28}{"median (ms)":>12}{"MB/s":>9}{"lines/s":>12}{"peak (MB)":>11}')
+    for size_mb in args.sizes:
+        for variant in ('decode', 'logged'):
+            scenario = f'{variant}_{_size_name(size_mb)}'
+            values = run_in_process(_run_decode, size_mb, variant == 'logged', args.repeat)
+            results[scenario] = values
+            print(f'{scenario:<28}{values["ms"]:>12.3f}{values["mb_s"]:>9.1f}'
+                  f'{values["lines_s"]:>12}{values["peak_mb"]:>11.1f}')
+
+    print(f'\n{"scenario":<28}{"first (ms)":>12}{"last (ms)":>12}{"total (ms)":>12}'
+          f'{"amplif.":>9}{"peak (MB)":>11}')
+    for size_mb in args.sizes:
+        scenario = f'polls_{_size_name(size_mb)}'
+        values = run_in_process(_run_polls, size_mb, args.polls)
+        results[scenario] = values
+        print(f'{scenario:<28}{values["first_poll_ms"]:>12.3f}{values["last_poll_ms"]:>12.3f}'
+              f'{values["total_ms"]:>12.3f}{values["amplification"]:>9.2f}'
+              f'{values["peak_mb"]:>11.1f}')
+
+    print(f'\n{"scenario":<28}{"median (ms)":>12}{"MB/s":>9}{"transforms/s":>14}'
+          f'{"peak (MB)":>11}')
+    cases = [('pipeline_status', 'pipeline', transforms, 0.01) for transforms in args.transforms]
+    cases += [('workflow_status', 'workflow', 0, size_mb) for size_mb in args.sizes
+              if size_mb <= 10]
+    for name, kind, transforms, log_mb in cases:
+        scenario = f'{name}_{transforms}' if kind == 'pipeline' else f'{name}_{_size_name(log_mb)}'
+        values = run_in_process(_run_status, kind, transforms, log_mb, args.repeat)
+        results[scenario] = values
+        print(f'{scenario:<28}{values["ms"]:>12.3f}{values["mb_s"]:>9.1f}'
+              f'{values.get("transforms_s", "-"):>14}{values["peak_mb"]:>11.1f}')
+
+    check_baselines('bench_logs', results, args.threshold, MIN_DELTA, args.save_baseline)
+
+
+if __name__ == '__main__':
+    main()
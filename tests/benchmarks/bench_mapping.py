@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Per-instance client side overhead of mapped HopPipelineOperator tasks.
+
+Every mapped instance resolves its hook (Airflow connection lookup included)
+and builds its registration payload, which is the work done before the first
+HTTP call. Three scenarios are compared:
+
+- isolated: nothing is cached, as before hooks and builders were shared.
+- forked: a new process per instance, so only the worker disk cache survives.
+  This is what the standard task runners do.
+- shared: every instance runs in the same process.
+
+Usage: python -m tests.benchmarks.bench_mapping [--instances 500]
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from airflow_hop.cache import CACHE_DIR_ENV
+from airflow_hop.hooks import HopHook
+from airflow_hop.operators import HopPipelineOperator
+from tests.operator_test_base import OperatorTestBase
+
+HOP_CONFIG_PATH = f'{OperatorTestBase.TESTS_PATH}/assets/config'
+PROJECT_PATH = f'{HOP_CONFIG_PATH}/projects/default'
+PIPELINE = 'pipelines/get_param.hpl'
+PIPELINE_CONFIG = 'remote hop server'
+
+
+def run_instance(map_index) -> float:
+    operator = HopPipelineOperator(
+        task_id=f'mapped_{map_index}',
+        pipeline=PIPELINE,
+        pipe_config=PIPELINE_CONFIG,
+        project_path=PROJECT_PATH,
+        project_name='default',
+        environment_path=f'{HOP_CONFIG_PATH}/projects',
+        environment_name='Dev',
+        hop_config_path=HOP_CONFIG_PATH,
+        log_level='Basic',
+        params={'DATE': f'2022-01-{map_index % 28 + 1:02d}'})
+
+    start = time.perf_counter()
+    conn = operator._get_hop_client()  # pylint: disable=protected-access
+    conn.get_xml_builder(operator.task_params).get_pipeline_xml(PIPELINE, PIPELINE_CONFIG)
+    return time.perf_counter() - start
+
+
+def run_scenario(name, instances, cache_dir) -> dict:
+    HopHook.clear_cache()
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    timings = []
+    for map_index in range(instances):
+        if name != 'shared':
+            HopHook.clear_cache()
+        if name == 'isolated':
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        timings.append(run_instance(map_index))
+    timings.sort()
+    return {
+        'scenario': name,
+        'total_s': sum(timings),
+        'mean_ms': statistics.mean(timings) * 1000,
+        'p95_ms': timings[int(len(timings) * 0.95) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 2)[1])
+    parser.add_argument('--instances', type=int, default=500)
+    args = parser.parse_args()
+
+    OperatorTestBase.setUpClass()
+    cache_dir = tempfile.mkdtemp()
+    os.environ[CACHE_DIR_ENV] = cache_dir
+    try:
+        print(f'{"scenario":<10}{"total (s)":>12}{"mean (ms)":>12}{"p95 (ms)":>12}')
+        for scenario in ('isolated', 'forked', 'shared'):
+            result = run_scenario(scenario, args.instances, cache_dir)
+            print(f'{result["scenario"]:<10}{result["total_s"]:>12.3f}'
+                  f'{result["mean_ms"]:>12.3f}{result["p95_ms"]:>12.3f}')
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
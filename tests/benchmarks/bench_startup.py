@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Startup latency of HopPipelineOperator, from registration to a running pipeline.
+
+The standard path registers, prepares and starts the pipeline in three round
+trips, the fast path (fast_start=True) registers it and then prepares and
+starts it with a single startPipeline call. Both run against the simulated
+Hop Server answering every call after a fixed latency, standing for the
+network and servlet time of a real server.
+
+Usage: python -m tests.benchmarks.bench_startup [--pipelines 200] [--latency 20]
+"""
+
+import argparse
+import logging
+import statistics
+import time
+
+from airflow_hop.hooks import HopHook
+from airflow_hop.operators import HopPipelineOperator
+from tests.operator_test_base import OperatorTestBase
+from tests.simulator import HopServerSimulator
+
+HOP_CONFIG_PATH = f'{OperatorTestBase.TESTS_PATH}/assets/config'
+PROJECT_PATH = f'{HOP_CONFIG_PATH}/projects/default'
+PIPELINE = 'pipelines/get_param.hpl'
+PIPELINE_CONFIG = 'remote hop server'
+
+def run_scenario(fast_start, pipelines, port) -> dict:
+    operator = HopPipelineOperator(
+        task_id='startup',
+        pipeline=PIPELINE,
+        pipe_config=PIPELINE_CONFIG,
+        project_path=PROJECT_PATH,
+        project_name='default',
+        environment_path=f'{HOP_CONFIG_PATH}/projects',
+        environment_name='Dev',
+        hop_config_path=HOP_CONFIG_PATH,
+        log_level='Basic',
+        fast_start=fast_start)
+    conn = HopHook.HopServerConnection(
+        '127.0.0.1', port, 'cluster', 'cluster', PROJECT_PATH, 'default', 'Dev',
+        f'{HOP_CONFIG_PATH}/projects', HOP_CONFIG_PATH, 'Basic')
+    xml_builder = conn.get_xml_builder()
+    payload = conn.get_pipeline_payload(PIPELINE, PIPELINE_CONFIG, xml_builder=xml_builder)
+
+    timings = []
+    for _ in range(pipelines):
+        start = time.perf_counter()
+        operator._start_pipeline(conn, xml_builder, payload)  # pylint: disable=protected-access
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'scenario': 'fast' if fast_start else 'standard',
+        'mean_ms': statistics.mean(timings) * 1000,
+        'p95_ms': timings[int(len(timings) * 0.95) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 2)[1])
+    parser.add_argument('--pipelines', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=20, help='per call, in milliseconds')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    try:
+        with HopServerSimulator(latency=args.latency / 1000) as simulator:
+            results = [run_scenario(fast_start, args.pipelines, simulator.port)
+                       for fast_start in (False, True)]
+    finally:
+        HopHook.clear_cache()
+
+    print(f'{"scenario":<10}{"mean (ms)":>12}{"p95 (ms)":>12}')
+    for result in results:
+        print(f'{result["scenario"]:<10}{result["mean_ms"]:>12.3f}{result["p95_ms"]:>12.3f}')
+    saved = results[0]['mean_ms'] - results[1]['mean_ms']
+    print(f'saved {saved:.3f} ms per pipeline, {saved / results[0]["mean_ms"]:.0%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Payload building cost of XMLBuilder on synthetic projects at scale.
+
+Projects are generated with pipelines and workflows of 10 to 2,000 transforms
+or actions, metastores of 10 KB to 50 MB and up to 500 variables in each of the
+global, project and environment layers. Every scenario runs in a new process
+and measures the median wall time and the peak of memory allocated by Python
+of each operation, and the peak RSS of the process:
+
+- init: XMLBuilder construction, that is loading the configuration files.
+- pipeline_cold, workflow_cold: first payload of a builder, the worker cache
+  being empty.
+- pipeline_forked, workflow_forked: first payload of a builder, the worker
+  cache being filled, as in every task process but the first one.
+- pipeline_warm, workflow_warm: following payloads of the same builder.
+
+Results are compared with the baselines stored in baselines/bench_xml.json and
+the command fails when a measure exceeds its baseline by more than the
+threshold ratio. Baselines depend on the machine, save them again with
+--save-baseline after an intended change or on a new machine.
+
+Usage: python -m tests.benchmarks.bench_xml [--scenario medium] [--repeat 5]
+           [--threshold 1.5] [--save-baseline]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from airflow_hop.cache import CACHE_DIR_ENV
+from airflow_hop.xml import XMLBuilder
+from tests.benchmarks.harness import check_baselines, peak_rss_mb, run_in_process
+
+PROJECT = 'bench'
+ENVIRONMENT = 'bench-env'
+PIPELINE = 'pipelines/bench.hpl'
+WORKFLOW = 'workflows/bench.hwf'
+PIPELINE_CONFIG = 'local'
+PARAMETERS = 10
+
+SCENARIOS = {
+    'small': {'transforms': 10, 'metastore_kb': 10, 'variables': 10},
+    'medium': {'transforms': 200, 'metastore_kb': 1000, 'variables': 100},
+    'transforms_2000': {'transforms': 2000, 'metastore_kb': 10, 'variables': 10},
+    'metastore_50mb': {'transforms': 10, 'metastore_kb': 50000, 'variables': 10},
+    'variables_500': {'transforms': 10, 'metastore_kb': 10, 'variables': 500},
+    'large': {'transforms': 2000, 'metastore_kb': 50000, 'variables': 500},
+}
+MEASURES = ('init', 'pipeline_cold', 'pipeline_forked', 'pipeline_warm',
+            'workflow_cold', 'workflow_forked', 'workflow_warm')
+# Differences below these are noise whatever the ratio
+MIN_DELTA = {'ms': 1.0, 'alloc_mb': 1.0, 'rss_mb': 5.0}
+
+
+def _variables(prefix, count) -> list:
+    return [{'name': f'{prefix}_{index}', 'value': f'value {index}',
+             'description': f'Synthetic {prefix.lower()} variable {index}'}
+            for index in range(count)]
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, mode='w', encoding='utf-8') as file:
+        file.write(content)
+
+
+def _parameters(indent) -> str:
+    return ''.join(f'{indent}<parameter><name>PARAM_{index}</name>'
+                   f'<default_value>{index}</default_value><description/></parameter>\n'
+                   for index in range(PARAMETERS))
+
+
+def _pipeline(transforms) -> str:
+    hops = ''.join(f'    <hop><from>Transform {index}</from><to>Transform {index + 1}</to>'
+                   '<enabled>Y</enabled></hop>\n' for index in range(transforms - 1))
+    fields = ''.join(f'        <field><name>field_{field}</name><type>String</type>'
+                     f'<length>-1</length><precision>-1</precision></field>\n'
+                     for field in range(10))
+    body = ''.join(f'  <transform>\n    <name>Transform {index}</name>\n'
+                   '    <type>Dummy</type>\n    <copies>1</copies>\n'
+                   f'    <fields>\n{fields}    </fields>\n'
+                   f'    <GUI><xloc>{index * 10}</xloc><yloc>100</yloc></GUI>\n'
+                   '  </transform>\n' for index in range(transforms))
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<pipeline>\n  <info>\n'
+            '    <name>bench</name>\n    <parameters>\n'
+            f'{_parameters("      ")}    </parameters>\n  </info>\n'
+            f'  <order>\n{hops}  </order>\n{body}</pipeline>\n')
+
+
+def _workflow(actions) -> str:
+    body = ''.join(f'    <action>\n      <name>Action {index}</name>\n'
+                   '      <type>PIPELINE</type>\n'
+                   f'      <filename>${{PROJECT_HOME}}/{PIPELINE}</filename>\n'
+                   '      <run_configuration>local</run_configuration>\n'
+                   f'      <xloc>{index * 10}</xloc><yloc>100</yloc>\n    </action>\n'
+                   for index in range(actions))
+    hops = ''.join(f'    <hop><from>Action {index}</from><to>Action {index + 1}</to>'
+                   '<enabled>Y</enabled><evaluation>Y</evaluation>'
+                   '<unconditional>N</unconditional></hop>\n' for index in range(actions - 1))
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<workflow>\n  <name>bench</name>\n'
+            f'  <parameters>\n{_parameters("    ")}  </parameters>\n'
+            f'  <actions>\n{body}  </actions>\n  <hops>\n{hops}  </hops>\n</workflow>\n')
+
+
+def _metastore(size_kb, variables) -> str:
+    rnd = random.Random(size_kb)
+    metastore = {
+        'pipeline-run-configuration': [{
+            'name': PIPELINE_CONFIG,
+            'description': '',
+            'engineRunConfiguration': {'Local': {'rowset_size': '10000'}},
+            'configurationVariables': _variables('RUN', variables),
+        }],
+        'rdbms': [],
+    }
+    size = len(json.dumps(metastore))
+    while size < size_kb * 1024:
+        connection = {
+            'name': f'connection_{len(metastore["rdbms"])}',
+            'hostname': f'db{rnd.randrange(1000)}.example.com',
+            'password': f'Encrypted {rnd.getrandbits(256):064x}',
+            'attributes': {f'attribute_{index}': f'{rnd.getrandbits(64):016x}'
+                           for index in range(10)},
+        }
+        metastore['rdbms'].append(connection)
+        size += len(json.dumps(connection)) + 2
+    return json.dumps(metastore, indent=2)
+
+
+def generate_project(root, transforms, metastore_kb, variables) -> dict:
+    """Writes a synthetic Hop configuration and project, returns XMLBuilder arguments"""
+    config_path = os.path.join(root, 'config')
+    environment_path = os.path.join(config_path, 'projects')
+    project_path = os.path.join(environment_path, PROJECT)
+    _write(os.path.join(config_path, 'hop-config.json'), json.dumps({
+        'variables': _variables('GLOBAL', variables),
+        'projectsConfig': {
+            'projectConfigurations': [{'projectName': PROJECT,
+                                       'projectHome': f'config/projects/{PROJECT}',
+                                       'configFilename': 'project-config.json'}],
+            'lifecycleEnvironments': [{'name': ENVIRONMENT, 'projectName': PROJECT,
+                                       'configurationFiles': [
+                                           f'config/projects/{ENVIRONMENT}.json']}],
+        },
+    }, indent=2))
+    _write(os.path.join(project_path, 'project-config.json'), json.dumps(
+        {'config': {'variables': _variables('PROJECT', variables)}}, indent=2))
+    _write(os.path.join(environment_path, f'{ENVIRONMENT}.json'), json.dumps(
+        {'variables': _variables('ENVIRONMENT', variables)}, indent=2))
+    _write(os.path.join(project_path, 'metadata.json'), _metastore(metastore_kb, variables))
+    _write(os.path.join(project_path, PIPELINE), _pipeline(transforms))
+    _write(os.path.join(project_path, WORKFLOW), _workflow(transforms))
+    return {'project_path': project_path, 'project_name': PROJECT,
+            'environment_path': environment_path, 'environment_name': ENVIRONMENT,
+            'hop_config_path': config_path, 'task_params': {'DATE': '2022-01-01'}}
+
+
+def _measure(function, setup, repeat) -> dict:
+    timings = []
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    setup()
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'ms': round(statistics.median(timings) * 1000, 3),
+            'alloc_mb': round(peak / 1024 / 1024, 3)}
+
+
+def _run_scenario(arguments, repeat) -> dict:
+    cache_dir = tempfile.mkdtemp()
+    os.environ[CACHE_DIR_ENV] = cache_dir
+    builders = {}
+
+    def new_builder():
+        builders['current'] = XMLBuilder(**arguments)
+
+    def clear_cache():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        new_builder()
+
+    def nothing():
+        pass
+
+    pipeline = lambda: builders['current'].get_pipeline_xml(PIPELINE, PIPELINE_CONFIG)
+    workflow = lambda: builders['current'].get_workflow_xml(WORKFLOW)
+    results = {'init': _measure(new_builder, nothing, repeat)}
+    for name, function in (('pipeline', pipeline), ('workflow', workflow)):
+        results[f'{name}_cold'] = _measure(function, clear_cache, repeat)
+        results[f'{name}_forked'] = _measure(function, new_builder, repeat)
+        results[f'{name}_warm'] = _measure(function, nothing, repeat)
+    results['rss_mb'] = round(peak_rss_mb(), 1)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    return results
+
+
+def run_scenario(name, repeat) -> dict:
+    root = tempfile.mkdtemp()
+    try:
+        arguments = generate_project(root, **SCENARIOS[name])
+        return run_in_process(_run_scenario, arguments, repeat)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 2)[1])
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS),
+                        help='scenario to run, can be repeated, all by default')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help='ratio to the baseline above which a measure regressed')
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    results = {}
+    print(f'{"scenario":<16}{"measure":<17}{"median (ms)":>12}{"alloc (MB)":>12}')
+    for scenario in args.scenario or list(SCENARIOS):
+        results[scenario] = run_scenario(scenario, args.repeat)
+        for measure in MEASURES:
+            values = results[scenario][measure]
+            print(f'{scenario:<16}{measure:<17}{values["ms"]:>12.3f}{values["alloc_mb"]:>12.3f}')
+        print(f'{scenario:<16}{"peak RSS (MB)":<17}{results[scenario]["rss_mb"]:>24.1f}')
+
+    check_baselines('bench_xml', results, args.threshold, MIN_DELTA, args.save_baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Helpers shared by the benchmarks: process isolation, peak RSS and baselines"""
+
+import json
+import multiprocessing
+import os
+import resource
+import sys
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+def reset_peak_rss():
+    """Resets the peak RSS of this process to its current RSS, on Linux"""
+    try:
+        with open('/proc/self/clear_refs', mode='w', encoding='utf-8') as file:
+            file.write('5')
+    except OSError:
+        pass
+
+
+def rss_mb() -> float:
+    """Returns the current RSS of this process, 0 where /proc is not available"""
+    try:
+        with open('/proc/self/status', encoding='utf-8') as file:
+            for line in file:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def peak_rss_mb() -> float:
+    try:
+        with open('/proc/self/status', encoding='utf-8') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run(target, args, queue):
+    reset_peak_rss()
+    queue.put(target(*args))
+
+
+def run_in_process(target, *args):
+    """
+    Returns target(*args) run in a new process, so that scenarios do not share
+    caches and each one has its own peak RSS
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run, args=(target, args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def load_baselines(name) -> dict:
+    try:
+        with open(os.path.join(BASELINES_PATH, f'{name}.json'), encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baselines(name, results):
+    baselines = load_baselines(name)
+    baselines.update(results)
+    path = os.path.join(BASELINES_PATH, f'{name}.json')
+    os.makedirs(BASELINES_PATH, exist_ok=True)
+    with open(path, mode='w', encoding='utf-8') as file:
+        file.write(json.dumps(baselines, indent=2, sort_keys=True) + '\n')
+    print(f'Saved baselines to {path}')
+
+
+def compare(results, baselines, threshold, min_delta, path=()) -> list:
+    """
+    Returns the measures exceeding their baseline by more than the threshold
+    ratio. Only the keys of min_delta are compared, lower values being better,
+    and differences below min_delta are ignored whatever the ratio.
+    """
+    regressions = []
+    for key, value in results.items():
+        expected = baselines.get(key) if isinstance(baselines, dict) else None
+        if isinstance(value, dict):
+            regressions += compare(value, expected or {}, threshold, min_delta, path + (key,))
+        elif key in min_delta and isinstance(expected, (int, float)):
+            if value > expected * threshold and value - expected > min_delta[key]:
+                regressions.append(f'{" ".join(path + (key,))}: {value:.3f} '
+                                   f'(baseline {expected:.3f})')
+    return regressions
+
+
+def check_baselines(name, results, threshold, min_delta, save=False):
+    """Saves the results as baselines, or exits with an error on regressions"""
+    if save:
+        save_baselines(name, results)
+        return
+    regressions = compare(results, load_baselines(name), threshold, min_delta)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    if regressions:
+        sys.exit(1)
@@ -0,0 +1,455 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Simulated Hop Server for tests and benchmarks.
+
+It implements the servlets used by HopServerConnection with configurable
+response latency, execution duration, log size, transform count and error
+injection, so that the hook and the operators can be exercised at hundreds of
+concurrent executions without a real server:
+
+    python -m tests.simulator --port 8081 --latency 20 --duration 5
+"""
+
+import argparse
+import base64
+import functools
+import gzip
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+HOP_DATE_FORMAT = '%Y/%m/%d %H:%M:%S.%f'
+LOG_DATE_FORMAT = '%Y/%m/%d %H:%M:%S'
+# Logs are regenerated at every tenth of the execution
+LOG_STEPS = 10
+
+WEBRESULT = '<webresult><result>{}</result><message>{}</message><id>{}</id></webresult>'
+ERROR_PAGE = '<html><head><title>{}</title></head><body>{}</body></html>'
+NAME = re.compile(rb'<name>([^<]*)</name>')
+
+
+def _date(timestamp) -> str:
+    return datetime.fromtimestamp(timestamp).strftime(HOP_DATE_FORMAT)[:-3] if timestamp else ''
+
+
+@functools.lru_cache(maxsize=256)
+def _logging_string(name, lines) -> str:
+    now = datetime.now().strftime(LOG_DATE_FORMAT)
+    text = ''.join(f'{now} - {name} - Simulated log line {line}\n' for line in range(lines))
+    return base64.b64encode(gzip.compress(text.encode('utf-8'), mtime=0)).decode('ascii')
+
+
+class Execution:
+    """A pipeline or workflow registered on the simulated server"""
+
+    def __init__(self, kind, name, duration, transforms, fails):
+        self.kind = kind
+        self.name = name
+        self.id = str(uuid.uuid4())
+        self.duration = duration
+        self.transforms = transforms
+        self.fails = fails
+        self.prepared = False
+        self.started = None
+        self.stopped = None
+
+    def progress(self, now) -> float:
+        if self.started is None:
+            return 0.0
+        if self.duration <= 0:
+            return 1.0
+        return min(1.0, ((self.stopped or now) - self.started) / self.duration)
+
+    def finished(self, now):
+        return self.started is not None and self.started + self.duration <= now
+
+    def status_desc(self, now) -> str:
+        if self.stopped is not None:
+            return 'Stopped'
+        if self.started is None:
+            # Hop Server reports prepared executions as waiting too
+            return 'Waiting'
+        if not self.finished(now):
+            return 'Running'
+        return 'Finished (with errors)' if self.fails else 'Finished'
+
+    def ended_at(self, now):
+        if self.stopped is not None:
+            return self.stopped
+        return self.started + self.duration if self.finished(now) else None
+
+
+class HopServerSimulator:
+    """
+    Simulated Hop Server listening on localhost.
+
+    latency: seconds added to every response
+    duration: seconds an execution runs once started
+    log_lines: number of lines of the log of a finished execution, the log
+        growing with the progress of the execution
+    transforms: number of transforms reported in pipeline statuses
+    error_rate: probability that a request fails with an HTTP 500 error
+    failure_rate: probability that an execution finishes with errors
+    credentials: (username, password) checked with basic authentication
+    """
+
+    def __init__(self,
+                 latency=0.0,
+                 duration=0.0,
+                 log_lines=10,
+                 transforms=2,
+                 error_rate=0.0,
+                 failure_rate=0.0,
+                 credentials=('cluster', 'cluster'),
+                 host='127.0.0.1',
+                 port=0,
+                 seed=None):
+        self.latency = latency
+        self.duration = duration
+        self.log_lines = log_lines
+        self.transforms = transforms
+        self.error_rate = error_rate
+        self.failure_rate = failure_rate
+        self.credentials = credentials
+        self.executions = {}
+        self.requests = {}
+        self.connections = 0
+        self.__failures = {}
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__thread = None
+
+        simulator = self
+
+        class Handler(SimulatorHandler):
+            server_simulator = simulator
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 1024
+
+        self.server = Server((host, port), Handler)
+
+    @property
+    def host(self) -> str:
+        return self.server.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def start(self) -> 'HopServerSimulator':
+        self.__thread = threading.Thread(target=self.server.serve_forever, args=(0.05,),
+                                         daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def fail_next(self, servlet, count=1, status=500):
+        """
+        Makes the next count calls to the servlet fail, with an HTTP error
+        status or, when status is 200, with an ERROR webresult
+        """
+        with self.__lock:
+            self.__failures.setdefault(servlet, []).extend([status] * count)
+
+    def counts(self) -> dict:
+        with self.__lock:
+            return {servlet: stats['count'] for servlet, stats in self.requests.items()}
+
+    def record(self, servlet, seconds):
+        with self.__lock:
+            stats = self.requests.setdefault(servlet, {'count': 0, 'seconds': 0.0})
+            stats['count'] += 1
+            stats['seconds'] += seconds
+
+    def connected(self):
+        with self.__lock:
+            self.connections += 1
+
+    def injected_failure(self, servlet):
+        with self.__lock:
+            failures = self.__failures.get(servlet)
+            if failures:
+                return failures.pop(0)
+            if self.error_rate and self.__random.random() < self.error_rate:
+                return 500
+        return None
+
+    def register(self, kind, name) -> Execution:
+        with self.__lock:
+            fails = bool(self.failure_rate) and self.__random.random() < self.failure_rate
+            execution = Execution(kind, name, self.duration, self.transforms, fails)
+            self.executions[execution.id] = execution
+        return execution
+
+    def get(self, kind, execution_id):
+        with self.__lock:
+            execution = self.executions.get(execution_id)
+        return execution if execution is not None and execution.kind == kind else None
+
+    def remove(self, execution_id):
+        with self.__lock:
+            self.executions.pop(execution_id, None)
+
+    def running(self) -> int:
+        now = time.time()
+        with self.__lock:
+            executions = list(self.executions.values())
+        return sum(1 for execution in executions if execution.status_desc(now) == 'Running')
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    """Answers the servlets of Hop Server from the state of the simulator"""
+
+    protocol_version = 'HTTP/1.1'
+    # Like Jetty, so that keep-alive responses are not held by delayed ACKs
+    disable_nagle_algorithm = True
+    server_simulator = None
+
+    def setup(self):
+        super().setup()
+        self.server_simulator.connected()
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self.__handle(b'')
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        self.__handle(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+    def __send(self, status, body, content_type='text/xml'):
+        content = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def __authorized(self) -> bool:
+        credentials = self.server_simulator.credentials
+        if credentials is None:
+            return True
+        expected = base64.b64encode(':'.join(credentials).encode('utf-8')).decode('ascii')
+        return self.headers.get('Authorization') == f'Basic {expected}'
+
+    def __handle(self, data):
+        started = time.perf_counter()
+        simulator = self.server_simulator
+        url = urlparse(self.path)
+        servlet = url.path.rstrip('/').split('/')[-1]
+        parameters = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if simulator.latency:
+            time.sleep(simulator.latency)
+
+        failure = simulator.injected_failure(servlet)
+        if not self.__authorized():
+            self.__send(401, ERROR_PAGE.format('Unauthorized', 'Unauthorized'), 'text/html')
+        elif failure == 200:
+            self.__send(200, WEBRESULT.format('ERROR', f'Injected {servlet} error', ''))
+        elif failure is not None:
+            self.__send(failure, ERROR_PAGE.format(f'Error {failure}', 'Injected error'),
+                        'text/html')
+        else:
+            handler = getattr(self, f'_servlet_{servlet}', None)
+            if handler is None:
+                self.__send(404, ERROR_PAGE.format('Not Found', servlet), 'text/html')
+            else:
+                self.__send(*handler(parameters, data))
+        simulator.record(servlet, time.perf_counter() - started)
+
+    def __execution(self, kind, parameters):
+        execution = self.server_simulator.get(kind, parameters.get('id'))
+        if execution is None:
+            return None, (200, WEBRESULT.format(
+                'ERROR', f'The {kind} {parameters.get("name")} could not be found', ''))
+        return execution, None
+
+    @staticmethod
+    def __ok(message, execution_id=''):
+        return 200, WEBRESULT.format('OK', escape(message), execution_id)
+
+    def __register(self, kind, data):
+        name = NAME.search(data)
+        name = name.group(1).decode('utf-8', 'replace') if name else kind
+        execution = self.server_simulator.register(kind, name)
+        return self.__ok(f'{kind.capitalize()} {name} was added with id {execution.id}',
+                         execution.id)
+
+    def _servlet_registerPipeline(self, parameters, data):  # pylint: disable=invalid-name,unused-argument
+        return self.__register('pipeline', data)
+
+    def _servlet_registerWorkflow(self, parameters, data):  # pylint: disable=invalid-name,unused-argument
+        return self.__register('workflow', data)
+
+    def _servlet_addExport(self, parameters, data):  # pylint: disable=invalid-name,unused-argument
+        load = parameters.get('load', '').encode('utf-8')
+        return self.__register(parameters.get('type', 'pipeline'), b'<name>%s</name>' % load)
+
+    def _servlet_prepareExec(self, parameters, data):  # pylint: disable=invalid-name,unused-argument
+        execution, error = self.__execution('pipeline', parameters)
+        if error:
+            return error
+        execution.prepared = True
+        return self.__ok('')
+
+    def __start(self, kind, parameters):
+        execution, error = self.__execution(kind, parameters)
+        if error:
+            return error
+        if kind == 'pipeline' and not execution.prepared:
+            return 200, WEBRESULT.format('ERROR', 'The pipeline is not prepared', '')
+        execution.started = time.time()
+        return self.__ok(f'{kind.capitalize()} was started', execution.id)
+
+    def _servlet_startExec(self, parameters, data):  # pylint: disable=invalid-name,unused-argument
+        return self.__start('pipeline', parameters)
+
+    def _servlet_startPipeline(self, parameters, data):  # pylint: disable=invalid-name,unused-argument
+        execution, error = self.__execution('pipeline', parameters)
+        if error:
+            return error
+        execution.prepared = True
+        return self.__start('pipeline', parameters)
+
+    def _servlet_startWorkflow(self, parameters, data):  # pylint: disable=invalid-name,unused-argument
+        return self.__start('workflow', parameters)
+
+    def __stop(self, kind, parameters):
+        execution, error = self.__execution(kind, parameters)
+        if error:
+            return error
+        if execution.ended_at(time.time()) is None:
+            execution.stopped = time.time()
+        return self.__ok(f'{kind.capitalize()} was stopped', execution.id)
+
+    def _servlet_stopPipeline(self, parameters, data):  # pylint: disable=invalid-name,unused-argument
+        return self.__stop('pipeline', parameters)
+
+    def _servlet_stopWorkflow(self, parameters, data):  # pylint: disable=invalid-name,unused-argument
+        return self.__stop('workflow', parameters)
+
+    def _servlet_removePipeline(self, parameters, data):  # pylint: disable=invalid-name,unused-argument
+        execution, error = self.__execution('pipeline', parameters)
+        if error:
+            return error
+        self.server_simulator.remove(execution.id)
+        return self.__ok('The pipeline was removed', execution.id)
+
+    def __logging_string(self, execution, now):
+        progress = int(execution.progress(now) * LOG_STEPS) / LOG_STEPS
+        lines = int(self.server_simulator.log_lines * progress)
+        return f'&lt;![CDATA[{_logging_string(execution.name, lines)}]]&gt;'
+
+    def __status(self, kind, parameters):
+        execution, error = self.__execution(kind, parameters)
+        if error:
+            return error
+        now = time.time()
+        status_desc = execution.status_desc(now)
+        name_tag = 'pipeline_name' if kind == 'pipeline' else 'workflowname'
+        body = [f'<{kind}-status><{name_tag}>{escape(execution.name)}</{name_tag}>',
+                f'<id>{execution.id}</id><status_desc>{status_desc}</status_desc>',
+                '<error_desc/>' if not execution.fails else '<error_desc>Simulated error</error_desc>',
+                f'<execution_start_date>{_date(execution.started)}</execution_start_date>',
+                f'<execution_end_date>{_date(execution.ended_at(now))}</execution_end_date>']
+        if kind == 'pipeline':
+            body.append('<transform_status_list>')
+            rows = int(execution.progress(now) * 1000)
+            for transform in range(execution.transforms):
+                body.append(
+                    f'<transform_status><transformName>Transform {transform}</transformName>'
+                    f'<copy>0</copy><linesRead>{rows}</linesRead>'
+                    f'<linesWritten>{rows}</linesWritten><linesInput>0</linesInput>'
+                    '<linesOutput>0</linesOutput><linesUpdated>0</linesUpdated>'
+                    f'<linesRejected>0</linesRejected><errors>{int(execution.fails)}</errors>'
+                    '<input_buffer_size>0</input_buffer_size>'
+                    '<output_buffer_size>0</output_buffer_size>'
+                    f'<statusDescription>{status_desc}</statusDescription>'
+                    f'<seconds>{execution.progress(now) * execution.duration:.1f}</seconds>'
+                    '<speed>0</speed><priority>-</priority><stopped>N</stopped>'
+                    '<paused>N</paused></transform_status>')
+            body.append('</transform_status_list>')
+        body.append(f'<logging_string>{self.__logging_string(execution, now)}</logging_string>')
+        body.append(f'</{kind}-status>')
+        return 200, ''.join(body)
+
+    def _servlet_pipelineStatus(self, parameters, data):  # pylint: disable=invalid-name,unused-argument
+        return self.__status('pipeline', parameters)
+
+    def _servlet_workflowStatus(self, parameters, data):  # pylint: disable=invalid-name,unused-argument
+        return self.__status('workflow', parameters)
+
+    def _servlet_status(self, parameters, data):  # pylint: disable=invalid-name,unused-argument
+        now = time.time()
+        executions = list(self.server_simulator.executions.values())
+        body = ['<serverstatus><statusdesc>Online</statusdesc>',
+                '<memory_free>536870912</memory_free><memory_total>1073741824</memory_total>',
+                '<cpu_cores>4</cpu_cores><cpu_process_time>0</cpu_process_time>',
+                '<uptime>0</uptime><thread_count>32</thread_count><load_avg>0.5</load_avg>']
+        for kind in ('pipeline', 'workflow'):
+            body.append(f'<{kind}_status_list>')
+            for execution in executions:
+                if execution.kind == kind:
+                    body.append(f'<{kind}-status><id>{execution.id}</id>'
+                                f'<status_desc>{execution.status_desc(now)}</status_desc>'
+                                f'</{kind}-status>')
+            body.append(f'</{kind}_status_list>')
+        body.append('</serverstatus>')
+        return 200, ''.join(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulated Hop Server')
+    parser.add_argument('host', nargs='?', default='127.0.0.1')
+    parser.add_argument('port', nargs='?', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0, help='per call, in milliseconds')
+    parser.add_argument('--duration', type=float, default=0, help='per execution, in seconds')
+    parser.add_argument('--log-lines', type=int, default=10)
+    parser.add_argument('--transforms', type=int, default=2)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--failure-rate', type=float, default=0)
+    args = parser.parse_args()
+
+    simulator = HopServerSimulator(
+        latency=args.latency / 1000, duration=args.duration, log_lines=args.log_lines,
+        transforms=args.transforms, error_rate=args.error_rate,
+        failure_rate=args.failure_rate, host=args.host, port=args.port)
+    try:
+        simulator.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest import TestCase, mock
+
+from airflow import AirflowException
+
+from airflow_hop.archives import build_archive
+from airflow_hop.cache import CACHE_DIR_ENV
+
+MAIN = """<?xml version="1.0" encoding="UTF-8"?>
+<workflow>
+  <name>main</name>
+  <actions>
+    <action><name>Load A</name><type>PIPELINE</type>
+      <filename>${PROJECT_HOME}/pipelines/a.hpl</filename></action>
+    <action><name>Child</name><type>WORKFLOW</type>
+      <filename>${PROJECT_HOME}/workflows/child.hwf</filename></action>
+    <action><name>Remote</name><type>PIPELINE</type>
+      <filename>${REMOTE_HOME}/pipelines/remote.hpl</filename></action>
+  </actions>
+</workflow>
+"""
+
+CHILD = """<?xml version="1.0" encoding="UTF-8"?>
+<workflow>
+  <name>child</name>
+  <actions>
+    <action><name>Load B</name><type>PIPELINE</type>
+      <filename>${PROJECT_HOME}/pipelines/b.hpl</filename></action>
+  </actions>
+</workflow>
+"""
+
+PIPELINE = """<?xml version="1.0" encoding="UTF-8"?>
+<pipeline><info><name>{}</name></info></pipeline>
+"""
+
+
+class TestArchives(TestCase):
+    """Perform tests regarding export archives"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        patcher = mock.patch.dict(os.environ, {CACHE_DIR_ENV: f'{self.tmp_dir}/cache'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.project = f'{self.tmp_dir}/project'
+        self.__write('workflows/main.hwf', MAIN)
+        self.__write('workflows/child.hwf', CHILD)
+        self.__write('pipelines/a.hpl', PIPELINE.format('a'))
+        self.__write('pipelines/b.hpl', PIPELINE.format('b'))
+
+    def __write(self, name, content):
+        os.makedirs(os.path.dirname(f'{self.project}/{name}'), exist_ok=True)
+        with open(f'{self.project}/{name}', mode='w', encoding='utf-8') as file:
+            file.write(content)
+
+    def test_build_archive(self):
+        archive = build_archive(self.project, 'workflows/main.hwf')
+        with zipfile.ZipFile(archive) as zip_file:
+            self.assertEqual(['pipelines/a.hpl', 'pipelines/b.hpl',
+                              'workflows/child.hwf', 'workflows/main.hwf'],
+                             zip_file.namelist())
+            main = zip_file.read('workflows/main.hwf').decode('utf-8')
+            child = zip_file.read('workflows/child.hwf').decode('utf-8')
+            pipeline = zip_file.read('pipelines/a.hpl').decode('utf-8')
+        self.assertIn('${Internal.Entry.Current.Folder}/../pipelines/a.hpl', main)
+        self.assertIn('${Internal.Entry.Current.Folder}/child.hwf', main)
+        self.assertIn('${REMOTE_HOME}/pipelines/remote.hpl', main)
+        self.assertIn('${Internal.Entry.Current.Folder}/../pipelines/b.hpl', child)
+        self.assertEqual(PIPELINE.format('a'), pipeline)
+
+    def test_content_hash(self):
+        archive = build_archive(self.project, 'workflows/main.hwf')
+        with mock.patch('airflow_hop.archives.zipfile.ZipFile') as zip_file:
+            self.assertEqual(archive, build_archive(self.project, 'workflows/main.hwf'))
+        zip_file.assert_not_called()
+
+        self.__write('pipelines/b.hpl', PIPELINE.format('b2'))
+        changed = build_archive(self.project, 'workflows/main.hwf')
+        self.assertNotEqual(archive, changed)
+
+        self.__write('pipelines/b.hpl', PIPELINE.format('b'))
+        self.assertEqual(archive, build_archive(self.project, 'workflows/main.hwf'))
+
+    def test_signature_index(self):
+        archive = build_archive(self.project, 'workflows/main.hwf')
+        with mock.patch('airflow_hop.archives.ElementTree.parse') as parse:
+            self.assertEqual(archive, build_archive(self.project, 'workflows/main.hwf'))
+        parse.assert_not_called()
+
+        os.remove(archive)
+        self.assertEqual(archive, build_archive(self.project, 'workflows/main.hwf'))
+        self.assertTrue(os.path.exists(archive))
+
+    def test_current_folder(self):
+        self.__write('workflows/w.hwf', MAIN.replace(
+            '${PROJECT_HOME}/pipelines/a.hpl',
+            '${Internal.Entry.Current.Folder}/../pipelines/a.hpl').replace(
+            '${REMOTE_HOME}/pipelines/remote.hpl',
+            '${Internal.Entry.Current.Folder}/../../outside.hpl'))
+        archive = build_archive(self.project, 'workflows/w.hwf')
+        with zipfile.ZipFile(archive) as zip_file:
+            self.assertEqual(['pipelines/a.hpl', 'pipelines/b.hpl',
+                              'workflows/child.hwf', 'workflows/w.hwf'],
+                             zip_file.namelist())
+            main = zip_file.read('workflows/w.hwf').decode('utf-8')
+        self.assertIn('${Internal.Entry.Current.Folder}/../pipelines/a.hpl', main)
+        self.assertIn('${Internal.Entry.Current.Folder}/../../outside.hpl', main)
+
+    def test_missing_child(self):
+        os.remove(f'{self.project}/pipelines/b.hpl')
+        with self.assertRaises(AirflowException):
+            build_archive(self.project, 'workflows/main.hwf')
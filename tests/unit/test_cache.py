@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase, mock
+
+from airflow_hop.cache import CACHE_DIR_ENV, cached_file_content, files_signature
+
+
+class TestCache(TestCase):
+    """Perform tests regarding worker local caches"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        patcher = mock.patch.dict(os.environ, {CACHE_DIR_ENV: f'{self.tmp_dir}/cache'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cached_file_content(self):
+        path = f'{self.tmp_dir}/source.txt'
+        with open(path, mode='w', encoding='utf-8') as file:
+            file.write('first')
+        build = mock.Mock(side_effect=lambda path: open(path, mode='br').read().upper())
+
+        self.assertEqual(b'FIRST', cached_file_content('test', path, build))
+        self.assertEqual(b'FIRST', cached_file_content('test', path, build))
+        self.assertEqual(1, build.call_count)
+        self.assertEqual(1, len(os.listdir(f'{self.tmp_dir}/cache/test')))
+
+        with open(path, mode='w', encoding='utf-8') as file:
+            file.write('second')
+        self.assertEqual(b'SECOND', cached_file_content('test', path, build))
+        self.assertEqual(2, build.call_count)
+
+    def test_files_signature(self):
+        os.makedirs(f'{self.tmp_dir}/inputs/2022')
+        for name in ('inputs/a.csv', 'inputs/2022/b.csv'):
+            with open(f'{self.tmp_dir}/{name}', mode='w', encoding='utf-8') as file:
+                file.write(name)
+
+        signature = files_signature([f'{self.tmp_dir}/inputs', f'{self.tmp_dir}/missing.csv'])
+        self.assertEqual([f'{self.tmp_dir}/inputs/2022/b.csv', f'{self.tmp_dir}/inputs/a.csv',
+                          f'{self.tmp_dir}/missing.csv'], [item[0] for item in signature])
+        self.assertIsNone(signature[2][1])
+        self.assertEqual(signature, files_signature([f'{self.tmp_dir}/inputs/**/*.csv',
+                                                     f'{self.tmp_dir}/missing.csv']))
+
+        hashed = files_signature([f'{self.tmp_dir}/inputs/a.csv'], hash_content=True)
+        os.utime(f'{self.tmp_dir}/inputs/a.csv', ns=(0, 0))
+        self.assertEqual(hashed, files_signature([f'{self.tmp_dir}/inputs/a.csv'],
+                                                 hash_content=True))
+        self.assertNotEqual(signature[1], files_signature([f'{self.tmp_dir}/inputs/a.csv'])[0])
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from airflow import AirflowException
+
+from airflow_hop.cache import CACHE_DIR_ENV
+from airflow_hop.daemons import HopServerPool
+from airflow_hop.hooks import HopHook
+from airflow_hop.operators import HopPipelineOperator
+from tests.operator_test_base import OperatorTestBase
+
+HOP_CONFIG_PATH = f'{OperatorTestBase.TESTS_PATH}/assets/config'
+PROJECT_PATH = f'{HOP_CONFIG_PATH}/projects/default'
+HOP_SERVER_PATH = f'{OperatorTestBase.TESTS_PATH}/assets/bin/hop-server'
+
+
+def _alive(pid):
+    try:
+        if os.waitpid(pid, os.WNOHANG)[0] == pid:
+            return False
+    except ChildProcessError:
+        pass
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+class TestHopServerPool(OperatorTestBase):
+    """Perform tests regarding the pool of local Hop Servers"""
+
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.tmp_dir = tmp_dir
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        patcher = mock.patch.dict(os.environ, {CACHE_DIR_ENV: tmp_dir})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = HopServerPool(HOP_SERVER_PATH, size=2, idle_timeout=600)
+        self.addCleanup(self.pool.shutdown)
+
+    def __wait_stopped(self, pid):
+        deadline = time.monotonic() + 10
+        while _alive(pid) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return not _alive(pid)
+
+    def test_lease(self):
+        with self.pool.lease() as first:
+            conn = HopHook.HopServerConnection(
+                first['host'], first['port'], 'cluster', 'cluster', PROJECT_PATH, 'default',
+                'Dev', f'{HOP_CONFIG_PATH}/projects', HOP_CONFIG_PATH, 'Basic')
+            self.assertIn('serverstatus', conn.server_status())
+            with self.pool.lease() as second:
+                self.assertNotEqual(first['port'], second['port'])
+                with self.pool.lease() as third:
+                    self.assertIn(third['port'], (first['port'], second['port']))
+        with self.pool.lease() as again:
+            self.assertIn(again['port'], (first['port'], second['port']))
+
+        daemons = self.pool.daemons()
+        self.assertEqual(2, len(daemons))
+        self.assertEqual([[], []], [daemon['leases'] for daemon in daemons])
+
+    def test_shared_between_pools(self):
+        with self.pool.lease() as first:
+            pass
+        with HopServerPool(HOP_SERVER_PATH, size=2).lease() as second:
+            self.assertEqual(first['port'], second['port'])
+
+    def test_config_not_shared(self):
+        other = HopServerPool(HOP_SERVER_PATH, size=2, hop_config_path=HOP_CONFIG_PATH)
+        self.addCleanup(other.shutdown)
+        self.assertNotEqual(self.pool.state_file, other.state_file)
+        with self.pool.lease() as first, other.lease() as second:
+            self.assertNotEqual(first['port'], second['port'])
+
+    def test_reaper(self):
+        pool = HopServerPool(HOP_SERVER_PATH, size=2, idle_timeout=0.5)
+        self.addCleanup(pool.shutdown)
+        with pool.lease() as leased:
+            self.assertTrue(os.path.exists(pool.reaper_file))
+        # the idle server is stopped without any further use of the pool
+        self.assertTrue(self.__wait_stopped(leased['pid']))
+        deadline = time.monotonic() + 10
+        while os.path.exists(pool.reaper_file) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertFalse(os.path.exists(pool.reaper_file))
+
+    def test_startup_outside_lock(self):
+        slow_server = f'{self.tmp_dir}/slow-hop-server'
+        with open(slow_server, mode='w', encoding='utf-8') as file:
+            file.write(f'#!/bin/sh\nsleep 2\nexec {HOP_SERVER_PATH} "$@"\n')
+        os.chmod(slow_server, 0o755)
+        pool = HopServerPool(slow_server, size=2)
+        self.addCleanup(pool.shutdown)
+        acquired = []
+        thread = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+        thread.start()
+        time.sleep(0.5)
+
+        started = time.monotonic()
+        daemons = pool.daemons()
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual([False], [daemon['ready'] for daemon in daemons])
+        thread.join()
+        self.assertEqual([True], [daemon['ready'] for daemon in pool.daemons()])
+        pool.release(acquired[0])
+
+    def test_reap(self):
+        with self.pool.lease() as leased:
+            self.assertEqual(1, self.pool.reap(idle_timeout=0))
+        self.assertEqual(0, self.pool.reap(idle_timeout=0))
+        self.assertTrue(self.__wait_stopped(leased['pid']))
+
+    def test_dead_server(self):
+        with self.pool.lease() as first:
+            pass
+        self.pool.shutdown()
+        self.assertTrue(self.__wait_stopped(first['pid']))
+        with self.pool.lease() as second:
+            self.assertNotEqual(first['pid'], second['pid'])
+
+    def test_dead_lease(self):
+        with self.pool.lease():
+            pass
+        daemons = self.pool.daemons()
+        daemons[0]['leases'] = ['999999999:lost']
+        with mock.patch('airflow_hop.daemons.json.load', return_value=daemons):
+            self.assertEqual([[]], [daemon['leases'] for daemon in self.pool.daemons()])
+
+    def test_startup_failure(self):
+        pool = HopServerPool('false', startup_timeout=5)
+        self.addCleanup(pool.shutdown)
+        with self.assertRaises(AirflowException):
+            pool.acquire()
+        with self.assertRaises(AirflowException):
+            HopServerPool(f'{OperatorTestBase.TESTS_PATH}/missing-hop-server').acquire()
+
+    def test_pool_engine(self):
+        task_instance = mock.Mock()
+        with mock.patch('airflow_hop.operators.get_pool', return_value=self.pool):
+            HopPipelineOperator(
+                task_id='test_pool_engine',
+                pipeline='pipelines/get_param.hpl',
+                pipe_config='remote hop server',
+                project_path=PROJECT_PATH,
+                project_name='default',
+                environment_path=f'{HOP_CONFIG_PATH}/projects',
+                environment_name='Dev',
+                hop_config_path=HOP_CONFIG_PATH,
+                log_level='Basic',
+                engine='pool').execute(context = {'ti': task_instance})
+        self.assertEqual(1, len(self.pool.daemons()))
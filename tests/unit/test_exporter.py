@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from unittest import mock
+
+from airflow_hop.hooks import HopHook
+from airflow_hop import exporter
+from tests.operator_test_base import OperatorTestBase
+from tests.unit.test_operators import MockedResponse
+
+SERVER_STATUS = """
+<serverstatus>
+    <statusdesc>Online</statusdesc>
+    <memory_free>104857600</memory_free>
+    <memory_total>524288000</memory_total>
+    <cpu_cores>8</cpu_cores>
+    <cpu_process_time>2500000000</cpu_process_time>
+    <uptime>60000</uptime>
+    <thread_count>42</thread_count>
+    <load_avg>1.5</load_avg>
+    <os_name>Linux</os_name>
+    <pipeline_status_list>
+        <pipeline-status><pipeline_name>a</pipeline_name><id>1</id><status_desc>Running</status_desc></pipeline-status>
+        <pipeline-status><pipeline_name>b</pipeline_name><id>2</id><status_desc>Running</status_desc></pipeline-status>
+        <pipeline-status><pipeline_name>c</pipeline_name><id>3</id><status_desc>Finished</status_desc></pipeline-status>
+    </pipeline_status_list>
+    <workflow_status_list>
+        <workflow-status><workflowname>w</workflowname><id>4</id><status_desc>Running</status_desc></workflow-status>
+    </workflow_status_list>
+</serverstatus>
+"""
+
+
+@unittest.skipIf(exporter.GaugeMetricFamily is None, 'prometheus-client is not installed')
+class TestHopStatusCollector(OperatorTestBase):
+    """Perform tests regarding the Prometheus exporter"""
+
+    def setUp(self):
+        HopHook.clear_cache()
+
+    @mock.patch('requests.Session.get', return_value=MockedResponse(SERVER_STATUS, 200))
+    def test_collect(self, mock_get):
+        from prometheus_client import CollectorRegistry, generate_latest  # pylint: disable=import-outside-toplevel
+
+        collector = exporter.HopStatusCollector(['hop_default'])
+        collector.sample()
+        registry = CollectorRegistry()
+        registry.register(collector)
+        output = generate_latest(registry).decode('utf-8')
+
+        self.assertEqual('http://localhost:8081/hop/status/', mock_get.call_args[1]['url'])
+        labels = 'conn_id="hop_default",server="localhost:8081"'
+        self.assertIn(f'hop_server_up{{{labels}}} 1.0', output)
+        self.assertIn(f'hop_server_memory_free_bytes{{{labels}}} 1.048576e+08', output)
+        self.assertIn(f'hop_server_cpu_process_time_seconds{{{labels}}} 2.5', output)
+        self.assertIn(f'hop_server_uptime_seconds{{{labels}}} 60.0', output)
+        self.assertIn(f'hop_server_threads{{{labels}}} 42.0', output)
+        self.assertIn(f'hop_server_pipelines{{{labels},status="Running"}} 2.0', output)
+        self.assertIn(f'hop_server_pipelines{{{labels},status="Finished"}} 1.0', output)
+        self.assertIn(f'hop_server_workflows{{{labels},status="Running"}} 1.0', output)
+
+    @mock.patch('requests.Session.get', return_value=MockedResponse(
+        '<html><title>Unauthorized</title></html>', 401))
+    def test_collect_unavailable(self, mock_get): # pylint: disable=unused-argument
+        from prometheus_client import CollectorRegistry, generate_latest  # pylint: disable=import-outside-toplevel
+
+        collector = exporter.HopStatusCollector(['hop_default'])
+        collector.sample()
+        registry = CollectorRegistry()
+        registry.register(collector)
+        output = generate_latest(registry).decode('utf-8')
+        self.assertIn('hop_server_up{conn_id="hop_default",server=""} 0.0', output)
+        self.assertNotIn('hop_server_threads{', output)
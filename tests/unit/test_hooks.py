@@ -13,9 +13,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from unittest import TestCase
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase, mock
 
+from airflow import AirflowException
+
+from airflow_hop.cache import CACHE_DIR_ENV
 from airflow_hop.hooks import HopHook
+from tests.operator_test_base import OperatorTestBase
 
 DEFAULT_HOST = 'localhost'
 DEFAULT_PORT = 8081
@@ -27,6 +36,10 @@ DEFAULT_PROJECT_NAME = 'default'
 
 DEFAULT_ENVIRONMENT = 'Dev'
 
+HOP_CONFIG_PATH = f'{OperatorTestBase.TESTS_PATH}/assets/config'
+PROJECT_PATH = f'{HOP_CONFIG_PATH}/projects/default'
+ENVIRONMENT_PATH = f'{HOP_CONFIG_PATH}/projects'
+
 
 class TestHopHook(TestCase):
     """
@@ -49,3 +62,153 @@ class TestHopHook(TestCase):
         self.assertEqual(client.password, DEFAULT_PASSWORD)
         self.assertEqual(client.log_level, DEFAULT_LOG_LEVEL)
         self.assertEqual(client.environment, DEFAULT_ENVIRONMENT)
+
+
+class TestHopHookCache(OperatorTestBase):
+    """
+    Perform tests regarding hooks shared within a worker process
+    """
+
+    def setUp(self):
+        HopHook.clear_cache()
+
+    def __get_hook(self, project_path=PROJECT_PATH, hop_config_path=HOP_CONFIG_PATH, ttl=None):
+        return HopHook.get_hook(project_path, DEFAULT_PROJECT_NAME, ENVIRONMENT_PATH,
+                                DEFAULT_ENVIRONMENT, hop_config_path, 'hop_default',
+                                DEFAULT_LOG_LEVEL, ttl)
+
+    def test_get_hook(self):
+        hook = self.__get_hook()
+        self.assertIs(hook, self.__get_hook())
+        self.assertIs(hook.get_conn(), self.__get_hook().get_conn())
+        self.assertIsNot(hook, self.__get_hook(project_path=f'{PROJECT_PATH}/'))
+
+        HopHook.clear_cache()
+        self.assertIsNot(hook, self.__get_hook())
+
+    def test_connection_cache(self):
+        with mock.patch.object(HopHook, 'get_connection',
+                               wraps=HopHook.get_connection) as get_connection:
+            hook = self.__get_hook()
+            self.__get_hook(project_path=f'{PROJECT_PATH}/')
+            self.assertEqual(1, get_connection.call_count)
+            self.assertIs(hook.connection, HopHook.get_cached_connection('hop_default'))
+
+            HopHook.invalidate('other_conn')
+            self.assertIs(hook, self.__get_hook())
+            HopHook.invalidate('hop_default')
+            self.assertIsNot(hook, self.__get_hook())
+            self.assertEqual(2, get_connection.call_count)
+
+    def test_cache_ttl(self):
+        with mock.patch('airflow_hop.hooks.time.monotonic', return_value=1000):
+            hook = self.__get_hook(ttl=60)
+        with mock.patch('airflow_hop.hooks.time.monotonic', return_value=1059):
+            self.assertIs(hook, self.__get_hook())
+        with mock.patch('airflow_hop.hooks.time.monotonic', return_value=1061):
+            self.assertIsNot(hook, self.__get_hook())
+
+    def test_xml_builder_template(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        config_path = shutil.copytree(HOP_CONFIG_PATH, f'{tmp_dir}/config')
+        conn = self.__get_hook(f'{config_path}/projects/default', config_path).get_conn()
+
+        first = conn.get_xml_builder({'DATE': '2022-01-01'})
+        second = conn.get_xml_builder({'DATE': '2022-01-02'})
+        self.assertEqual(first.global_variables, second.global_variables)
+        self.assertIs(first.global_variables, second.global_variables)
+        self.assertEqual({'DATE': '2022-01-02'}, second.task_params)
+        self.assertFalse(second.is_stale())
+
+        stat = os.stat(f'{config_path}/hop-config.json')
+        os.utime(f'{config_path}/hop-config.json', ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        self.assertTrue(second.is_stale())
+        self.assertIsNot(first.global_variables, conn.get_xml_builder().global_variables)
+
+
+class TestAdmission(TestCase):
+    """
+    Perform tests regarding per server admission control
+    """
+
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        patcher = mock.patch.dict(os.environ, {CACHE_DIR_ENV: tmp_dir})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def __get_client(self, **kwargs):
+        return HopHook.HopServerConnection(
+            DEFAULT_HOST, DEFAULT_PORT, DEFAULT_USERNAME, DEFAULT_PASSWORD, PROJECT_PATH,
+            DEFAULT_PROJECT_NAME, DEFAULT_ENVIRONMENT, ENVIRONMENT_PATH, HOP_CONFIG_PATH,
+            DEFAULT_LOG_LEVEL, **kwargs)
+
+    @mock.patch('airflow_hop.hooks.time.sleep')
+    def test_unlimited(self, mock_sleep):
+        client = self.__get_client()
+        with mock.patch.object(client, 'server_status') as server_status:
+            with client.admission():
+                pass
+        server_status.assert_not_called()
+        mock_sleep.assert_not_called()
+
+    def test_worker_slots(self):
+        client = self.__get_client(max_concurrent_executions=2, admission_timeout=30)
+        context = multiprocessing.get_context('fork')
+        intervals = context.Queue()
+
+        def task():
+            with client.admission():
+                started = time.monotonic()
+                time.sleep(0.3)
+                intervals.put((started, time.monotonic()))
+
+        with mock.patch.object(HopHook.HopServerConnection, 'active_executions',
+                               return_value=0), \
+                mock.patch('airflow_hop.hooks.random.uniform', return_value=0.1):
+            processes = [context.Process(target=task) for _ in range(5)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join(30)
+        self.assertEqual([0] * 5, [process.exitcode for process in processes])
+
+        events = sorted(event for started, ended in (intervals.get() for _ in processes)
+                        for event in ((started, 1), (ended, -1)))
+        running = [sum(change for _, change in events[:index + 1])
+                   for index in range(len(events))]
+        self.assertEqual(2, max(running))
+
+    @mock.patch('airflow_hop.hooks.time.sleep')
+    def test_active_executions(self, mock_sleep): # pylint: disable=unused-argument
+        client = self.__get_client(max_concurrent_executions=2)
+        with mock.patch.object(client, 'server_status', return_value={'serverstatus': {
+                'pipeline_status_list': {'pipeline-status': [
+                    {'status_desc': 'Running'}, {'status_desc': 'Finished'},
+                    {'status_desc': 'Waiting'}]},
+                'workflow_status_list': {'workflow-status': {'status_desc': 'Paused'}}}}):
+            self.assertEqual(2, client.active_executions())
+
+    @mock.patch('airflow_hop.hooks.time.sleep')
+    def test_backoff(self, mock_sleep):
+        client = self.__get_client(max_concurrent_executions=2)
+        with mock.patch.object(client, 'active_executions', side_effect=[3, 2, 1]):
+            with client.admission():
+                pass
+        self.assertEqual(2, mock_sleep.call_count)
+        self.assertLessEqual(mock_sleep.call_args_list[1][0][0], 3)
+        self.assertGreaterEqual(mock_sleep.call_args_list[1][0][0], 1)
+
+    @mock.patch('airflow_hop.hooks.time.sleep')
+    def test_local_semaphore(self, mock_sleep): # pylint: disable=unused-argument
+        client = self.__get_client(max_concurrent_executions=1, admission_timeout=0)
+        with mock.patch.object(client, 'active_executions', return_value=0):
+            with client.admission():
+                with self.assertRaises(AirflowException) as context:
+                    with client.admission():
+                        pass
+                self.assertIn('did not admit', str(context.exception))
+            with client.admission():
+                pass
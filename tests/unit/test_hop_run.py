@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import threading
+import time
+from unittest import mock
+
+from airflow import AirflowException
+
+from airflow_hop.hop_run import HOP_RUN_ENV, JAVA_OPTIONS_ENV, HopRun
+from tests import TestBase
+
+HOP_CONFIG_PATH = f'{TestBase.TESTS_PATH}/assets/config'
+PROJECT_PATH = f'{HOP_CONFIG_PATH}/projects/default'
+HOP_RUN_PATH = f'{TestBase.TESTS_PATH}/assets/bin/hop-run'
+
+
+class TestHopRun(TestBase):
+    """Perform tests regarding local hop-run executions"""
+
+    def __get_hop_run(self, task_params=None, **kwargs):
+        kwargs.setdefault('hop_run_path', HOP_RUN_PATH)
+        return HopRun(PROJECT_PATH, 'default', f'{HOP_CONFIG_PATH}/projects', 'Dev',
+                      HOP_CONFIG_PATH, task_params, **kwargs)
+
+    def test_command(self):
+        command = self.__get_hop_run({'DATE': '2022-01-01'}).get_command(
+            'pipelines/get_param.hpl', 'remote hop server')
+        self.assertEqual([HOP_RUN_PATH, f'--file={PROJECT_PATH}/pipelines/get_param.hpl',
+                          '--runconfig=remote hop server', '--level=Basic',
+                          '--parameters=DATE=2022-01-01'], command)
+        self.assertIn('--runconfig=local',
+                      self.__get_hop_run().get_command('workflows/workflowTest.hwf'))
+        with self.assertRaises(AirflowException):
+            self.__get_hop_run({'DATES': '2022-01-01,2022-01-02'}).get_command(
+                'pipelines/get_param.hpl')
+
+        with mock.patch.dict('os.environ', {HOP_RUN_ENV: '/opt/hop/hop-run.sh'}):
+            self.assertEqual('/opt/hop/hop-run.sh',
+                             self.__get_hop_run(hop_run_path=None).hop_run_path)
+
+    def test_arguments(self):
+        path = self.__get_hop_run({'DATE': '2022-01-01'}).write_arguments('remote hop server')
+        self.addCleanup(os.remove, path)
+        self.assertEqual(0o600, os.stat(path).st_mode & 0o777)
+        with open(path, encoding='utf-8') as file:
+            lines = file.read().splitlines()
+        self.assertIn('"-DDATE=2022-01-01"', lines)
+        self.assertIn(f'"-DPROJECT_HOME={PROJECT_PATH}"', lines)
+
+        with mock.patch.dict('os.environ', {JAVA_OPTIONS_ENV: '-Xmx2g'}):
+            environment = self.__get_hop_run().get_environment(path)
+        self.assertEqual(f'-Xmx2g @{path}', environment[JAVA_OPTIONS_ENV])
+
+    def test_run(self):
+        log = mock.Mock()
+        returncode = self.__get_hop_run({'DATE': '2022-01-01'}).run(
+            'workflows/workflowTest.hwf', log)
+        lines = [call[0][0] for call in log.info.call_args_list]
+        self.assertEqual(0, returncode)
+        self.assertEqual(f'--file={PROJECT_PATH}/workflows/workflowTest.hwf', lines[0])
+        self.assertIn(f'HOP_CONFIG_FOLDER={HOP_CONFIG_PATH}', lines)
+        self.assertIn('stderr line', lines)
+        self.assertFalse([line for line in lines if line.startswith('-D')])
+        options = [line for line in lines if line.startswith(f'{JAVA_OPTIONS_ENV}=')][0]
+        arguments_file = options.rsplit('@', 1)[1]
+        self.assertFalse(os.path.exists(arguments_file))
+
+    def test_exit_code(self):
+        hop_run = self.__get_hop_run({'EXIT': '3'})
+        self.assertEqual(3, hop_run.run('workflows/workflowTest.hwf', mock.Mock()))
+
+    def test_not_found(self):
+        hop_run = self.__get_hop_run(hop_run_path=f'{TestBase.TESTS_PATH}/missing-hop-run')
+        with self.assertRaises(AirflowException):
+            hop_run.run('workflows/workflowTest.hwf', mock.Mock())
+
+    def test_kill(self):
+        hop_run = self.__get_hop_run({'SLEEP': '30'})
+        started = time.perf_counter()
+        threading.Timer(0.5, hop_run.kill).start()
+        self.assertNotEqual(0, hop_run.run('workflows/workflowTest.hwf', mock.Mock()))
+        self.assertLess(time.perf_counter() - started, 10)
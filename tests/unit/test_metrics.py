@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase, mock
+
+import xmltodict
+
+from airflow_hop.metrics import emit_action_metrics, parse_action_results
+from airflow_hop.metrics import emit_transform_metrics, parse_server_status
+from airflow_hop.metrics import parse_transform_status
+from airflow_hop.metrics import PhaseTimer, TransformSampler, execution_seconds, timed
+
+PIPELINE_STATUS = """
+<pipeline-status>
+    <pipeline_name>get_param</pipeline_name>
+    <status_desc>Running</status_desc>
+    <transform_status_list>
+        <transform_status><transformName>Get variables</transformName><copy>0</copy><linesRead>0</linesRead><linesWritten>1,500</linesWritten><linesInput>0</linesInput><linesOutput>0</linesOutput><linesUpdated>0</linesUpdated><linesRejected>0</linesRejected><errors>0</errors><input_buffer_size>0</input_buffer_size><output_buffer_size>10000</output_buffer_size><statusDescription>Finished</statusDescription><seconds>0.5</seconds><speed> 3,000</speed><priority>-</priority><stopped>N</stopped><paused>N</paused></transform_status>
+        <transform_status><transformName>Write to log</transformName><copy>1</copy><linesRead>1</linesRead><linesWritten>1</linesWritten><linesInput>0</linesInput><linesOutput>0</linesOutput><linesUpdated>0</linesUpdated><linesRejected>0</linesRejected><errors>2</errors><input_buffer_size>9999</input_buffer_size><output_buffer_size>0</output_buffer_size><statusDescription>Running</statusDescription><seconds>1.5</seconds><speed>-</speed><priority>-</priority><stopped>N</stopped><paused>N</paused></transform_status>
+    </transform_status_list>
+</pipeline-status>
+"""
+
+WORKFLOW_LOG = """2022/07/27 12:34:37 - sales - Start of workflow execution
+2022/07/27 12:34:37 - sales - Starting action [Load]
+2022/07/27 12:34:38 - Read.0 - Finished processing (I=100, O=0, R=0, W=100, U=0, E=0)
+2022/07/27 12:34:39 - Write.0 - Finished processing (I=0, O=100, R=100, W=100, U=0, E=1)
+2022/07/27 12:34:42 - sales - Finished action [Load] (result=[true])
+2022/07/27 12:34:42 - sales - Starting action [Check A]
+2022/07/27 12:34:42 - sales - Starting action [Check B]
+2022/07/27 12:34:43 - Count.0 - Finished processing (I=0, O=0, R=5, W=5, U=0, E=0)
+2022/07/27 12:34:44 - sales - Finished action [Check B] (result=[false])
+2022/07/27 12:34:45 - sales - Finished action [Check A] (result=[true])
+2022/07/27 12:34:45 - sales - Starting action [Load]
+2022/07/27 12:34:45 - sales - Workflow execution finished
+"""
+
+
+class TestTransformMetrics(TestCase):
+    """Perform tests regarding transform metrics"""
+
+    def test_parse_transform_status(self):
+        status = xmltodict.parse(PIPELINE_STATUS)['pipeline-status']
+        transforms = parse_transform_status(status)
+
+        self.assertEqual(2, len(transforms))
+        self.assertEqual({
+            'name': 'Get variables', 'copy': 0, 'status': 'Finished',
+            'lines_read': 0, 'lines_written': 1500, 'lines_input': 0, 'lines_output': 0,
+            'lines_updated': 0, 'lines_rejected': 0, 'errors': 0,
+            'input_buffer_size': 0, 'output_buffer_size': 10000,
+            'seconds': 0.5, 'rows_per_second': 3000.0}, transforms[0])
+        self.assertEqual(1, transforms[1]['copy'])
+        self.assertEqual(2, transforms[1]['errors'])
+        self.assertIsNone(transforms[1]['rows_per_second'])
+
+    def test_parse_single_and_empty(self):
+        single = PIPELINE_STATUS.replace(
+            PIPELINE_STATUS[PIPELINE_STATUS.index('        <transform_status><transformName>Write'):
+                            PIPELINE_STATUS.index('    </transform_status_list>')], '')
+        status = xmltodict.parse(single)['pipeline-status']
+        self.assertEqual(['Get variables'],
+                         [transform['name'] for transform in parse_transform_status(status)])
+
+        status = xmltodict.parse('<pipeline-status><transform_status_list/></pipeline-status>')
+        self.assertEqual([], parse_transform_status(status['pipeline-status']))
+
+    @mock.patch('airflow_hop.metrics.Stats')
+    def test_emit_transform_metrics(self, mock_stats):
+        status = xmltodict.parse(PIPELINE_STATUS)['pipeline-status']
+        emit_transform_metrics('get param', parse_transform_status(status))
+
+        mock_stats.incr.assert_any_call(
+            'hop.pipeline.get_param.transform.Get_variables.lines_written', count=1500,
+            tags={'pipeline': 'get param', 'transform': 'Get variables', 'copy': '0'})
+        mock_stats.gauge.assert_any_call(
+            'hop.pipeline.get_param.transform.Write_to_log_1.input_buffer_size', 9999,
+            tags={'pipeline': 'get param', 'transform': 'Write to log', 'copy': '1'})
+        gauges = [call[0][0] for call in mock_stats.gauge.call_args_list]
+        self.assertNotIn('hop.pipeline.get_param.transform.Write_to_log_1.rows_per_second', gauges)
+        self.assertEqual(14, mock_stats.incr.call_count)
+
+
+def transform_status(name, lines_read, lines_written, input_buffer, output_buffer,
+                     status='Running', seconds=0):
+    return (f'<transform_status><transformName>{name}</transformName><copy>0</copy>'
+            f'<linesRead>{lines_read}</linesRead><linesWritten>{lines_written}</linesWritten>'
+            f'<linesInput>0</linesInput><linesOutput>0</linesOutput><errors>0</errors>'
+            f'<input_buffer_size>{input_buffer}</input_buffer_size>'
+            f'<output_buffer_size>{output_buffer}</output_buffer_size>'
+            f'<statusDescription>{status}</statusDescription><seconds>{seconds}</seconds>'
+            f'<speed>-</speed></transform_status>')
+
+
+def pipeline_status(*transforms):
+    status = ('<pipeline-status><transform_status_list>'
+              f'{"".join(transforms)}</transform_status_list></pipeline-status>')
+    return xmltodict.parse(status)['pipeline-status']
+
+
+class TestActionMetrics(TestCase):
+    """Perform tests regarding workflow action metrics"""
+
+    def test_parse_action_results(self):
+        actions = parse_action_results(WORKFLOW_LOG)
+        self.assertEqual(['Load', 'Check A', 'Check B', 'Load'],
+                         [action['name'] for action in actions])
+        self.assertEqual([True, True, False, None], [action['result'] for action in actions])
+        self.assertEqual([5.0, 3.0, 2.0, None], [action['seconds'] for action in actions])
+        self.assertEqual(100, actions[0]['lines_input'])
+        self.assertEqual(200, actions[0]['lines_written'])
+        self.assertEqual(1, actions[0]['errors'])
+        self.assertEqual(0, actions[1]['lines_read'])
+        self.assertEqual([], parse_action_results(''))
+
+    @mock.patch('airflow_hop.metrics.Stats')
+    def test_emit_action_metrics(self, mock_stats):
+        emit_action_metrics('sales', parse_action_results(WORKFLOW_LOG))
+        mock_stats.gauge.assert_any_call(
+            'hop.workflow.sales.action.Check_A.seconds', 3.0,
+            tags={'workflow': 'sales', 'action': 'Check A', 'result': 'True'})
+        mock_stats.incr.assert_any_call(
+            'hop.workflow.sales.action.Load.lines_written', count=200,
+            tags={'workflow': 'sales', 'action': 'Load', 'result': 'True'})
+        self.assertEqual(3, mock_stats.gauge.call_count)
+
+
+class TestTransformSampler(TestCase):
+    """Perform tests regarding the bottleneck report"""
+
+    def test_report(self):
+        sampler = TransformSampler()
+        for second in range(1, 5):
+            sampler.sample(pipeline_status(
+                transform_status('Input', 0, 20000 * second, 0, 9500),
+                transform_status('Lookup', 1000 * second, 1000 * second, 9000, 0),
+                transform_status('Output', 1000 * second, 1000 * second, 0, 0)), second)
+        sampler.sample(pipeline_status(
+            transform_status('Input', 0, 80000, 0, 0, 'Finished', 4),
+            transform_status('Lookup', 80000, 80000, 0, 0, 'Finished', 40),
+            transform_status('Output', 80000, 80000, 0, 0, 'Finished', 40)), 40)
+
+        report = sampler.report()
+        self.assertEqual(5, report['samples'])
+        self.assertEqual(40, report['elapsed_seconds'])
+        self.assertEqual(2000.0, report['effective_rows_per_second'])
+        self.assertEqual('Lookup', report['bottleneck'])
+        self.assertEqual('Lookup', report['slowest_transform'])
+        self.assertEqual(['Output'], report['input_starved'])
+        self.assertEqual(['Input'], report['output_blocked'])
+        self.assertEqual(20000.0, report['transforms']['Input']['rows_per_second'])
+        self.assertEqual([1000, 2000, 3000, 4000, 80000],
+                         [sample['rows'] for sample in sampler.series['Lookup']])
+
+    def test_empty_report(self):
+        report = TransformSampler().report()
+        self.assertEqual(0, report['samples'])
+        self.assertIsNone(report['bottleneck'])
+        self.assertIsNone(report['effective_rows_per_second'])
+
+
+class TestPhaseTimer(TestCase):
+    """Perform tests regarding lifecycle phase timings"""
+
+    @mock.patch('airflow_hop.metrics.Stats')
+    def test_timed(self, mock_stats):
+        with timed('outside'):
+            pass
+        with PhaseTimer() as timer:
+            for _ in range(2):
+                with timed('register'):
+                    pass
+            with self.assertRaises(ValueError):
+                with timed('status'):
+                    raise ValueError()
+            timer.add_runtime(0)
+        self.assertIsNone(PhaseTimer.current())
+
+        summary = timer.summary()
+        self.assertEqual({'register', 'status'}, set(summary['phases']))
+        self.assertEqual(2, summary['phases']['register']['count'])
+        self.assertEqual(0, summary['runtime_seconds'])
+        self.assertEqual(summary['total_seconds'], summary['overhead_seconds'])
+        self.assertEqual(4, mock_stats.timing.call_count)
+        self.assertEqual('hop.phase.register', mock_stats.timing.call_args_list[1][0][0])
+
+    def test_execution_seconds(self):
+        self.assertEqual(1.936, execution_seconds({
+            'execution_start_date': '2022/07/22 12:36:15.576',
+            'execution_end_date': '2022/07/22 12:36:17.512'}))
+        self.assertIsNone(execution_seconds({'execution_start_date': None}))
+
+
+class TestServerStatus(TestCase):
+    """Perform tests regarding Hop Server status parsing"""
+
+    def test_parse_server_status(self):
+        result = xmltodict.parse("""
+        <serverstatus>
+            <statusdesc>Online</statusdesc>
+            <memory_free>100</memory_free>
+            <cpu_cores>4</cpu_cores>
+            <load_avg>0.25</load_avg>
+            <pipeline_status_list>
+                <pipeline-status><id>1</id><status_desc>Running</status_desc></pipeline-status>
+            </pipeline_status_list>
+            <workflow_status_list/>
+        </serverstatus>""")
+        server = parse_server_status(result)
+        self.assertEqual('Online', server['status'])
+        self.assertEqual(100, server['memory_free'])
+        self.assertIsNone(server['memory_total'])
+        self.assertEqual(0.25, server['load_avg'])
+        self.assertEqual({'Running': 1}, server['pipelines'])
+        self.assertEqual({}, server['workflows'])
@@ -13,16 +13,36 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import base64
+import gzip
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
 from unittest import mock
 
+import requests
+from airflow import DAG, AirflowException
+from airflow.utils import timezone
+
+from airflow_hop.cache import CACHE_DIR_ENV
 from airflow_hop.operators import HopPipelineOperator, HopWorkflowOperator
+from airflow_hop.operators import HopPipelinePartitionOperator, HopPrepareOperator
+from airflow_hop.operators import HopWebServiceOperator
 from tests.operator_test_base import OperatorTestBase
 
 DEFAULT_LOG_LEVEL = 'Basic'
 DEFAULT_PROJECT_NAME = 'default'
+DEFAULT_HOP_CONFIG_PATH = f'{OperatorTestBase.TESTS_PATH}/assets/config'
+DEFAULT_PROJECT_PATH = f'{DEFAULT_HOP_CONFIG_PATH}/projects/default'
+DEFAULT_ENVIRONMENT_PATH = f'{DEFAULT_HOP_CONFIG_PATH}/projects'
+DEFAULT_ENVIRONMENT_NAME = 'Dev'
 DEFAULT_PIPELINE = 'pipelines/get_param.hpl'
 DEFAULT_WORKFLOW = 'workflows/workflowTest.hwf'
 DEFAULT_PIPELINE_CONFIG = 'remote hop server'
+HOP_RUN_PATH = f'{OperatorTestBase.TESTS_PATH}/assets/bin/hop-run'
 
 class MockedResponse:
     """Create mocked responses"""
@@ -30,10 +50,31 @@ class MockedResponse:
     def __init__(self, text, status_code):
         self.text = text
         self.status_code = status_code
+        self.headers = {}
+
+    @property
+    def content(self):
+        return self.text.encode('utf-8')
+
+
+class MockedStreamedResponse(MockedResponse):
+    """Create mocked streamed responses"""
+
+    def __init__(self, text, status_code, content_type='application/json'):
+        super().__init__(text, status_code)
+        self.headers = {'Content-Type': content_type}
+
+    def iter_content(self, chunk_size):
+        content = self.text.encode('utf-8')
+        for start in range(0, len(content), chunk_size):
+            yield content[start:start + chunk_size]
+
+    def close(self):
+        pass
 
 
 def mock_requests(**kwargs) -> MockedResponse:
-    if 'registerWorkflow' in kwargs['url']:
+    if 'registerWorkflow' in kwargs['url'] or 'addExport' in kwargs['url']:
         return MockedResponse("""
         <webresult>
             <result>OK</result>
@@ -96,7 +137,8 @@ def mock_requests(**kwargs) -> MockedResponse:
             <message/>
             <id/>
         </webresult>""", 200)
-    if 'startExec' in kwargs['url']:
+    if 'startExec' in kwargs['url'] or 'startPipeline' in kwargs['url'] \
+            or 'removePipeline' in kwargs['url']:
         return MockedResponse("""
         <webresult>
             <result>OK</result>
@@ -149,11 +191,30 @@ def mock_requests(**kwargs) -> MockedResponse:
         """, 200)
 
 
+def get_pipeline_operator(**kwargs) -> HopPipelineOperator:
+    kwargs.setdefault('task_id', 'test_pipeline_operator')
+    return HopPipelineOperator(
+        pipeline=DEFAULT_PIPELINE,
+        pipe_config=DEFAULT_PIPELINE_CONFIG,
+        project_path=DEFAULT_PROJECT_PATH,
+        project_name=DEFAULT_PROJECT_NAME,
+        environment_path=DEFAULT_ENVIRONMENT_PATH,
+        environment_name=DEFAULT_ENVIRONMENT_NAME,
+        hop_config_path=DEFAULT_HOP_CONFIG_PATH,
+        log_level=DEFAULT_LOG_LEVEL,
+        **kwargs)
+
+
+def get_task_instance():
+    return mock.Mock(dag_id='test_dag', task_id='test_pipeline_operator',
+                     run_id='manual__2022-01-01T00:00:00', map_index=-1)
+
+
 class TestPipelineOperator(OperatorTestBase):
     """Perform tests regarding pipeline operators"""
 
-    @mock.patch('requests.get', side_effect = mock_requests)
-    @mock.patch('requests.post', side_effect = mock_requests)
+    @mock.patch('requests.Session.get', side_effect = mock_requests)
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
     def test_execute(self, mock_post, mock_get): # pylint: disable=unused-argument
         op = HopPipelineOperator(
             task_id='test_pipeline_operator',
@@ -168,11 +229,306 @@ class TestPipelineOperator(OperatorTestBase):
         self.assertEqual(DEFAULT_PIPELINE,mock_get.call_args_list[0][1]['params']['name'])
         self.assertEqual('Y',mock_get.call_args_list[0][1]['params']['xml'])
 
+    @mock.patch('airflow_hop.metrics.Stats')
+    @mock.patch('requests.Session.get', side_effect = mock_requests)
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_transform_metrics(self, mock_post, mock_get, mock_stats): # pylint: disable=unused-argument
+        task_instance = mock.Mock()
+        get_pipeline_operator(push_reports=True).execute(context = {'ti': task_instance})
+
+        pushed = {call[1]['key']: call[1]['value'] for call in task_instance.xcom_push.call_args_list}
+        transforms = pushed['transform_metrics']
+        self.assertEqual(['Get variables', 'Write to log'],
+                         [transform['name'] for transform in transforms])
+        mock_stats.gauge.assert_any_call(
+            'hop.pipeline.get_param.transform.Write_to_log.rows_per_second', 11.0,
+            tags={'pipeline': 'get_param', 'transform': 'Write to log', 'copy': '0'})
+        self.assertEqual(1, pushed['bottleneck_report']['samples'])
+
+    @mock.patch('requests.Session.get', side_effect = mock_requests)
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_phase_timings(self, mock_post, mock_get): # pylint: disable=unused-argument
+        task_instance = mock.Mock()
+        get_pipeline_operator(push_reports=True).execute(context = {'ti': task_instance})
+
+        pushed = {call[1]['key']: call[1]['value'] for call in task_instance.xcom_push.call_args_list}
+        summary = pushed['phase_timings']
+        self.assertTrue({'xml_build', 'register', 'prepare', 'start', 'status', 'log_decode'}
+                        <= set(summary['phases']))
+        self.assertEqual(1.936, summary['runtime_seconds'])
+
+        task_instance = mock.Mock()
+        get_pipeline_operator().execute(context = {'ti': task_instance})
+        pushed = [call[1]['key'] for call in task_instance.xcom_push.call_args_list]
+        self.assertEqual(['transform_metrics'], pushed)
+
+    @mock.patch('requests.Session.get', side_effect = mock_requests)
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_bottleneck_report(self, mock_post, mock_get): # pylint: disable=unused-argument
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        get_pipeline_operator(bottleneck_report_path=f'{tmp_dir}/report/get_param.json')\
+            .execute(context = {})
+
+        with open(f'{tmp_dir}/report/get_param.json', encoding='utf-8') as file:
+            report = json.load(file)
+        self.assertEqual(['Get variables', 'Write to log'], list(report['series']))
+        self.assertEqual(10.0, report['report']['transforms']['Write to log']['rows_per_second'])
+
+    @mock.patch('airflow_hop.state.Variable')
+    @mock.patch('requests.Session.get', side_effect = mock_requests)
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_save_execution(self, mock_post, mock_get, mock_variable): # pylint: disable=unused-argument
+        mock_variable.get.return_value = None
+        get_pipeline_operator(reattach=True).execute(context = {'ti': get_task_instance()})
+
+        mock_variable.set.assert_called_once()
+        saved = dict(mock_variable.set.call_args[0][1])
+        self.assertIsNotNone(saved.pop('saved_at'))
+        self.assertEqual({'server': 'localhost:8081', 'name': DEFAULT_PIPELINE,
+                          'id': 'cae6cc35-f07a-4321-b211-bd884db655ac', 'fingerprint': None},
+                         saved)
+        mock_variable.delete.assert_called_once_with(mock_variable.set.call_args[0][0])
+
+    @mock.patch('airflow_hop.state.Variable')
+    @mock.patch('requests.Session.get', side_effect = mock_requests)
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_no_reattach_saves_nothing(self, mock_post, mock_get, mock_variable): # pylint: disable=unused-argument
+        get_pipeline_operator(retries=3).execute(context = {'ti': get_task_instance()})
+
+        mock_variable.get.assert_not_called()
+        mock_variable.set.assert_not_called()
+        mock_variable.delete.assert_not_called()
+
+    @mock.patch('airflow_hop.state.Variable')
+    @mock.patch('requests.Session.get', side_effect = mock_requests)
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_reattach_execution(self, mock_post, mock_get, mock_variable):
+        mock_variable.get.return_value = {'server': 'localhost:8081', 'name': DEFAULT_PIPELINE,
+                                          'id': 'cae6cc35-f07a-4321-b211-bd884db655ac'}
+        with mock.patch('airflow_hop.hooks.HopHook.HopServerConnection.admission') \
+                as mock_admission:
+            get_pipeline_operator(reattach=True).execute(context = {'ti': get_task_instance()})
+
+        mock_admission.assert_not_called()
+        mock_post.assert_not_called()
+        urls = [call[1]['url'] for call in mock_get.call_args_list]
+        self.assertFalse([url for url in urls if 'prepareExec' in url or 'startExec' in url])
+        mock_variable.set.assert_not_called()
+        mock_variable.delete.assert_called_once()
+
+    @mock.patch('airflow_hop.state.Variable')
+    @mock.patch('requests.Session.get')
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_failed_execution_is_not_reattached(self, mock_post, mock_get, mock_variable):
+        def failed_once(**kwargs):
+            response = mock_requests(**kwargs)
+            if 'pipelineStatus' in kwargs['url'] and mock_get.call_count == 1:
+                response.text = response.text.replace(
+                    '<status_desc>Finished</status_desc>',
+                    '<status_desc>Stopped (with errors)</status_desc>')
+            return response
+        mock_get.side_effect = failed_once
+        mock_variable.get.return_value = {'server': 'localhost:8081', 'name': DEFAULT_PIPELINE,
+                                          'id': 'cae6cc35-f07a-4321-b211-bd884db655ac'}
+        get_pipeline_operator(reattach=True).execute(context = {'ti': get_task_instance()})
+
+        mock_post.assert_called_once()
+        mock_variable.set.assert_called_once()
+
+    @mock.patch('airflow_hop.state.Variable')
+    @mock.patch('requests.Session.get')
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_dedupe(self, mock_post, mock_get, mock_variable):
+        variables = {}
+        mock_variable.get.side_effect = lambda key, **kwargs: variables.get(key)
+        mock_variable.set.side_effect = lambda key, value, **kwargs: variables.update({key: value})
+        mock_variable.delete.side_effect = variables.pop
+        statuses = []
+
+        def running_status(**kwargs):
+            response = mock_requests(**kwargs)
+            if 'pipelineStatus' in kwargs['url'] and statuses:
+                response.text = response.text.replace(
+                    '<status_desc>Finished</status_desc>',
+                    f'<status_desc>{statuses.pop(0)}</status_desc>')
+            return response
+        mock_get.side_effect = running_status
+
+        # the first submission is still running when the others are submitted
+        operator = get_pipeline_operator(dedupe=True)
+        with mock.patch.object(operator, '_forget_execution'):
+            operator.execute(context = {})
+        self.assertEqual(1, mock_post.call_count)
+        self.assertEqual(1, len(variables))
+
+        # attaching takes no admission slot, the identical execution holds it
+        statuses.append('Running')
+        with mock.patch('airflow_hop.hooks.HopHook.HopServerConnection.admission') \
+                as mock_admission:
+            get_pipeline_operator(dedupe=True).execute(context = {})
+        mock_admission.assert_not_called()
+        self.assertEqual(1, mock_post.call_count)
+        self.assertEqual({}, variables)
+
+        get_pipeline_operator(dedupe=True, params={'DATE': '2022-01-01'}).execute(context = {})
+        self.assertEqual(2, mock_post.call_count)
+
+    @mock.patch('airflow_hop.state.Variable')
+    @mock.patch('requests.Session.get', side_effect = mock_requests)
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_cache_results(self, mock_post, mock_get, mock_variable): # pylint: disable=unused-argument
+        variables = {}
+        mock_variable.get.side_effect = lambda key, **kwargs: variables.get(key)
+        mock_variable.set.side_effect = lambda key, value, **kwargs: variables.update({key: value})
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        with open(f'{tmp_dir}/input.csv', mode='w', encoding='utf-8') as file:
+            file.write('id\n1\n')
+
+        def run():
+            get_pipeline_operator(cache_results=True, input_paths=[f'{tmp_dir}/*.csv'],
+                                  hash_inputs=True).execute(context = {})
+
+        run()
+        run()
+        self.assertEqual(1, mock_post.call_count)
+        self.assertEqual(1, len(variables))
+
+        with open(f'{tmp_dir}/input.csv', mode='a', encoding='utf-8') as file:
+            file.write('2\n')
+        run()
+        self.assertEqual(2, mock_post.call_count)
+
+    @mock.patch('airflow_hop.state.Variable')
+    @mock.patch('requests.Session.get', side_effect = mock_requests)
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_cache_max_age(self, mock_post, mock_get, mock_variable): # pylint: disable=unused-argument
+        variables = {}
+        mock_variable.get.side_effect = lambda key, **kwargs: variables.get(key)
+        mock_variable.set.side_effect = lambda key, value, **kwargs: variables.update({key: value})
+
+        get_pipeline_operator(cache_results=True, cache_max_age=0).execute(context = {})
+        get_pipeline_operator(cache_results=True, cache_max_age=0).execute(context = {})
+        self.assertEqual(2, mock_post.call_count)
+
+        get_pipeline_operator(cache_results=True, cache_max_age=None).execute(context = {})
+        get_pipeline_operator(cache_results=True, cache_max_age=None).execute(context = {})
+        self.assertEqual(3, mock_post.call_count)
+        self.assertIsNone(list(variables.values())[0]['expires_at'])
+
+    @mock.patch('airflow_hop.state.Variable')
+    @mock.patch('requests.Session.get', side_effect = mock_requests)
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_cache_hit_skips_server(self, mock_post, mock_get, mock_variable):
+        variables = {}
+        mock_variable.get.side_effect = lambda key, **kwargs: variables.get(key)
+        mock_variable.set.side_effect = lambda key, value, **kwargs: variables.update({key: value})
+        get_pipeline_operator(cache_results=True).execute(context = {})
+        mock_get.reset_mock()
+        mock_post.reset_mock()
+
+        with mock.patch('airflow_hop.hooks.HopHook.HopServerConnection.admission') \
+                as mock_admission:
+            get_pipeline_operator(cache_results=True).execute(context = {})
+        mock_admission.assert_not_called()
+        mock_get.assert_not_called()
+        mock_post.assert_not_called()
+
+    @mock.patch('requests.Session.get')
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_sniff_transform(self, mock_post, mock_get): # pylint: disable=unused-argument
+        batches = [[('1', 'Ada'), ('2', 'Grace')], [('3', 'Edsger')]]
+
+        statuses = ['Running']
+
+        def sniff(**kwargs):
+            if 'sniffTransform' not in kwargs['url']:
+                response = mock_requests(**kwargs)
+                if 'pipelineStatus' in kwargs['url'] and statuses:
+                    response.text = response.text.replace(
+                        '<status_desc>Finished</status_desc>',
+                        f'<status_desc>{statuses.pop(0)}</status_desc>')
+                return response
+            rows = ''.join(f'<row-data><value-data>{key}</value-data>'
+                           f'<value-data>{name}</value-data></row-data>'
+                           for key, name in (batches.pop(0) if batches else []))
+            return MockedResponse(f"""
+            <transform-sniff><row-meta>
+            <value-meta><type>Integer</type><name>id</name></value-meta>
+            <value-meta><type>String</type><name>name</name></value-meta>
+            </row-meta>{rows}</transform-sniff>""", 200)
+        mock_get.side_effect = sniff
+
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        operator = get_pipeline_operator(sniff_transform='Write to log',
+                                         sniff_path=f'{tmp_dir}/rows.jsonl')
+        task_instance = mock.Mock()
+
+        def wait():
+            deadline = time.monotonic() + 5
+            while batches and time.monotonic() < deadline:
+                time.sleep(0.01)
+        with mock.patch.object(operator, '_wait', side_effect=wait):
+            operator.execute(context = {'ti': task_instance})
+
+        pushed = {call[1]['key']: call[1]['value'] for call in task_instance.xcom_push.call_args_list}
+        self.assertEqual('Write to log', pushed['sniff_summary']['transform'])
+        with open(f'{tmp_dir}/rows.jsonl', encoding='utf-8') as file:
+            rows = [json.loads(line) for line in file]
+        self.assertEqual(3, pushed['sniff_summary']['rows'])
+        self.assertEqual({'id': '1', 'name': 'Ada'}, rows[0])
+        self.assertEqual({'id': '3', 'name': 'Edsger'}, rows[2])
+        params = next(call[1]['params'] for call in mock_get.call_args_list
+                      if 'sniffTransform' in call[1]['url'])
+        self.assertEqual(('Write to log', 'output', 1000),
+                         (params['transform'], params['type'], params['lines']))
+
+        with self.assertRaises(AirflowException):
+            get_pipeline_operator(sniff_transform='Write to log')
+
+    @mock.patch('requests.Session.get', side_effect = mock_requests)
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_fast_start(self, mock_post, mock_get): # pylint: disable=unused-argument
+        task_instance = mock.Mock()
+        get_pipeline_operator(fast_start=True, push_reports=True).execute(
+            context = {'ti': task_instance})
+
+        urls = [call[1]['url'] for call in mock_get.call_args_list]
+        self.assertTrue(urls[0].endswith('/hop/startPipeline/'))
+        self.assertFalse([url for url in urls if 'prepareExec' in url or 'startExec' in url])
+        pushed = {call[1]['key']: call[1]['value'] for call in task_instance.xcom_push.call_args_list}
+        self.assertNotIn('prepare', pushed['phase_timings']['phases'])
+
+    @mock.patch('requests.Session.get')
+    @mock.patch('requests.Session.post')
+    def test_local_engine(self, mock_post, mock_get):
+        task_instance = mock.Mock()
+        get_pipeline_operator(engine='local', hop_run_path=HOP_RUN_PATH, push_reports=True,
+                              params={'DATE': '2022-01-01'}).execute(
+                                  context = {'ti': task_instance})
+        mock_post.assert_not_called()
+        mock_get.assert_not_called()
+        pushed = {call[1]['key']: call[1]['value'] for call in task_instance.xcom_push.call_args_list}
+        self.assertIsNotNone(pushed['phase_timings']['runtime_seconds'])
+
+        with self.assertRaises(AirflowException):
+            get_pipeline_operator(engine='local', hop_run_path=HOP_RUN_PATH,
+                                  params={'EXIT': '1'}).execute(context = {})
+        with self.assertRaises(AirflowException):
+            get_pipeline_operator(engine='docker')
+        for option in ({'dedupe': True}, {'cache_results': True},
+                       {'sniff_transform': 'Output', 'sniff_path': '/tmp/sniff'}):
+            with self.assertRaises(AirflowException):
+                get_pipeline_operator(engine='local', **option)
+
+
 class TestWorkflowOperator(OperatorTestBase):
     """Perform tests regarding workflow operators"""
 
-    @mock.patch('requests.get', side_effect = mock_requests)
-    @mock.patch('requests.post', side_effect = mock_requests)
+    @mock.patch('requests.Session.get', side_effect = mock_requests)
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
     def test_execute(self, mock_post, mock_get): # pylint: disable=unused-argument
         op = HopWorkflowOperator(
             task_id='test_workflow_operator',
@@ -186,3 +542,281 @@ class TestWorkflowOperator(OperatorTestBase):
             mock_get.call_args_list[0][1]['params']['id'])
         self.assertEqual(DEFAULT_WORKFLOW,mock_get.call_args_list[0][1]['params']['name'])
         self.assertEqual('Y',mock_get.call_args_list[0][1]['params']['xml'])
+
+
+    @mock.patch('airflow_hop.metrics.Stats')
+    @mock.patch('requests.Session.get')
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_action_results(self, mock_post, mock_get, mock_stats): # pylint: disable=unused-argument
+        log_text = (
+            '2022/07/27 12:34:37 - workflowTest - Starting action [Wait for]\n'
+            '2022/07/27 12:34:39 - workflowTest - Finished action [Wait for] (result=[true])\n')
+        logging_string = base64.b64encode(gzip.compress(log_text.encode('utf-8'))).decode()
+
+        def action_status(**kwargs):
+            response = mock_requests(**kwargs)
+            if 'workflowStatus' in kwargs['url']:
+                response.text = re.sub(r'<logging_string>.*</logging_string>',
+                                       f'<logging_string>{logging_string}</logging_string>',
+                                       response.text, flags=re.DOTALL)
+            return response
+        mock_get.side_effect = action_status
+
+        task_instance = mock.Mock()
+        HopWorkflowOperator(
+            task_id='test_workflow_operator',
+            workflow=DEFAULT_WORKFLOW,
+            project_path=DEFAULT_PROJECT_PATH,
+            project_name=DEFAULT_PROJECT_NAME,
+            environment_path=DEFAULT_ENVIRONMENT_PATH,
+            environment_name=DEFAULT_ENVIRONMENT_NAME,
+            hop_config_path=DEFAULT_HOP_CONFIG_PATH,
+            log_level=DEFAULT_LOG_LEVEL).execute(context = {'ti': task_instance})
+
+        pushed = {call[1]['key']: call[1]['value'] for call in task_instance.xcom_push.call_args_list}
+        self.assertEqual(['Wait for'], [action['name'] for action in pushed['action_results']])
+        self.assertEqual(2.0, pushed['action_results'][0]['seconds'])
+        mock_stats.gauge.assert_called_once()
+
+    @mock.patch('requests.Session.get', side_effect = mock_requests)
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_use_archive(self, mock_post, mock_get): # pylint: disable=unused-argument
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        with mock.patch.dict(os.environ, {CACHE_DIR_ENV: tmp_dir}):
+            HopWorkflowOperator(
+                task_id='test_workflow_operator',
+                workflow=DEFAULT_WORKFLOW,
+                project_path=DEFAULT_PROJECT_PATH,
+                project_name=DEFAULT_PROJECT_NAME,
+                environment_path=DEFAULT_ENVIRONMENT_PATH,
+                environment_name=DEFAULT_ENVIRONMENT_NAME,
+                hop_config_path=DEFAULT_HOP_CONFIG_PATH,
+                log_level=DEFAULT_LOG_LEVEL,
+                use_archive=True).execute(context = {})
+
+        self.assertEqual(1, mock_post.call_count)
+        self.assertIn('addExport', mock_post.call_args[1]['url'])
+        self.assertEqual({'type': 'workflow', 'load': f'/{DEFAULT_WORKFLOW}'},
+                         mock_post.call_args[1]['params'])
+        self.assertTrue(mock_post.call_args[1]['data'].startswith(b'PK'))
+        self.assertIn('startWorkflow', mock_get.call_args_list[0][1]['url'])
+
+        with self.assertRaises(AirflowException):
+            HopWorkflowOperator(
+                task_id='test_workflow_operator',
+                workflow=DEFAULT_WORKFLOW,
+                project_path=DEFAULT_PROJECT_PATH,
+                project_name=DEFAULT_PROJECT_NAME,
+                environment_path=DEFAULT_ENVIRONMENT_PATH,
+                environment_name=DEFAULT_ENVIRONMENT_NAME,
+                hop_config_path=DEFAULT_HOP_CONFIG_PATH,
+                log_level=DEFAULT_LOG_LEVEL,
+                params={'DATE': '2022-01-01'},
+                use_archive=True)
+
+
+class TestPipelinePartitionOperator(OperatorTestBase):
+    """Perform tests regarding partitioned pipeline operators"""
+
+    def __get_operator(self, **kwargs):
+        return HopPipelinePartitionOperator(
+            task_id='test_pipeline_partition_operator',
+            pipeline=DEFAULT_PIPELINE,
+            pipe_config=DEFAULT_PIPELINE_CONFIG,
+            project_path=DEFAULT_PROJECT_PATH,
+            project_name=DEFAULT_PROJECT_NAME,
+            environment_path=DEFAULT_ENVIRONMENT_PATH,
+            environment_name=DEFAULT_ENVIRONMENT_NAME,
+            hop_config_path=DEFAULT_HOP_CONFIG_PATH,
+            log_level=DEFAULT_LOG_LEVEL,
+            partition_start='2022-01-01',
+            partition_end='2022-01-05',
+            num_partitions=4,
+            **kwargs)
+
+    @mock.patch('requests.Session.get', side_effect = mock_requests)
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_execute(self, mock_post, mock_get): # pylint: disable=unused-argument
+        op = self.__get_operator(concurrency=2, params={'DATE': '2022-01-01'})
+
+        results = op.execute(context = {})
+        self.assertEqual(4, mock_post.call_count)
+        self.assertEqual(['Finished'] * 4, [result['status'] for result in results])
+        payloads = sorted(call[1]['data'] for call in mock_post.call_args_list)
+        self.assertIn(b'<name>PARTITION_START</name><value>2022-01-01</value>', payloads[0])
+        self.assertIn(b'<name>PARTITION_END</name><value>2022-01-02</value>', payloads[0])
+        self.assertIn(b'<name>DATE</name><value>2022-01-01</value>', payloads[3])
+
+    @mock.patch('requests.Session.get')
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_partition_retries(self, mock_post, mock_get):
+        failures = []
+
+        def failing_status(**kwargs):
+            response = mock_requests(**kwargs)
+            if 'pipelineStatus' in kwargs['url'] and not failures:
+                failures.append(kwargs['params']['id'])
+                response.text = response.text.replace(
+                    '<status_desc>Finished</status_desc>',
+                    '<status_desc>Finished (with errors)</status_desc>')
+            return response
+        mock_get.side_effect = failing_status
+
+        results = self.__get_operator(concurrency=1, partition_retries=1).execute(context = {})
+        self.assertEqual(5, mock_post.call_count)
+        self.assertEqual([2, 1, 1, 1], [result['attempts'] for result in results])
+
+        failures.clear()
+        with self.assertRaises(AirflowException) as context:
+            self.__get_operator(concurrency=1).execute(context = {})
+        self.assertEqual('1 of 4 partitions failed', str(context.exception))
+
+    @mock.patch('requests.Session.get', side_effect = mock_requests)
+    @mock.patch('requests.Session.post')
+    def test_partition_connection_error(self, mock_post, mock_get): # pylint: disable=unused-argument
+        def unreachable_once(**kwargs):
+            if mock_post.call_count == 1:
+                raise requests.ConnectionError('Connection reset by peer')
+            return mock_requests(**kwargs)
+        mock_post.side_effect = unreachable_once
+
+        results = self.__get_operator(concurrency=1, partition_retries=1).execute(context = {})
+        self.assertEqual([2, 1, 1, 1], [result['attempts'] for result in results])
+        self.assertEqual(['Finished'] * 4, [result['status'] for result in results])
+
+    @mock.patch('requests.Session.get')
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_partition_lost_poll(self, mock_post, mock_get):
+        dropped = []
+
+        def dropped_once(**kwargs):
+            if 'pipelineStatus' in kwargs['url'] and not dropped:
+                dropped.append(kwargs['params']['id'])
+                raise requests.ConnectionError('Connection reset by peer')
+            return mock_requests(**kwargs)
+        mock_get.side_effect = dropped_once
+
+        results = self.__get_operator(concurrency=1, partition_retries=1).execute(context = {})
+        self.assertEqual([2, 1, 1, 1], [result['attempts'] for result in results])
+        self.assertEqual(4, mock_post.call_count)
+        starts = [call for call in mock_get.call_args_list if 'startExec' in call[1]['url']]
+        self.assertEqual(4, len(starts))
+
+
+class TestPrepareOperator(OperatorTestBase):
+    """Perform tests regarding pre-staged pipeline executions"""
+
+    @mock.patch('requests.Session.get')
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_prepare(self, mock_post, mock_get):
+        statuses = []
+
+        def prepared_status(**kwargs):
+            response = mock_requests(**kwargs)
+            if 'pipelineStatus' in kwargs['url'] and statuses:
+                response.text = response.text.replace(
+                    '<status_desc>Finished</status_desc>',
+                    f'<status_desc>{statuses.pop(0)}</status_desc>')
+            return response
+        mock_get.side_effect = prepared_status
+
+        with DAG('test_prepare', start_date=timezone.datetime(2022, 1, 1), schedule=None):
+            first = get_pipeline_operator(task_id='first')
+            second = get_pipeline_operator(task_id='second', params={'DATE': '2022-01-01'})
+            prepare = HopPrepareOperator(task_id='prepare', tasks=[first, second])
+        self.assertEqual({'first', 'second'}, prepare.downstream_task_ids)
+        self.assertEqual('prepare', second.prepared_by)
+
+        prepared = prepare.execute(context = {})
+        self.assertEqual(['first', 'second'], list(prepared))
+        self.assertEqual('localhost:8081', prepared['first']['server'])
+        self.assertEqual(1, len([call for call in mock_post.call_args_list
+                                 if b'<value>2022-01-01</value>' in call[1]['data']]))
+        urls = [call[1]['url'] for call in mock_get.call_args_list]
+        self.assertEqual(2, len([url for url in urls if 'prepareExec' in url]))
+        self.assertFalse([url for url in urls if 'startExec' in url])
+
+        task_instance = get_task_instance()
+        task_instance.xcom_pull.return_value = prepared
+        mock_get.reset_mock()
+        statuses.append('Waiting')
+        first.execute(context = {'ti': task_instance})
+        self.assertEqual(2, mock_post.call_count)
+        urls = [call[1]['url'] for call in mock_get.call_args_list]
+        self.assertFalse([url for url in urls if 'prepareExec' in url])
+        self.assertEqual(1, len([url for url in urls if 'startExec' in url]))
+
+        # an execution that is not waiting any more is not started again
+        first.execute(context = {'ti': task_instance})
+        self.assertEqual(3, mock_post.call_count)
+
+        # an execution prepared with other parameters is removed, not started
+        mock_get.reset_mock()
+        statuses.append('Waiting')
+        first.task_params = {'DATE': '2022-01-02'}
+        first.execute(context = {'ti': task_instance})
+        self.assertEqual(4, mock_post.call_count)
+        urls = [call[1]['url'] for call in mock_get.call_args_list]
+        self.assertEqual(1, len([url for url in urls if 'removePipeline' in url]))
+        self.assertEqual(1, len([url for url in urls if 'prepareExec' in url]))
+
+    @mock.patch('requests.Session.get', side_effect = mock_requests)
+    @mock.patch('requests.Session.post')
+    def test_prepare_fallback(self, mock_post, mock_get): # pylint: disable=unused-argument
+        def unreachable(**kwargs):
+            if b'<value>2022-01-01</value>' in kwargs['data']:
+                raise requests.ConnectionError('Connection refused')
+            return mock_requests(**kwargs)
+        mock_post.side_effect = unreachable
+
+        with DAG('test_prepare_fallback', start_date=timezone.datetime(2022, 1, 1),
+                 schedule=None):
+            tasks = [get_pipeline_operator(task_id='first'),
+                     get_pipeline_operator(task_id='second', params={'DATE': '2022-01-01'}),
+                     get_pipeline_operator(task_id='cached', cache_results=True),
+                     get_pipeline_operator(task_id='deduped', dedupe=True)]
+            prepare = HopPrepareOperator(task_id='prepare', tasks=tasks)
+
+        prepared = prepare.execute(context = {})
+        self.assertEqual(['first'], list(prepared))
+        self.assertEqual(2, mock_post.call_count)
+
+
+class TestWebServiceOperator(OperatorTestBase):
+    """Perform tests regarding web service calls"""
+
+    @mock.patch('requests.Session.get',
+                return_value=MockedStreamedResponse('{"customer": 42, "name": "Ada"}', 200))
+    def test_execute(self, mock_get):
+        result = HopWebServiceOperator(task_id='test_web_service', service='customer',
+                                       params={'ID': '42'}).execute(context = {})
+
+        self.assertEqual('{"customer": 42, "name": "Ada"}', result)
+        self.assertEqual({'service': 'customer', 'ID': '42'}, mock_get.call_args[1]['params'])
+        self.assertTrue(mock_get.call_args[1]['url'].endswith('/hop/webService/'))
+        self.assertTrue(mock_get.call_args[1]['stream'])
+
+    @mock.patch('requests.Session.post',
+                return_value=MockedStreamedResponse('id,name\n' * 10000, 200, 'text/csv'))
+    def test_output_path(self, mock_post):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        result = HopWebServiceOperator(task_id='test_web_service', service='export',
+                                       body='{"since": "2022-01-01"}', run_config='local',
+                                       output_path=f'{tmp_dir}/out/export.csv')\
+            .execute(context = {})
+
+        self.assertEqual(80000, result['bytes'])
+        self.assertEqual('text/csv', result['content_type'])
+        self.assertEqual(80000, os.path.getsize(f'{tmp_dir}/out/export.csv'))
+        self.assertEqual(b'{"since": "2022-01-01"}', mock_post.call_args[1]['data'])
+        self.assertEqual('local', mock_post.call_args[1]['params']['runConfig'])
+
+    @mock.patch('requests.Session.get', return_value=MockedStreamedResponse(
+        '<html><head><title>Error 500 Service not found</title></head></html>', 500))
+    def test_error(self, mock_get): # pylint: disable=unused-argument
+        with self.assertRaises(AirflowException) as context:
+            HopWebServiceOperator(task_id='test_web_service', service='missing')\
+                .execute(context = {})
+        self.assertEqual('HTTP: Error 500 Service not found', str(context.exception))
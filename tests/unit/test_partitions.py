@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from datetime import date
+from unittest import TestCase
+
+from airflow import AirflowException
+
+from airflow_hop.partitions import split_range
+
+
+class TestSplitRange(TestCase):
+    """Perform tests regarding range partitioning"""
+
+    def test_date_range(self):
+        partitions = split_range('2022-01-01', '2022-02-01', 31)
+        self.assertEqual(len(partitions), 31)
+        self.assertEqual(partitions[0], ('2022-01-01', '2022-01-02'))
+        self.assertEqual(partitions[-1], ('2022-01-31', '2022-02-01'))
+
+    def test_uneven_date_range(self):
+        partitions = split_range(date(2022, 1, 1), date(2022, 1, 11), 3)
+        self.assertEqual(partitions, [
+            ('2022-01-01', '2022-01-05'),
+            ('2022-01-05', '2022-01-08'),
+            ('2022-01-08', '2022-01-11')])
+
+    def test_key_range(self):
+        self.assertEqual(split_range(0, 10, 2), [('0', '5'), ('5', '10')])
+        self.assertEqual(split_range('0', '3', 5), [('0', '1'), ('1', '2'), ('2', '3')])
+
+    def test_errors(self):
+        with self.assertRaises(AirflowException):
+            split_range('2022-01-01', '2022-01-01', 2)
+        with self.assertRaises(AirflowException):
+            split_range('2022-01-01', 10, 2)
+        with self.assertRaises(AirflowException):
+            split_range(0, 10, 0)
+        with self.assertRaises(AirflowException):
+            split_range('yesterday', 'today', 1)
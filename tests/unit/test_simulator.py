@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+from unittest import mock
+
+from airflow import AirflowException
+
+from airflow_hop.hooks import HopHook
+from airflow_hop.operators import HopPipelineOperator, HopWorkflowOperator
+from tests.operator_test_base import OperatorTestBase
+from tests.simulator import HopServerSimulator
+
+HOP_CONFIG_PATH = f'{OperatorTestBase.TESTS_PATH}/assets/config'
+PROJECT_PATH = f'{HOP_CONFIG_PATH}/projects/default'
+PIPELINE = 'pipelines/get_param.hpl'
+WORKFLOW = 'workflows/workflowTest.hwf'
+PIPELINE_CONFIG = 'remote hop server'
+
+
+class TestSimulator(OperatorTestBase):
+    """Perform tests regarding the simulated Hop Server"""
+
+    def __start(self, **kwargs):
+        simulator = HopServerSimulator(**kwargs).start()
+        self.addCleanup(simulator.stop)
+        self.addCleanup(HopHook.clear_cache)
+        return simulator
+
+    @staticmethod
+    def __get_conn(simulator, password='cluster'):
+        return HopHook.HopServerConnection(
+            simulator.host, simulator.port, 'cluster', password, PROJECT_PATH, 'default', 'Dev',
+            f'{HOP_CONFIG_PATH}/projects', HOP_CONFIG_PATH, 'Basic')
+
+    def __get_pipeline_operator(self, conn):
+        operator = HopPipelineOperator(
+            task_id='simulated_pipeline',
+            pipeline=PIPELINE,
+            pipe_config=PIPELINE_CONFIG,
+            project_path=PROJECT_PATH,
+            project_name='default',
+            environment_path=f'{HOP_CONFIG_PATH}/projects',
+            environment_name='Dev',
+            hop_config_path=HOP_CONFIG_PATH,
+            log_level='Basic',
+            poll_interval=0.05)
+        operator._get_hop_client = mock.Mock(return_value=conn)  # pylint: disable=protected-access
+        return operator
+
+    def test_pipeline_lifecycle(self):
+        simulator = self.__start(duration=0.3, transforms=3, log_lines=20)
+        conn = self.__get_conn(simulator)
+
+        pipe_id = conn.register_pipeline(PIPELINE, PIPELINE_CONFIG)['webresult']['id']
+        status = conn.pipeline_status(PIPELINE, pipe_id)['pipeline-status']
+        self.assertEqual('get_param', status['pipeline_name'])
+        self.assertEqual('Waiting', status['status_desc'])
+        conn.prepare_pipeline_exec(PIPELINE, pipe_id)
+        status = conn.pipeline_status(PIPELINE, pipe_id)['pipeline-status']
+        self.assertEqual('Waiting', status['status_desc'])
+        self.assertEqual(0, conn.active_executions())
+        conn.start_pipeline_execution(PIPELINE, pipe_id)
+        status = conn.pipeline_status(PIPELINE, pipe_id)['pipeline-status']
+        self.assertEqual('Running', status['status_desc'])
+        self.assertEqual(1, conn.active_executions())
+
+        time.sleep(0.35)
+        status = conn.pipeline_status(PIPELINE, pipe_id)['pipeline-status']
+        self.assertEqual('Finished', status['status_desc'])
+        self.assertEqual(3, len(status['transform_status_list']['transform_status']))
+        self.assertEqual(0, conn.active_executions())
+        self.assertEqual(1, simulator.counts()['startExec'])
+
+    def test_stop(self):
+        simulator = self.__start(duration=60)
+        conn = self.__get_conn(simulator)
+        work_id = conn.register_workflow(WORKFLOW)['webresult']['id']
+        conn.start_workflow(WORKFLOW, work_id)
+        conn.stop_workflow(WORKFLOW, work_id)
+        status = conn.workflow_status(WORKFLOW, work_id)['workflow-status']
+        self.assertEqual('Stopped', status['status_desc'])
+
+        with self.assertRaises(AirflowException):
+            conn.workflow_status(WORKFLOW, 'unknown')
+
+    def test_error_injection(self):
+        simulator = self.__start()
+        conn = self.__get_conn(simulator)
+        simulator.fail_next('registerPipeline')
+        with self.assertRaisesRegex(AirflowException, 'HTTP: Error 500'):
+            conn.register_pipeline(PIPELINE, PIPELINE_CONFIG)
+        simulator.fail_next('registerPipeline', status=200)
+        with self.assertRaisesRegex(AirflowException, 'ERROR: Injected'):
+            conn.register_pipeline(PIPELINE, PIPELINE_CONFIG)
+        conn.register_pipeline(PIPELINE, PIPELINE_CONFIG)
+
+        with self.assertRaisesRegex(AirflowException, 'Unauthorized'):
+            self.__get_conn(simulator, password='wrong').server_status()
+
+    def test_operators(self):
+        simulator = self.__start(duration=0.1, log_lines=5)
+        conn = self.__get_conn(simulator)
+        task_instance = mock.Mock()
+        self.__get_pipeline_operator(conn).execute(context = {'ti': task_instance})
+
+        operator = HopWorkflowOperator(
+            task_id='simulated_workflow',
+            workflow=WORKFLOW,
+            project_path=PROJECT_PATH,
+            project_name='default',
+            environment_path=f'{HOP_CONFIG_PATH}/projects',
+            environment_name='Dev',
+            hop_config_path=HOP_CONFIG_PATH,
+            log_level='Basic',
+            poll_interval=0.05)
+        operator._get_hop_client = mock.Mock(return_value=conn)  # pylint: disable=protected-access
+        operator.execute(context = {})
+        self.assertEqual(1, simulator.counts()['startWorkflow'])
+
+    def test_execution_failure(self):
+        simulator = self.__start(failure_rate=1)
+        with self.assertRaises(AirflowException):
+            self.__get_pipeline_operator(self.__get_conn(simulator)).execute(context = {})
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import TestCase
+
+import xmltodict
+
+from airflow_hop import sinks
+from airflow_hop.sinks import RowSink, parse_sniff_result
+
+SNIFF_RESULT = """
+<transform-sniff>
+<row-meta>
+<value-meta><type>Integer</type><storagetype>normal</storagetype><name>id</name></value-meta>
+<value-meta><type>String</type><storagetype>normal</storagetype><name>name</name></value-meta>
+</row-meta>
+<nr_rows>2</nr_rows>
+<row-data><value-data>1</value-data><value-data>Ada</value-data></row-data>
+<row-data><value-data>2</value-data><value-data/></row-data>
+</transform-sniff>
+"""
+
+
+class TestSinks(TestCase):
+    """Perform tests regarding row sinks"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def test_parse_sniff_result(self):
+        fields, rows = parse_sniff_result(xmltodict.parse(SNIFF_RESULT))
+        self.assertEqual(['id', 'name'], fields)
+        self.assertEqual([['1', 'Ada'], ['2', None]], rows)
+
+        single = SNIFF_RESULT.replace('<row-data><value-data>2</value-data><value-data/></row-data>',
+                                      '')
+        self.assertEqual([['1', 'Ada']], parse_sniff_result(xmltodict.parse(single))[1])
+        self.assertEqual(([], []), parse_sniff_result(
+            xmltodict.parse('<transform-sniff></transform-sniff>')))
+
+    def test_jsonl(self):
+        sink = RowSink(f'{self.tmp_dir}/out/rows.jsonl')
+        sink.write(['id', 'name'], [['1', 'Ada']])
+        sink.write(['id', 'name'], [])
+        sink.write(['id', 'name'], [['2', None]])
+        summary = sink.close()
+
+        with open(f'{self.tmp_dir}/out/rows.jsonl', encoding='utf-8') as file:
+            rows = [json.loads(line) for line in file]
+        self.assertEqual([{'id': '1', 'name': 'Ada'}, {'id': '2', 'name': None}], rows)
+        self.assertEqual({'rows': 2, 'batches': 2, 'format': 'jsonl', 'fields': ['id', 'name']},
+                         {key: summary[key] for key in ('rows', 'batches', 'format', 'fields')})
+
+    def test_csv(self):
+        sink = RowSink(f'{self.tmp_dir}/rows.txt', 'csv')
+        sink.write(['id', 'name'], [['1', 'Ada'], ['2', None]])
+        sink.close()
+
+        with open(f'{self.tmp_dir}/rows.txt', encoding='utf-8', newline='') as file:
+            self.assertEqual([['id', 'name'], ['1', 'Ada'], ['2', '']], list(csv.reader(file)))
+
+    def test_empty_and_unknown(self):
+        self.assertEqual(0, RowSink(f'{self.tmp_dir}/rows.csv').close()['bytes'])
+        with self.assertRaises(ValueError):
+            RowSink(f'{self.tmp_dir}/rows.xlsx')
+
+    @unittest.skipIf(sinks.pyarrow is None, 'pyarrow is not installed')
+    def test_parquet(self):
+        sink = RowSink(f'{self.tmp_dir}/rows.parquet')
+        sink.write(['id', 'name'], [['1', 'Ada'], ['2', None]])
+        sink.close()
+        table = sinks.parquet.read_table(f'{self.tmp_dir}/rows.parquet')
+        self.assertEqual({'id': ['1', '2'], 'name': ['Ada', None]}, table.to_pydict())
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import json
+from unittest import TestCase, mock
+
+from airflow.utils import timezone
+
+from airflow_hop.operators import HopBaseOperator
+from airflow_hop.state import VariableStore, fingerprint, task_instance_key
+
+
+class TestVariableStore(TestCase):
+    """Perform tests regarding state stored in Airflow Variables"""
+
+    def test_task_instance_key(self):
+        task_instance = mock.Mock(dag_id='dag', task_id='task', run_id='run', map_index=2)
+        self.assertEqual(('dag', 'task', 'run', 2), task_instance_key({'ti': task_instance}))
+        self.assertIsNone(task_instance_key({}))
+        self.assertIsNone(task_instance_key(None))
+
+    def test_fingerprint(self):
+        self.assertEqual(fingerprint('pipe', b'<xml/>'), fingerprint(b'pipe', '<xml/>'))
+        self.assertNotEqual(fingerprint('pipe', b'<xml/>'), fingerprint('pip', b'e<xml/>'))
+
+    @mock.patch('airflow_hop.state.Variable')
+    def test_store(self, mock_variable):
+        store = VariableStore('execution')
+        key = store.key('dag', 'task' * 100, 'run', -1)
+        self.assertEqual(key, store.key('dag', 'task' * 100, 'run', -1))
+        self.assertNotEqual(key, store.key('dag', 'task' * 100, 'run', 0))
+        self.assertTrue(key.startswith('airflow_hop.execution.'))
+        self.assertLessEqual(len(key), 250)
+
+        store.set({'id': 'abc'}, 'dag', 'task', 'run', -1)
+        mock_variable.set.assert_called_once()
+        self.assertEqual(store.key('dag', 'task', 'run', -1), mock_variable.set.call_args[0][0])
+        self.assertEqual('abc', mock_variable.set.call_args[0][1]['id'])
+        self.assertIn('saved_at', mock_variable.set.call_args[0][1])
+
+        mock_variable.get.side_effect = ValueError('Expecting value')
+        self.assertIsNone(store.get('dag', 'task', 'run', -1))
+
+    @mock.patch('airflow_hop.state.create_session')
+    @mock.patch('airflow_hop.state.Variable')
+    def test_purge(self, mock_variable, mock_create_session):
+        now = timezone.utcnow()
+        variables = [
+            mock.Mock(key='fresh', val=json.dumps({'saved_at': now.isoformat()})),
+            mock.Mock(key='stale', val=json.dumps(
+                {'saved_at': (now - datetime.timedelta(days=8)).isoformat()})),
+            mock.Mock(key='legacy', val=json.dumps({'id': 'abc'})),
+            mock.Mock(key='unreadable', val='{'),
+        ]
+        session = mock_create_session.return_value.__enter__.return_value
+        session.query.return_value.filter.return_value = variables
+
+        self.assertEqual(8, HopBaseOperator.purge_state())
+        mock_variable.key.like.assert_any_call('airflow_hop.execution.%')
+        mock_variable.key.like.assert_any_call('airflow_hop.active.%')
+        mock_variable.key.like.assert_any_call('airflow_hop.result.%')
+        deleted = [call[0][0].key for call in session.delete.call_args_list]
+        self.assertEqual(['stale', 'legacy', 'unreadable'] * 2 + ['legacy', 'unreadable'],
+                         deleted)
+
+    @mock.patch('airflow_hop.state.create_session')
+    @mock.patch('airflow_hop.state.Variable')
+    def test_purge_results(self, mock_variable, mock_create_session): # pylint: disable=unused-argument
+        now = timezone.utcnow()
+        variables = [
+            mock.Mock(key='valid', val=json.dumps({
+                'saved_at': now.isoformat(),
+                'expires_at': (now + datetime.timedelta(hours=1)).isoformat()})),
+            mock.Mock(key='expired', val=json.dumps({
+                'saved_at': now.isoformat(),
+                'expires_at': (now - datetime.timedelta(hours=1)).isoformat()})),
+        ]
+        session = mock_create_session.return_value.__enter__.return_value
+        session.query.return_value.filter.return_value = variables
+
+        self.assertEqual(1, VariableStore('result').purge())
+        self.assertEqual('expired', session.delete.call_args[0][0].key)
+        session.delete.reset_mock()
+        self.assertEqual(2, HopBaseOperator.clear_results())
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from airflow_hop import tracing
+from airflow_hop.hooks import HopHook
+from tests.operator_test_base import OperatorTestBase
+from tests.unit.test_operators import MockedResponse, get_pipeline_operator, mock_requests
+
+
+def read_spans(path) -> dict:
+    with open(path, encoding='utf-8') as file:
+        spans = [json.loads(line) for line in file]
+    return {span['name']: span for span in spans}
+
+
+class TestTracing(OperatorTestBase):
+    """Perform tests regarding OpenTelemetry tracing"""
+
+    def setUp(self):
+        HopHook.clear_cache()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.trace_file = f'{self.tmp_dir}/traces/spans.jsonl'
+
+    def tearDown(self):
+        tracing._provider.shutdown()  # pylint: disable=protected-access
+        tracing._provider = None  # pylint: disable=protected-access
+
+    def test_file_exporter(self):
+        tracing.configure_tracing(f'file:{self.trace_file}')
+        with tracing.start_span('parent', {'key': 'value', 'empty': None}):
+            tracing.add_event('event', {'number': 1})
+            with tracing.start_span('child'):
+                tracing.set_attributes({'status': 200})
+
+        spans = read_spans(self.trace_file)
+        self.assertEqual({'key': 'value'}, spans['parent']['attributes'])
+        self.assertEqual('event', spans['parent']['events'][0]['name'])
+        self.assertEqual(spans['parent']['context']['span_id'], spans['child']['parent_id'])
+        self.assertEqual({'status': 200}, spans['child']['attributes'])
+
+    @mock.patch('requests.Session.get', side_effect = mock_requests)
+    @mock.patch('requests.Session.post', side_effect = mock_requests)
+    def test_operator_spans(self, mock_post, mock_get): # pylint: disable=unused-argument
+        with mock.patch.dict(os.environ, {tracing.EXPORTER_ENV: f'file:{self.trace_file}'}):
+            get_pipeline_operator().execute(context = {'run_id': 'manual'})
+
+        spans = read_spans(self.trace_file)
+        task_span = spans['hop.task test_pipeline_operator']
+        self.assertEqual('manual', task_span['attributes']['airflow.run_id'])
+        self.assertEqual(['poll'], [event['name'] for event in task_span['events']])
+        self.assertEqual('Finished', task_span['events'][0]['attributes']['hop.status'])
+
+        register = spans['hop.http /hop/registerPipeline/']
+        self.assertEqual(spans['hop.register']['context']['span_id'], register['parent_id'])
+        self.assertEqual(task_span['context']['span_id'], spans['hop.register']['parent_id'])
+        self.assertEqual(200, register['attributes']['http.status_code'])
+        self.assertEqual('POST', register['attributes']['http.method'])
+        self.assertGreater(register['attributes']['http.request_content_length'], 0)
+        self.assertEqual(len(mock_requests(url='registerPipeline').content),
+                         register['attributes']['http.response_content_length'])
+        self.assertIn('hop.parse_seconds', register['attributes'])
+        self.assertIn('hop.http /hop/pipelineStatus/', spans)
+
+    def test_response_bytes(self):
+        tracing.configure_tracing(f'file:{self.trace_file}')
+        conn = HopHook.HopServerConnection(
+            'localhost', 8081, 'cluster', 'cluster', None, None, None, None, None, 'Basic')
+        response = MockedResponse('<serverstatus><statusdesc>Online ñ</statusdesc></serverstatus>',
+                                  200)
+        with mock.patch('requests.Session.get', return_value=response):
+            conn.server_status()
+            response.headers = {'Content-Length': '1234'}
+            conn.server_status()
+        tracing._provider.force_flush()  # pylint: disable=protected-access
+
+        with open(self.trace_file, encoding='utf-8') as file:
+            lengths = [span['attributes']['http.response_content_length']
+                       for span in map(json.loads, file) if span['name'] == 'hop.http /hop/status/']
+        self.assertEqual([len(response.content), 1234], lengths)
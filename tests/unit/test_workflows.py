@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Aneior Studio, SL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase, mock
+
+from airflow import DAG, AirflowException
+from airflow.utils import timezone
+
+from airflow_hop.cache import CACHE_DIR_ENV
+from airflow_hop.operators import HopPipelineOperator, HopWorkflowOperator
+from airflow_hop.workflows import build_workflow_tasks, get_task_graph, parse_workflow
+from tests import TestBase
+
+HOP_CONFIG_PATH = f'{TestBase.TESTS_PATH}/assets/config'
+PROJECT_PATH = f'{HOP_CONFIG_PATH}/projects/default'
+
+WORKFLOW = """<?xml version="1.0" encoding="UTF-8"?>
+<workflow>
+  <name>branches</name>
+  <actions>
+    <action><name>Start</name><type>SPECIAL</type></action>
+    <action><name>Load A</name><type>PIPELINE</type>
+      <filename>${PROJECT_HOME}/pipelines/a.hpl</filename>
+      <run_configuration>local</run_configuration></action>
+    <action><name>Dummy</name><type>DUMMY</type></action>
+    <action><name>Child</name><type>WORKFLOW</type>
+      <filename>${PROJECT_HOME}/workflows/child.hwf</filename></action>
+    <action><name>Alert</name><type>PIPELINE</type>
+      <filename>${PROJECT_HOME}/pipelines/alert.hpl</filename>
+      <run_configuration>local</run_configuration></action>
+    <action><name>Cleanup</name><type>PIPELINE</type>
+      <filename>${PROJECT_HOME}/pipelines/cleanup.hpl</filename>
+      <run_configuration>local</run_configuration></action>
+  </actions>
+  <hops>
+    <hop><from>Start</from><to>Load A</to><enabled>Y</enabled>
+      <evaluation>Y</evaluation><unconditional>Y</unconditional></hop>
+    <hop><from>Load A</from><to>Dummy</to><enabled>Y</enabled>
+      <evaluation>Y</evaluation><unconditional>N</unconditional></hop>
+    <hop><from>Dummy</from><to>Child</to><enabled>Y</enabled>
+      <evaluation>Y</evaluation><unconditional>Y</unconditional></hop>
+    <hop><from>Load A</from><to>Alert</to><enabled>Y</enabled>
+      <evaluation>N</evaluation><unconditional>N</unconditional></hop>
+    <hop><from>Child</from><to>Cleanup</to><enabled>Y</enabled>
+      <evaluation>Y</evaluation><unconditional>Y</unconditional></hop>
+    <hop><from>Alert</from><to>Cleanup</to><enabled>Y</enabled>
+      <evaluation>Y</evaluation><unconditional>N</unconditional></hop>
+    <hop><from>Start</from><to>Cleanup</to><enabled>N</enabled>
+      <evaluation>Y</evaluation><unconditional>Y</unconditional></hop>
+  </hops>
+</workflow>
+"""
+
+
+class TestWorkflows(TestCase):
+    """Perform tests regarding the decomposition of workflows into tasks"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        patcher = mock.patch.dict(os.environ, {CACHE_DIR_ENV: f'{self.tmp_dir}/cache'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        os.makedirs(f'{self.tmp_dir}/project/workflows')
+        self.path = f'{self.tmp_dir}/project/workflows/branches.hwf'
+        with open(self.path, mode='w', encoding='utf-8') as file:
+            file.write(WORKFLOW)
+
+    def test_parse_workflow(self):
+        workflow = parse_workflow(self.path)
+        self.assertEqual('branches', workflow['name'])
+        self.assertEqual(6, len(workflow['actions']))
+        self.assertEqual(6, len(workflow['hops']))
+
+        with mock.patch('airflow_hop.workflows.ElementTree.parse') as parse:
+            self.assertEqual(workflow, parse_workflow(self.path))
+        parse.assert_not_called()
+
+    def test_task_graph(self):
+        self.assertEqual({
+            'Load A': {},
+            'Child': {'Load A': {'success'}},
+            'Alert': {'Load A': {'failure'}},
+            'Cleanup': {'Child': {'unconditional'}, 'Alert': {'success'}},
+        }, get_task_graph(parse_workflow(self.path)))
+
+    def test_build_workflow_tasks(self):
+        with DAG('test_workflow_tasks', start_date=timezone.datetime(2022, 1, 1), schedule=None):
+            tasks = build_workflow_tasks(
+                'workflows/branches.hwf', f'{self.tmp_dir}/project', 'default',
+                f'{HOP_CONFIG_PATH}/projects', 'Dev', HOP_CONFIG_PATH, task_id_prefix='branches.')
+
+        self.assertIsInstance(tasks['Load A'], HopPipelineOperator)
+        self.assertIsInstance(tasks['Child'], HopWorkflowOperator)
+        self.assertEqual('branches.Load_A', tasks['Load A'].task_id)
+        self.assertEqual('pipelines/a.hpl', tasks['Load A'].pipeline)
+        self.assertEqual('local', tasks['Load A'].pipe_config)
+        self.assertEqual('workflows/child.hwf', tasks['Child'].workflow)
+        self.assertEqual({'branches.Load_A'}, tasks['Alert'].upstream_task_ids)
+        self.assertEqual('all_failed', tasks['Alert'].trigger_rule)
+        self.assertEqual({'branches.Child', 'branches.Alert'}, tasks['Cleanup'].upstream_task_ids)
+        self.assertEqual('all_done', tasks['Cleanup'].trigger_rule)
+        self.assertEqual('all_success', tasks['Child'].trigger_rule)
+
+    def test_project_home(self):
+        with open(f'{PROJECT_PATH}/workflows/workflowTest.hwf', encoding='utf-8') as file:
+            content = file.read().replace('<stream_name>a</stream_name>', '<stream_name/>')
+        with open(f'{self.tmp_dir}/project/workflows/workflowTest.hwf', mode='w',
+                  encoding='utf-8') as file:
+            file.write(content)
+
+        with DAG('test_project_home', start_date=timezone.datetime(2022, 1, 1), schedule=None):
+            tasks = build_workflow_tasks(
+                'workflows/workflowTest.hwf', f'{self.tmp_dir}/project', 'default',
+                f'{HOP_CONFIG_PATH}/projects', 'Dev', HOP_CONFIG_PATH, project_home='/home/hop',
+                bypass_actions=('DELAY',), params={'DATE': '2022-01-01'})
+        self.assertEqual(['fake-data-generate-person-record.hpl'], list(tasks))
+        task = tasks['fake-data-generate-person-record.hpl']
+        self.assertEqual('pipelines/fake-data-generate-person-record.hpl', task.pipeline)
+        self.assertEqual({'DATE': '2022-01-01', 'PARAMETER1': '${WorkParam}'}, task.task_params)
+
+        with self.assertRaises(AirflowException):
+            build_workflow_tasks(
+                'workflows/workflowTest.hwf', f'{self.tmp_dir}/project', 'default',
+                f'{HOP_CONFIG_PATH}/projects', 'Dev', HOP_CONFIG_PATH,
+                bypass_actions=('DELAY',))
+        with self.assertRaisesRegex(AirflowException, 'PARAMETER1 from result rows'):
+            build_workflow_tasks(
+                'workflows/workflowTest.hwf', PROJECT_PATH, 'default',
+                f'{HOP_CONFIG_PATH}/projects', 'Dev', HOP_CONFIG_PATH, project_home='/home/hop',
+                bypass_actions=('DELAY',))
+
+    def test_current_folder(self):
+        with open(self.path, mode='w', encoding='utf-8') as file:
+            file.write(WORKFLOW.replace('${PROJECT_HOME}/pipelines/a.hpl',
+                                        '${Internal.Entry.Current.Folder}/../pipelines/a.hpl')
+                       .replace('<name>Child</name><type>WORKFLOW</type>',
+                                '<name>Child</name><type>WORKFLOW</type><parameters>'
+                                '<pass_all_parameters>N</pass_all_parameters><parameter>'
+                                '<name>TABLE</name><stream_name/><value>b</value>'
+                                '</parameter></parameters>'))
+        with DAG('test_current_folder', start_date=timezone.datetime(2022, 1, 1), schedule=None):
+            tasks = build_workflow_tasks(
+                'workflows/branches.hwf', f'{self.tmp_dir}/project', 'default',
+                f'{HOP_CONFIG_PATH}/projects', 'Dev', HOP_CONFIG_PATH,
+                params={'DATE': '2022-01-01'})
+        self.assertEqual('pipelines/a.hpl', tasks['Load A'].pipeline)
+        self.assertEqual({'DATE': '2022-01-01'}, tasks['Load A'].task_params)
+        self.assertEqual({'TABLE': 'b'}, tasks['Child'].task_params)
+
+    def test_unsupported_action(self):
+        workflow = parse_workflow(self.path)
+        workflow['actions'].append({'name': 'Purge', 'type': 'SQL', 'filename': None,
+                                    'run_configuration': None})
+        workflow['hops'].append({'from': 'Load A', 'to': 'Purge', 'condition': 'success'})
+        with self.assertRaisesRegex(AirflowException, 'Purge of type SQL'):
+            get_task_graph(workflow)
+        self.assertEqual({'Load A'}, set(get_task_graph(workflow, ('SQL',))['Child']))
+
+        with self.assertRaisesRegex(AirflowException, 'Wait for of type DELAY'):
+            build_workflow_tasks(
+                'workflows/workflowTest.hwf', PROJECT_PATH, 'default',
+                f'{HOP_CONFIG_PATH}/projects', 'Dev', HOP_CONFIG_PATH, project_home='/home/hop')